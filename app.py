@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g
 from flask_sqlalchemy import SQLAlchemy
 # 移除密码加密相关导入
 from werkzeug.utils import secure_filename
@@ -14,18 +14,27 @@ import json
 import shutil
 import threading
 import time
+import uuid
 from collections import defaultdict
+from pose_analysis import metrics
+from pose_analysis.logging_config import setup_logging, get_logger, set_job_context
+from pose_analysis.memory_budget import check_job_memory, MemoryBudgetExceeded
+from pose_analysis.config import PATH_CONFIG
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # 请更改为安全的密钥
 
 # 配置
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///patients.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('POSE_DATABASE_URI', 'sqlite:///patients.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# 日志（级别和格式见 pose_analysis/config.py 的 LOGGING_CONFIG）
+setup_logging()
+logger = get_logger(__name__)
+
 # 确保患者数据目录存在
-PATIENTS_DATA_DIR = 'patients_data'
+PATIENTS_DATA_DIR = PATH_CONFIG['patients_data_dir']
 os.makedirs(PATIENTS_DATA_DIR, exist_ok=True)
 
 # 数据库模型
@@ -34,6 +43,14 @@ db = SQLAlchemy(app)
 # 全局变量用于管理分析状态
 analysis_tasks = {}  # 存储正在进行的分析任务
 analysis_status = defaultdict(dict)  # 存储分析状态
+ingest_tasks = {}  # 存储正在进行的视频预处理任务 {(patient_id, angle): {'thread', 'cancel'}}
+frame_server = None  # 时间轴单帧取图服务（首次使用时创建）
+patient_folder_cache = {}  # 患者文件夹名称缓存 {patient_id: folder_name}
+file_etag_cache = {}  # 文件内容哈希缓存 {file_path: (size, mtime, etag)}
+speculative_tasks = {}  # 存储上传后的预推理任务 {(patient_id, angle): {'thread', 'cancel', 'video_path'}}
+speculative_analyzer = None  # 所有预推理任务共用的分析器（只加载一份模型）
+speculative_lock = threading.Lock()  # 预推理任务逐个使用共用的分析器
+render_tasks = {}  # 存储后台标注视频渲染任务 {patient_id: {'thread', 'cancel'}}
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,6 +79,26 @@ class Patient(db.Model):
     weight = db.Column(db.Float)
     address = db.Column(db.String(200))
 
+class VideoAsset(db.Model):
+    """上传视频的预处理结果（元数据、索引、代理视频）"""
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, nullable=False, index=True)
+    angle = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending/running/ready/error
+    message = db.Column(db.String(200))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    fps = db.Column(db.Float)
+    frame_count = db.Column(db.Integer)
+    duration = db.Column(db.Float)
+    file_size = db.Column(db.Integer)
+    codec = db.Column(db.String(40))
+    container = db.Column(db.String(80))
+    is_vfr = db.Column(db.Boolean, default=False)
+    index_path = db.Column(db.String(300))
+    proxy_path = db.Column(db.String(300))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # 加载用户配置
 def load_config():
     with open('config.yaml') as file:
@@ -88,6 +125,59 @@ def delete_patient_folder(patient):
     except Exception as e:
         return False, f"删除患者文件夹失败: {str(e)}"
 
+def get_patient_folder_name(patient_id):
+    """获取患者文件夹名称（缓存，避免每次请求都查询数据库），患者不存在时返回404"""
+    folder_name = patient_folder_cache.get(patient_id)
+    if folder_name is None:
+        patient = Patient.query.get_or_404(patient_id)
+        folder_name = f"{patient.id}-{patient.username}"
+        folder_name = "".join(c for c in folder_name if c.isalnum() or c in ('-', '_'))
+        patient_folder_cache[patient_id] = folder_name
+    return folder_name
+
+def get_file_etag(file_path):
+    """计算文件内容哈希作为强ETag（按文件大小和修改时间缓存）"""
+    import hashlib
+    
+    stat = os.stat(file_path)
+    cached = file_etag_cache.get(file_path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+        return cached[2]
+    
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    etag = sha256.hexdigest()[:32]
+    file_etag_cache[file_path] = (stat.st_size, stat.st_mtime, etag)
+    return etag
+
+def get_media_url(patient_id, category, directory, filename):
+    """生成带内容哈希的文件URL，内容不变时URL不变，可被浏览器长期缓存"""
+    url = f"/api/patients/{patient_id}/{category}/{filename}"
+    file_path = os.path.join(directory, filename)
+    if os.path.exists(file_path):
+        url += f"?v={get_file_etag(file_path)}"
+    return url
+
+def send_media_file(directory, filename):
+    """发送文件：支持ETag条件请求、Range分段请求，带版本号的URL使用immutable缓存"""
+    etag = get_file_etag(os.path.join(directory, filename))
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        # conditional=True时werkzeug处理Range/If-Range，按需读取文件片段
+        response = send_from_directory(directory, filename, conditional=True, etag=etag)
+    
+    response.set_etag(etag)
+    response.headers.pop('Expires', None)
+    if request.args.get('v') == etag:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # 登录验证装饰器
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -97,6 +187,30 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# 管理员权限装饰器（需在login_required之后使用）
+def admin_required(f):
+    def decorated_function(*args, **kwargs):
+        if session.get('user_role') != 'admin':
+            return jsonify({'success': False, 'message': '需要管理员权限'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+# 请求耗时统计
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # 按路由模板统计（例如 /api/patients/<int:patient_id>），避免每个患者产生一组指标
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+    return response
+
 # 路由
 @app.route('/')
 def index():
@@ -323,10 +437,15 @@ def api_delete_patient(patient_id):
     try:
         patient = Patient.query.get_or_404(patient_id)
         
-        # 先删除患者文件夹
+        # 取消预推理和渲染任务，再删除患者文件夹
+        cancel_ingest_task(patient_id)
+        cancel_speculative_task(patient_id)
+        cancel_render_task(patient_id)
+        patient_folder_cache.pop(patient_id, None)
         folder_deleted, folder_message = delete_patient_folder(patient)
         
         # 删除数据库中的患者记录
+        VideoAsset.query.filter_by(patient_id=patient_id).delete()
         db.session.delete(patient)
         db.session.commit()
         
@@ -367,6 +486,7 @@ def api_update_patient(patient_id):
         patient.address = data.get('address', patient.address)  # 地址
         
         db.session.commit()
+        patient_folder_cache.pop(patient_id, None)
         return jsonify({'success': True, 'message': '患者信息更新成功'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'更新患者信息失败: {str(e)}'}), 500
@@ -461,6 +581,7 @@ def upload_video():
     if 'video' not in request.files:
         return jsonify({'success': False, 'message': '没有文件上传'}), 400
     
+    upload_start = time.perf_counter()
     file = request.files['video']
     angle = request.form.get('angle', 'unknown')
     patient_id = request.form.get('patientId')
@@ -504,11 +625,27 @@ def upload_video():
         # 检查文件是否已存在（用于覆盖逻辑）
         file_exists = os.path.exists(filepath)
         
+        # 取消旧视频的预推理任务
+        if file_exists:
+            from pose_analysis.keypoint_store import remove_keypoint_store
+            cancel_speculative_task(patient.id, angle)
+            remove_keypoint_store(filepath)
+        
+        # 覆盖前先让旧的预处理结果失效，避免预处理线程启动前的分析读到旧视频的代理视频；
+        # 仍在进行的旧预处理任务作废，不再写回结果
+        cancel_ingest_task(patient.id, angle)
+        reset_video_asset(patient.id, angle)
+        
         # 保存文件（覆盖现有文件）
         file.save(filepath)
+        metrics.UPLOAD_BYTES.inc(os.path.getsize(filepath))
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - upload_start)
+        
+        # 后台预处理：探测元数据、构建索引、可选转码代理视频
+        start_ingest_task(patient.id, angle, filepath)
         
         # 返回文件URL（用于预览）
-        file_url = f"/api/patients/{patient_id}/videos/{filename}"
+        file_url = get_media_url(patient_id, 'videos', patient_videos_dir, filename)
         
         return jsonify({
             'success': True, 
@@ -524,8 +661,237 @@ def upload_video():
     except Exception as e:
         return jsonify({'success': False, 'message': f'保存文件失败: {str(e)}'}), 500
 
-def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confidence_threshold, timeline_data=None, shoulder_selection='left'):
+def reset_video_asset(patient_id, angle):
+    """视频被替换时把预处理结果标记为待处理（get_analysis_video_path只使用ready状态的代理视频）"""
+    asset = VideoAsset.query.filter_by(patient_id=patient_id, angle=angle).first()
+    if asset:
+        asset.status = 'pending'
+        asset.message = '等待预处理...'
+        asset.proxy_path = None
+        asset.updated_at = datetime.utcnow()
+        db.session.commit()
+
+def run_ingest_task(patient_id, angle, video_path, cancel_event):
+    """在后台线程中预处理上传的视频：探测元数据、构建索引、可选转码代理视频（被取消时丢弃结果）"""
+    from pose_analysis.video_ingest import VideoIngestor
+    
+    set_job_context(patient_id=patient_id, angle=angle, task='ingest')
+    analysis_video_path = None
+    try:
+        with app.app_context():
+            if cancel_event.is_set():
+                return
+            asset = VideoAsset.query.filter_by(patient_id=patient_id, angle=angle).first()
+            if not asset:
+                asset = VideoAsset(patient_id=patient_id, angle=angle)
+                db.session.add(asset)
+            asset.status = 'running'
+            asset.message = '正在预处理视频...'
+            asset.proxy_path = None
+            asset.updated_at = datetime.utcnow()
+            db.session.commit()
+            
+            try:
+                result = VideoIngestor().ingest(video_path)
+                metadata = result['metadata']
+                asset.width = metadata['width']
+                asset.height = metadata['height']
+                asset.fps = metadata['fps']
+                asset.frame_count = metadata['frame_count']
+                asset.duration = metadata['duration']
+                asset.file_size = metadata['file_size']
+                asset.codec = metadata['codec']
+                asset.container = metadata['container']
+                asset.is_vfr = metadata['is_vfr']
+                asset.index_path = result['index_path']
+                asset.proxy_path = result['proxy_path']
+                asset.status = 'ready'
+                asset.message = '视频预处理完成'
+            except Exception as e:
+                logger.error("视频预处理失败 %s: %s", video_path, e)
+                asset.status = 'error'
+                asset.message = f'视频预处理失败: {str(e)}'[:200]
+            
+            if cancel_event.is_set():
+                # 预处理期间视频被替换或删除，由新的任务写入结果
+                db.session.rollback()
+                logger.info("视频预处理已被取代，丢弃结果 %s", video_path)
+                return
+            
+            asset.updated_at = datetime.utcnow()
+            db.session.commit()
+            analysis_video_path = asset.proxy_path or video_path
+    finally:
+        task = ingest_tasks.get((patient_id, angle))
+        if task and task['cancel'] is cancel_event:
+            del ingest_tasks[(patient_id, angle)]
+    
+    # 预处理完成后再启动预推理，使其读取最终的分析视频
+    start_speculative_task(patient_id, angle, analysis_video_path)
+
+def start_ingest_task(patient_id, angle, video_path):
+    """启动视频预处理后台任务"""
+    from pose_analysis.config import INGEST_CONFIG
+    
+    if not INGEST_CONFIG['enabled']:
+        start_speculative_task(patient_id, angle, video_path)
+        return
+    
+    cancel_ingest_task(patient_id, angle)
+    
+    cancel_event = threading.Event()
+    ingest_thread = threading.Thread(
+        target=run_ingest_task,
+        args=(patient_id, angle, video_path, cancel_event)
+    )
+    ingest_thread.daemon = True
+    ingest_tasks[(patient_id, angle)] = {
+        'thread': ingest_thread,
+        'cancel': cancel_event
+    }
+    ingest_thread.start()
+
+def cancel_ingest_task(patient_id, angle=None):
+    """作废进行中的预处理任务（视频被替换或删除时调用），被取消的任务不再写回结果"""
+    for key in list(ingest_tasks.keys()):
+        if key[0] == patient_id and (angle is None or key[1] == angle):
+            task = ingest_tasks.pop(key, None)
+            if task:
+                task['cancel'].set()
+
+def get_speculative_analyzer():
+    """获取预推理共用的分析器（需持有speculative_lock），默认档位的模型或推理尺寸变化（如硬件校准后）时重建"""
+    global speculative_analyzer
+    from pose_analysis.config import get_performance_profile, get_model_path
+    from pose_analysis.video_analyzer import VideoAnalyzer
+    
+    profile = get_performance_profile()
+    model_path = get_model_path(profile['model'])
+    if (speculative_analyzer is None or speculative_analyzer.pose_detector.model_path != model_path
+            or speculative_analyzer.pose_detector.imgsz != profile['imgsz']):
+        speculative_analyzer = VideoAnalyzer(model_path, imgsz=profile['imgsz'])
+    return speculative_analyzer
+
+def run_speculative_task(patient_id, angle, video_path, cancel_event):
+    """在后台线程中以低优先级对上传的视频预推理，保存逐帧关键点（多个任务排队使用同一个分析器）"""
+    from pose_analysis.config import SPECULATIVE_CONFIG, get_performance_profile
+    
+    set_job_context(patient_id=patient_id, angle=angle, task='speculative')
+    try:
+        # Linux下setpriority作用于单个线程
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SPECULATIVE_CONFIG['nice'])
+    except (AttributeError, OSError):
+        pass
+    
+    try:
+        # 按服务默认档位（含硬件校准后的选择）的模型、推理尺寸和IoU推理，大多数分析可直接复用
+        with speculative_lock:
+            profile = get_performance_profile()
+            # 排队期间可能已被取消
+            if not cancel_event.is_set():
+                get_speculative_analyzer().extract_keypoints(
+                    video_path,
+                    conf=SPECULATIVE_CONFIG['conf'],
+                    iou=profile['iou'],
+                    stop_check_func=cancel_event.is_set,
+                    pause_check_func=lambda: bool(analysis_tasks),  # 正式分析任务优先
+                    poll_interval=SPECULATIVE_CONFIG['poll_interval']
+                )
+    except Exception as e:
+        logger.error("预推理失败 %s: %s", video_path, e)
+    finally:
+        task = speculative_tasks.get((patient_id, angle))
+        if task and task['cancel'] is cancel_event:
+            del speculative_tasks[(patient_id, angle)]
+
+def start_speculative_task(patient_id, angle, video_path):
+    """启动上传后的预推理任务（替换同一视频已有的任务）"""
+    from pose_analysis.config import SPECULATIVE_CONFIG
+    
+    if not SPECULATIVE_CONFIG['enabled']:
+        return
+    
+    cancel_speculative_task(patient_id, angle)
+    
+    cancel_event = threading.Event()
+    speculative_thread = threading.Thread(
+        target=run_speculative_task,
+        args=(patient_id, angle, video_path, cancel_event)
+    )
+    speculative_thread.daemon = True
+    speculative_tasks[(patient_id, angle)] = {
+        'thread': speculative_thread,
+        'cancel': cancel_event,
+        'video_path': video_path
+    }
+    speculative_thread.start()
+
+def cancel_speculative_task(patient_id, angle=None):
+    """取消预推理任务并删除已保存的关键点（视频被替换或删除时调用）"""
+    from pose_analysis.keypoint_store import remove_keypoint_store
+    
+    for key in list(speculative_tasks.keys()):
+        if key[0] == patient_id and (angle is None or key[1] == angle):
+            task = speculative_tasks.pop(key, None)
+            if task:
+                task['cancel'].set()
+                remove_keypoint_store(task['video_path'])
+
+def load_keypoint_stores(video_paths, model_path=None):
+    """加载各角度视频已完成的预推理关键点（只复用同一模型的结果）"""
+    from pose_analysis.config import get_model_path
+    from pose_analysis.keypoint_store import load_keypoint_store
+    
+    keypoint_stores = {}
+    for angle, video_path in video_paths.items():
+        store = load_keypoint_store(video_path, model_path or get_model_path())
+        if store is not None:
+            keypoint_stores[angle] = store
+    return keypoint_stores
+
+def get_analysis_video_path(patient_id, angle, video_path):
+    """获取分析使用的视频路径，预处理生成了代理视频时使用代理视频"""
+    from pose_analysis.config import INGEST_CONFIG
+    
+    if not INGEST_CONFIG['use_proxy_for_analysis']:
+        return video_path
+    
+    asset = VideoAsset.query.filter_by(patient_id=patient_id, angle=angle, status='ready').first()
+    if asset and asset.proxy_path and os.path.exists(asset.proxy_path):
+        return asset.proxy_path
+    return video_path
+
+def start_render_task(patient_id, output_paths):
+    """分析完成后在低优先级后台线程中渲染标注视频（VIDEO_OUTPUT_CONFIG['mode']为background时）"""
+    from pose_analysis.config import VIDEO_OUTPUT_CONFIG
+    from pose_analysis.overlay_renderer import render_pending_videos
+    
+    cancel_render_task(patient_id)
+    
+    cancel_event = threading.Event()
+    render_thread = threading.Thread(
+        target=render_pending_videos,
+        args=(output_paths, VIDEO_OUTPUT_CONFIG['background_nice'], cancel_event.is_set)
+    )
+    render_thread.daemon = True
+    render_tasks[patient_id] = {'thread': render_thread, 'cancel': cancel_event}
+    render_thread.start()
+
+def cancel_render_task(patient_id):
+    """取消患者的后台渲染任务（重新分析或删除患者时调用）"""
+    task = render_tasks.pop(patient_id, None)
+    if task:
+        task['cancel'].set()
+
+def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confidence_threshold, timeline_data=None, shoulder_selection='left', profile_mode=None, performance_profile=None):
     """在后台线程中运行分析任务"""
+    from pose_analysis.profiling import StageTimer
+    from pose_analysis.config import get_performance_profile, get_model_path
+    
+    # 分析线程内的所有日志都带上分析ID和患者ID
+    set_job_context(analysis_id=analysis_id, patient_id=patient_id)
+    timer = StageTimer()
+    metrics.ANALYSIS_JOBS_RUNNING.inc()
     try:
         # 初始化分析状态
         analysis_status[analysis_id] = {
@@ -545,7 +911,11 @@ def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confid
         # 创建视频分析器实例
         analysis_status[analysis_id]['progress'] = 10
         analysis_status[analysis_id]['message'] = '正在加载AI模型...'
-        analyzer = VideoAnalyzer("model/yolov8s-pose.pt")
+        # 按性能档位选择模型和推理尺寸
+        profile = get_performance_profile(performance_profile)
+        model_path = get_model_path(profile['model'])
+        with timer.stage('model_load'):
+            analyzer = VideoAnalyzer(model_path, imgsz=profile['imgsz'])
         
         # 检查是否被停止
         if analysis_status[analysis_id]['stopped']:
@@ -582,11 +952,15 @@ def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confid
             patient_name=patient_name,
             video_paths=video_paths,
             conf=confidence_threshold,
-            iou=0.45,
+            iou=profile['iou'],
             stop_check_func=check_stop,
             patient_info=patient_info if patient_info else None,
             timeline_data=timeline_data if timeline_data else None,
-            shoulder_selection=shoulder_selection  # 传递肩部选择参数
+            shoulder_selection=shoulder_selection,  # 传递肩部选择参数
+            keypoint_stores=load_keypoint_stores(video_paths, model_path),  # 复用上传后预推理的关键点
+            timer=timer,
+            profile_mode=profile_mode,
+            performance_profile=profile['name']
         )
         
         # 检查是否被停止
@@ -624,25 +998,36 @@ def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confid
         # 转换文件路径为API路径
         chart_paths = {}
         for chart_name, file_path in analysis_result.get('chart_paths', {}).items():
-            filename = os.path.basename(file_path)
-            chart_paths[chart_name] = f"/api/patients/{patient_id}/analysis_results/{filename}"
+            chart_paths[chart_name] = get_media_url(
+                patient_id, 'analysis_results', os.path.dirname(file_path), os.path.basename(file_path))
         
         video_output_paths = {}
         for angle, file_path in analysis_result.get('video_output_paths', {}).items():
-            filename = os.path.basename(file_path)
-            video_output_paths[angle] = f"/api/patients/{patient_id}/analysis_results/{filename}"
+            video_output_paths[angle] = get_media_url(
+                patient_id, 'analysis_results', os.path.dirname(file_path), os.path.basename(file_path))
+        
+        video_preview_paths = {}
+        for angle, file_path in analysis_result.get('video_preview_paths', {}).items():
+            video_preview_paths[angle] = get_media_url(
+                patient_id, 'analysis_results', os.path.dirname(file_path), os.path.basename(file_path))
+        
+        # 关键点轨迹接口（页面在原视频上叠加绘制标注）
+        track_paths = {}
+        for angle in analysis_result.get('track_paths', {}):
+            track_paths[angle] = f"/api/patients/{patient_id}/analysis_results/{angle}/track"
         
         # 转换关键帧图片路径为API路径
         keyframe_paths = {}
         for keyframe_name, file_path in analysis_result.get('keyframe_paths', {}).items():
-            filename = os.path.basename(file_path)
-            keyframe_paths[keyframe_name] = f"/api/patients/{patient_id}/analysis_results/{filename}"
+            keyframe_paths[keyframe_name] = get_media_url(
+                patient_id, 'analysis_results', os.path.dirname(file_path), os.path.basename(file_path))
         
         # 转换报告路径
         report_path = ""
         if analysis_result.get('report_path'):
-            filename = os.path.basename(analysis_result['report_path'])
-            report_path = f"/api/patients/{patient_id}/reports/{filename}"
+            file_path = analysis_result['report_path']
+            report_path = get_media_url(
+                patient_id, 'reports', os.path.dirname(file_path), os.path.basename(file_path))
         
         # 检查是否被停止
         if analysis_status[analysis_id]['stopped']:
@@ -666,28 +1051,46 @@ def run_analysis_task(analysis_id, patient_id, patient_name, video_paths, confid
         if analysis_status[analysis_id]['stopped']:
             return
         
+        metrics.record_analysis_performance(analysis_result.get('performance', {}))
         analysis_status[analysis_id]['progress'] = 100
         analysis_status[analysis_id]['status'] = 'completed'
         analysis_status[analysis_id]['message'] = '分析完成'
         analysis_status[analysis_id]['result'] = {
             'chartPaths': chart_paths,
             'videoOutputPaths': video_output_paths,
+            'videoPreviewPaths': video_preview_paths,
+            'trackPaths': track_paths,
             'keyframePaths': keyframe_paths,  # 添加关键帧图片路径
             'reportPath': report_path,
             'summary': serializable_summary,
+            'performance': convert_numpy_types(analysis_result.get('performance', {})),
             'chartFilesExist': chart_files_exist
         }
         
         # 清理任务
         if analysis_id in analysis_tasks:
             del analysis_tasks[analysis_id]
+        
+        from pose_analysis.config import VIDEO_OUTPUT_CONFIG
+        if VIDEO_OUTPUT_CONFIG['mode'] == 'background' and analysis_result.get('video_output_paths'):
+            start_render_task(patient_id, list(analysis_result['video_output_paths'].values()))
             
     except Exception as e:
+        logger.exception("分析任务失败: %s", e)
         if analysis_id in analysis_status:
             analysis_status[analysis_id]['status'] = 'error'
             analysis_status[analysis_id]['message'] = f'分析失败: {str(e)}'
         if analysis_id in analysis_tasks:
             del analysis_tasks[analysis_id]
+    finally:
+        metrics.ANALYSIS_JOBS_RUNNING.dec()
+        status = analysis_status[analysis_id].get('status')
+        if status == 'completed':
+            metrics.ANALYSIS_JOBS.inc(status='completed')
+        elif status == 'error':
+            metrics.ANALYSIS_JOBS.inc(status='failed')
+        else:
+            metrics.ANALYSIS_JOBS.inc(status='cancelled')
 
 @app.route('/api/analyze_video', methods=['POST'])
 @login_required
@@ -701,8 +1104,9 @@ def analyze_video():
     patient_id = data.get('patientId')
     shoulder_selection = data.get('shoulderSelection', 'left')  # 新增：获取肩部选择，默认左肩
     timeline_data = data.get('timelineData', {})  # 获取时间轴数据
-    print(f"接收到的时间轴数据: {timeline_data}")
-    print(f"接收到的肩部选择: {shoulder_selection}")
+    profile_mode = data.get('profile')  # 可选：'cprofile' 或 'pyinstrument'，对本次分析做函数级采样
+    performance_profile = data.get('performanceProfile')  # 可选：'fast'、'balanced' 或 'accurate'，默认使用服务配置
+    logger.debug("接收到的时间轴数据: %s, 肩部选择: %s", timeline_data, shoulder_selection)
     
     if not videos:
         return jsonify({'success': False, 'message': '没有提供视频文件'}), 400
@@ -710,6 +1114,14 @@ def analyze_video():
     if not patient_id:
         return jsonify({'success': False, 'message': '没有提供患者ID'}), 400
     
+    from pose_analysis.config import MODEL_CONFIG, get_performance_profile, get_model_path
+    try:
+        profile = get_performance_profile(performance_profile)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if MODEL_CONFIG['detector'] != 'stub' and not os.path.exists(get_model_path(profile['model'])):
+        return jsonify({'success': False, 'message': f"性能档位 {profile['name']} 所需的模型文件不存在: {profile['model']}"}), 400
+    
     try:
         # 验证患者是否存在
         patient = Patient.query.get(patient_id)
@@ -727,21 +1139,32 @@ def analyze_video():
                 video_filename = f"{angle}.mp4"
                 video_path = os.path.join(PATIENTS_DATA_DIR, folder_name, 'videos', video_filename)
                 if os.path.exists(video_path):
-                    video_paths[angle] = video_path
+                    video_paths[angle] = get_analysis_video_path(patient.id, angle, video_path)
         
         if not video_paths:
             return jsonify({'success': False, 'message': '没有找到有效的视频文件'}), 400
         
-        # 生成分析ID
-        analysis_id = f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # 预计超出单任务内存预算的分析直接拒绝，避免长视频拖垮整个服务
+        try:
+            check_job_memory(video_paths, timeline_data)
+        except MemoryBudgetExceeded as e:
+            logger.warning("拒绝分析请求: %s", e)
+            return jsonify({'success': False, 'message': str(e)}), 413
+        
+        # 生成分析ID（同一秒内可能有多个分析请求，附加患者ID和随机后缀）
+        analysis_id = f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{patient.id}_{uuid.uuid4().hex[:6]}"
+        
+        # 重新分析会替换标注视频，停止上次分析的后台渲染
+        cancel_render_task(patient.id)
         
         # 启动后台分析任务
         analysis_thread = threading.Thread(
             target=run_analysis_task,
-            args=(analysis_id, patient.id, patient.username, video_paths, confidence_threshold, timeline_data, shoulder_selection)  # 新增：传递肩部选择参数
+            args=(analysis_id, patient.id, patient.username, video_paths, confidence_threshold, timeline_data, shoulder_selection, profile_mode, profile['name'])  # 新增：传递肩部选择参数
         )
         analysis_thread.daemon = True
         analysis_thread.start()
+        metrics.ANALYSIS_JOBS.inc(status='queued')
         
         # 保存任务引用
         analysis_tasks[analysis_id] = analysis_thread
@@ -750,6 +1173,7 @@ def analyze_video():
         return jsonify({
             'success': True,
             'analysisId': analysis_id,
+            'performanceProfile': profile['name'],
             'message': '分析已开始，请等待完成'
         })
         
@@ -881,7 +1305,7 @@ def get_patient_analysis_results(patient_id):
                 if file.endswith('.png') and not file.startswith('max_'):
                     chart_files.append({
                         'name': file,
-                        'url': f"/api/patients/{patient_id}/analysis_results/{file}"
+                        'url': get_media_url(patient_id, 'analysis_results', analysis_dir, file)
                     })
             results['analysis_results']['charts'] = chart_files
             
@@ -891,7 +1315,7 @@ def get_patient_analysis_results(patient_id):
                 if file.endswith('.png') and file.startswith('max_'):
                     keyframe_files.append({
                         'name': file,
-                        'url': f"/api/patients/{patient_id}/analysis_results/{file}"
+                        'url': get_media_url(patient_id, 'analysis_results', analysis_dir, file)
                     })
             results['analysis_results']['keyframes'] = keyframe_files
             
@@ -903,14 +1327,33 @@ def get_patient_analysis_results(patient_id):
                     results['analysis_results']['data'] = json.load(f)
             
             # 获取标注视频
+            from pose_analysis.config import VIDEO_OUTPUT_CONFIG
+            from pose_analysis.video_writer import get_preview_path
             video_files = []
             for file in os.listdir(analysis_dir):
-                # 新的命名格式：患者姓名-角度.avi
-                if file.endswith('.avi') and '-' in file and not file.endswith('_annotated.avi'):
-                    video_files.append({
+                # 新的命名格式：患者姓名-角度.mp4（旧版本为.avi），预览版本随主视频返回
+                if file.endswith(('.mp4', '.avi')) and '-' in file and not file.endswith('_annotated.avi'):
+                    if os.path.splitext(file)[0].endswith(VIDEO_OUTPUT_CONFIG['preview_suffix']):
+                        continue
+                    preview_file = get_preview_path(file)
+                    video_info = {
                         'name': file,
-                        'url': f"/api/patients/{patient_id}/analysis_results/{file}"
-                    })
+                        'url': get_media_url(patient_id, 'analysis_results', analysis_dir, file)
+                    }
+                    if os.path.exists(os.path.join(analysis_dir, preview_file)):
+                        video_info['preview_url'] = get_media_url(patient_id, 'analysis_results', analysis_dir, preview_file)
+                    video_files.append(video_info)
+                # 只有关键点轨迹的标注视频尚未渲染，首次请求时生成
+                elif file.endswith(VIDEO_OUTPUT_CONFIG['track_suffix']) and VIDEO_OUTPUT_CONFIG['mode'] != 'none':
+                    from pose_analysis.overlay_renderer import get_rendered_video_path
+                    video_file = os.path.basename(get_rendered_video_path(
+                        file[:-len(VIDEO_OUTPUT_CONFIG['track_suffix'])] + '.mp4'))
+                    if not os.path.exists(os.path.join(analysis_dir, video_file)):
+                        video_files.append({
+                            'name': video_file,
+                            'url': f"/api/patients/{patient_id}/analysis_results/{video_file}",
+                            'pending': True
+                        })
             results['analysis_results']['videos'] = video_files
         
         # 检查报告文件
@@ -919,7 +1362,7 @@ def get_patient_analysis_results(patient_id):
                 if file.endswith('.docx'):
                     results['reports'].append({
                         'name': file,
-                        'url': f"/api/patients/{patient_id}/reports/{file}"
+                        'url': get_media_url(patient_id, 'reports', reports_dir, file)
                     })
         
         return jsonify(results)
@@ -932,34 +1375,64 @@ def get_patient_analysis_results(patient_id):
 def get_analysis_result_file(patient_id, filename):
     """获取分析结果文件"""
     try:
-        patient = Patient.query.get_or_404(patient_id)
-        
-        # 创建患者文件夹名称
-        folder_name = f"{patient.id}-{patient.username}"
-        folder_name = "".join(c for c in folder_name if c.isalnum() or c in ('-', '_'))
+        folder_name = get_patient_folder_name(patient_id)
         
         # 分析结果目录
         analysis_dir = os.path.join(PATIENTS_DATA_DIR, folder_name, 'analysis_results')
         file_path = os.path.join(analysis_dir, filename)
         
         if not os.path.exists(file_path):
-            return jsonify({'success': False, 'message': '文件不存在'}), 404
+            # 延迟渲染模式下标注视频在首次请求时根据关键点轨迹生成
+            from pose_analysis.overlay_renderer import ensure_annotated_video
+            if not ensure_annotated_video(file_path):
+                return jsonify({'success': False, 'message': '文件不存在'}), 404
         
-        return send_from_directory(analysis_dir, filename)
+        return send_media_file(analysis_dir, filename)
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取文件失败: {str(e)}'}), 500
 
+@app.route('/api/patients/<int:patient_id>/analysis_results/<angle>/track')
+@login_required
+def get_analysis_track(patient_id, angle):
+    """获取某角度的逐帧关键点和指标轨迹（差分编码JSON，与原视频时间对齐）"""
+    try:
+        if angle not in ('front', 'side', 'back'):
+            return jsonify({'success': False, 'message': '无效的视频角度'}), 400
+        
+        from pose_analysis.overlay_renderer import build_track_payload
+        from pose_analysis.video_writer import get_track_path
+        
+        patient = Patient.query.get_or_404(patient_id)
+        folder_name = get_patient_folder_name(patient_id)
+        
+        analysis_dir = os.path.join(PATIENTS_DATA_DIR, folder_name, 'analysis_results')
+        track_path = get_track_path(os.path.join(analysis_dir, f"{patient.username}-{angle}.mp4"))
+        if not os.path.exists(track_path):
+            return jsonify({'success': False, 'message': '关键点轨迹不存在'}), 404
+        
+        etag = get_file_etag(track_path)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            payload = build_track_payload(track_path)
+            if payload is None:
+                return jsonify({'success': False, 'message': '关键点轨迹读取失败'}), 500
+            response = jsonify({'success': True, 'track': payload})
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取关键点轨迹失败: {str(e)}'}), 500
+
 @app.route('/api/patients/<int:patient_id>/reports/<filename>')
 @login_required
 def get_patient_report(patient_id, filename):
     """获取患者报告文件"""
     try:
-        patient = Patient.query.get_or_404(patient_id)
-        
-        # 创建患者文件夹名称
-        folder_name = f"{patient.id}-{patient.username}"
-        folder_name = "".join(c for c in folder_name if c.isalnum() or c in ('-', '_'))
+        folder_name = get_patient_folder_name(patient_id)
         
         # 报告目录
         reports_dir = os.path.join(PATIENTS_DATA_DIR, folder_name, 'reports')
@@ -968,7 +1441,7 @@ def get_patient_report(patient_id, filename):
         if not os.path.exists(file_path):
             return jsonify({'success': False, 'message': '报告文件不存在'}), 404
         
-        return send_from_directory(reports_dir, filename)
+        return send_media_file(reports_dir, filename)
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取报告失败: {str(e)}'}), 500
@@ -978,11 +1451,7 @@ def get_patient_report(patient_id, filename):
 def api_patient_video(patient_id, filename):
     """提供患者视频文件访问"""
     try:
-        patient = Patient.query.get_or_404(patient_id)
-        
-        # 创建患者文件夹名称
-        folder_name = f"{patient.id}-{patient.username}"
-        folder_name = "".join(c for c in folder_name if c.isalnum() or c in ('-', '_'))
+        folder_name = get_patient_folder_name(patient_id)
         
         # 患者视频目录路径
         patient_videos_dir = os.path.join(PATIENTS_DATA_DIR, folder_name, 'videos')
@@ -991,11 +1460,72 @@ def api_patient_video(patient_id, filename):
         if not os.path.exists(video_path):
             return jsonify({'success': False, 'message': '视频文件不存在'}), 404
         
-        return send_from_directory(patient_videos_dir, filename)
+        return send_media_file(patient_videos_dir, filename)
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取视频文件失败: {str(e)}'}), 500
 
+def get_frame_server():
+    """获取单帧取图服务（进程内共享解码帧缓存）"""
+    global frame_server
+    if frame_server is None:
+        from pose_analysis.frame_server import FrameServer
+        frame_server = FrameServer()
+    return frame_server
+
+@app.route('/api/patients/<int:patient_id>/videos/<angle>/frame')
+@login_required
+def api_patient_video_frame(patient_id, angle):
+    """获取患者视频指定时间点的单帧JPEG图片（用于时间轴预览）"""
+    try:
+        if angle not in ('front', 'side', 'back'):
+            return jsonify({'success': False, 'message': '无效的视频角度'}), 400
+        
+        timestamp = request.args.get('t', 0, type=float)
+        max_width = request.args.get('width', None, type=int)
+        
+        folder_name = get_patient_folder_name(patient_id)
+        
+        video_path = os.path.join(PATIENTS_DATA_DIR, folder_name, 'videos', f"{angle}.mp4")
+        if not os.path.exists(video_path):
+            return jsonify({'success': False, 'message': '视频文件不存在'}), 404
+        
+        image_data = get_frame_server().get_frame_jpeg(video_path, timestamp, max_width)
+        if image_data is None:
+            return jsonify({'success': False, 'message': '无法读取指定时间点的视频帧'}), 404
+        
+        response = app.response_class(image_data, mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        return response
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取视频帧失败: {str(e)}'}), 500
+
+@app.route('/api/patients/<int:patient_id>/videos/<angle>/sprite')
+@login_required
+def api_patient_video_sprite(patient_id, angle):
+    """获取患者视频的缩略图拼图信息（用于时间轴拖动预览）"""
+    try:
+        if angle not in ('front', 'side', 'back'):
+            return jsonify({'success': False, 'message': '无效的视频角度'}), 400
+        
+        from pose_analysis.video_ingest import load_video_index
+        
+        folder_name = get_patient_folder_name(patient_id)
+        
+        video_path = os.path.join(PATIENTS_DATA_DIR, folder_name, 'videos', f"{angle}.mp4")
+        video_index = load_video_index(video_path)
+        if not video_index or not video_index.get('sprite'):
+            return jsonify({'success': False, 'message': '缩略图尚未生成'}), 404
+        
+        sprite = dict(video_index['sprite'])
+        sprite['url'] = get_media_url(patient_id, 'videos', os.path.dirname(video_path), sprite.pop('file'))
+        
+        return jsonify({'success': True, 'sprite': sprite})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取缩略图失败: {str(e)}'}), 500
+
 @app.route('/api/patients/<int:patient_id>/videos/check', methods=['GET'])
 @login_required
 def api_check_patient_videos(patient_id):
@@ -1021,12 +1551,29 @@ def api_check_patient_videos(patient_id):
         video_urls = {}
         for angle, exists in video_files.items():
             if exists:
-                video_urls[angle] = f"/api/patients/{patient_id}/videos/{angle}.mp4"
+                video_urls[angle] = get_media_url(patient_id, 'videos', patient_videos_dir, f"{angle}.mp4")
+        
+        # 视频预处理状态与元数据
+        video_metadata = {}
+        for asset in VideoAsset.query.filter_by(patient_id=patient_id).all():
+            if video_files.get(asset.angle):
+                video_metadata[asset.angle] = {
+                    'status': asset.status,
+                    'message': asset.message,
+                    'width': asset.width,
+                    'height': asset.height,
+                    'fps': asset.fps,
+                    'frameCount': asset.frame_count,
+                    'duration': asset.duration,
+                    'isVfr': asset.is_vfr,
+                    'hasProxy': bool(asset.proxy_path)
+                }
         
         return jsonify({
             'success': True,
             'videos': video_files,
             'urls': video_urls,
+            'metadata': video_metadata,
             'allExist': all(video_files.values())
         })
         
@@ -1051,8 +1598,19 @@ def api_delete_patient_video(patient_id, filename):
         if not os.path.exists(video_path):
             return jsonify({'success': False, 'message': '视频文件不存在'}), 404
         
-        # 删除文件
+        # 删除文件及其预处理、预推理结果
+        from pose_analysis.video_ingest import remove_ingest_artifacts, get_proxy_path
+        from pose_analysis.keypoint_store import remove_keypoint_store
+        angle = os.path.splitext(filename)[0]
+        cancel_ingest_task(patient_id, angle)
+        cancel_speculative_task(patient_id, angle)
         os.remove(video_path)
+        remove_keypoint_store(video_path)
+        remove_keypoint_store(get_proxy_path(video_path))
+        remove_ingest_artifacts(video_path)
+        
+        VideoAsset.query.filter_by(patient_id=patient_id, angle=angle).delete()
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -1168,6 +1726,61 @@ def api_delete_patient_report(patient_id, filename):
     except Exception as e:
         return jsonify({'success': False, 'message': f'删除报告文件失败: {str(e)}'}), 500
 
+@app.route('/metrics')
+def get_metrics():
+    """运行指标（Prometheus文本格式），供本机抓取程序采集"""
+    return app.response_class(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/ready')
+def get_readiness():
+    """就绪检查：模型文件和数据库可用时返回200，并报告模型是否已加载、已完成推理预热"""
+    from sqlalchemy import text
+    from pose_analysis.config import MODEL_CONFIG, get_performance_profile, get_model_path
+    
+    checks = {
+        # 默认性能档位使用的模型
+        'model_file': MODEL_CONFIG['detector'] == 'stub' or os.path.exists(get_model_path(get_performance_profile()['model'])),
+        'database': True,
+        'model_loaded': bool(metrics.MODEL_LOADED.get()),
+        'model_warm': bool(metrics.MODEL_WARM.get()),
+        'running_jobs': int(metrics.ANALYSIS_JOBS_RUNNING.get())
+    }
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception:
+        checks['database'] = False
+    
+    ready = checks['model_file'] and checks['database']
+    return jsonify({'ready': ready, **checks}), 200 if ready else 503
+
+@app.route('/api/admin/calibration', methods=['GET'])
+@login_required
+@admin_required
+def get_calibration():
+    """硬件校准状态：各模型和推理后端的测量结果、选出的默认模型和档位"""
+    from pose_analysis.calibration import get_calibration_status
+    try:
+        return jsonify({'success': True, 'calibration': get_calibration_status()})
+    except Exception as e:
+        logger.error(f"获取校准状态失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'获取校准状态失败: {str(e)}'}), 500
+
+@app.route('/api/admin/calibration', methods=['POST'])
+@login_required
+@admin_required
+def start_calibration():
+    """在后台重新校准（完成后自动应用）"""
+    from pose_analysis.calibration import start_calibration as start_calibration_task
+    if not start_calibration_task():
+        return jsonify({'success': False, 'message': '校准正在进行中'}), 409
+    return jsonify({'success': True, 'message': '已开始校准，完成后自动应用'}), 202
+
+# 启动时应用硬件校准结果（无结果或环境变化时在后台校准）；
+# 调试模式下的文件监视进程不处理请求，只在实际服务的进程中执行
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    from pose_analysis.calibration import init_calibration
+    init_calibration()
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
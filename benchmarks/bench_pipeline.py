@@ -0,0 +1,420 @@
+"""
+分析流程性能基准测试
+对合成视频或 patients_data/*/videos 下的样例视频测量各环节的吞吐量、延迟分位数和内存峰值，
+结果保存为JSON，并可与保存的基线对比
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_pipeline                                   # 合成视频，全部环节
+    python -m benchmarks.bench_pipeline --source samples --patient 1-张三  # 样例视频
+    python -m benchmarks.bench_pipeline --width 1280 --height 720 --fps 60 --duration 6
+    python -m benchmarks.bench_pipeline --output benchmarks/results/baseline.json
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/baseline.json --threshold 0.1
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from pose_analysis.config import VIDEO_OUTPUT_CONFIG, get_model_path
+from pose_analysis.profiling import get_peak_rss_mb
+from pose_analysis.synthetic import generate_synthetic_set
+from pose_analysis.video_writer import get_track_path
+
+TARGETS = ('detect_pose', 'analyze_video', 'analyze_patient_videos', 'generate_charts', 'generate_report')
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+SYNTHETIC_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'synthetic')
+
+# 对比基线时各指标的方向：latency越小越好，throughput越大越好
+COMPARED_METRICS = {
+    'p50_ms': 'lower',
+    'p95_ms': 'lower',
+    'throughput': 'higher'
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(latencies: List[float], units: float, unit_name: str) -> Dict[str, Any]:
+    """
+    汇总一个环节的测量结果
+
+    Args:
+        latencies: 每次调用的耗时（秒）
+        units: 处理的总量（帧数或调用次数）
+        unit_name: 吞吐量单位，例如 'frames/s'
+
+    Returns:
+        Dict[str, Any]: 调用次数、延迟分位数（毫秒）、吞吐量和内存峰值
+    """
+    total = sum(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'calls': len(latencies),
+        'total_seconds': round(total, 4),
+        'mean_ms': to_ms(total / len(latencies)) if latencies else None,
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p90_ms': to_ms(percentile(latencies, 90)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'max_ms': to_ms(max(latencies)) if latencies else None,
+        'throughput': round(units / total, 3) if total > 0 else None,
+        'throughput_unit': unit_name,
+        'peak_rss_mb': get_peak_rss_mb()
+    }
+
+
+def time_calls(func: Callable[[], Any], repeat: int, warmup: int) -> Tuple[List[float], Any]:
+    """预热后重复调用并记录每次耗时，返回耗时列表和最后一次的返回值"""
+    result = None
+    for _ in range(warmup):
+        result = func()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - start)
+    return latencies, result
+
+
+@contextmanager
+def working_directory(path: str):
+    """临时切换工作目录（analyze_patient_videos 写入 PATH_CONFIG['patients_data_dir']，默认相对路径 patients_data/）"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def find_sample_videos(patient: Optional[str] = None) -> Dict[str, str]:
+    """
+    查找样例视频
+
+    Args:
+        patient: 患者文件夹名称（例如 1-张三），None表示使用找到的第一个完整样例
+
+    Returns:
+        Dict[str, str]: {'front': 路径, 'side': 路径, 'back': 路径}
+    """
+    pattern = os.path.join(PROJECT_ROOT, 'patients_data', patient or '*', 'videos')
+    for videos_dir in sorted(glob.glob(pattern)):
+        video_paths = {}
+        for angle in ('front', 'side', 'back'):
+            path = os.path.join(videos_dir, f"{angle}.mp4")
+            if os.path.exists(path):
+                video_paths[angle] = path
+        if video_paths:
+            return video_paths
+    raise FileNotFoundError(f"未找到样例视频: {pattern}")
+
+
+def read_frames(video_path: str, max_frames: int) -> List[Any]:
+    """读取视频开头的若干帧"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+
+def get_git_commit() -> Optional[str]:
+    """当前代码版本"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(video_paths: Dict[str, str], targets: List[str], model_path: str,
+                   repeat: int, warmup: int, frames: int, conf: float, iou: float,
+                   work_dir: str) -> Dict[str, Any]:
+    """
+    执行基准测试
+
+    Args:
+        video_paths: 各角度视频路径
+        targets: 要测量的环节
+        model_path: 模型路径
+        repeat: 每个环节的重复次数
+        warmup: 每个环节的预热次数
+        frames: detect_pose 测量使用的帧数
+        conf: 置信度阈值
+        iou: IoU阈值
+        work_dir: 临时输出目录
+
+    Returns:
+        Dict[str, Any]: 各环节的测量结果
+    """
+    from pose_analysis.video_analyzer import VideoAnalyzer
+
+    results = {}
+
+    start = time.perf_counter()
+    analyzer = VideoAnalyzer(model_path)
+    results['model_load'] = summarize([time.perf_counter() - start], 1, 'loads/s')
+    results['backend'] = analyzer.pose_detector.get_backend_info()
+
+    if 'detect_pose' in targets:
+        first_video = next(iter(video_paths.values()))
+        sample_frames = read_frames(first_video, frames)
+        for _ in range(warmup):
+            analyzer.pose_detector.detect_pose(sample_frames[0].copy(), conf=conf, iou=iou)
+        latencies = []
+        for _ in range(repeat):
+            for frame in sample_frames:
+                # 标注会原地绘制，每次使用副本（复制不计入耗时）
+                frame = frame.copy()
+                call_start = time.perf_counter()
+                analyzer.pose_detector.detect_pose(frame, conf=conf, iou=iou)
+                latencies.append(time.perf_counter() - call_start)
+        results['detect_pose'] = summarize(latencies, len(latencies), 'frames/s')
+
+    # 逐角度分析结果，供图表和报告环节使用
+    analysis_results = {}
+    if {'analyze_video', 'generate_charts', 'generate_report'} & set(targets):
+        per_angle = {}
+        latencies, frame_total = [], 0
+        for angle, video_path in video_paths.items():
+            output_path = os.path.join(work_dir, f"bench-{angle}.mp4")
+
+            def analyze():
+                if VIDEO_OUTPUT_CONFIG['mode'] == 'eager':
+                    return analyzer.analyze_video(video_path, angle, conf, iou, output_path=output_path)
+                return analyzer.analyze_video(video_path, angle, conf, iou, track_path=get_track_path(output_path))
+
+            angle_latencies, result = time_calls(analyze, repeat if 'analyze_video' in targets else 1,
+                                                 warmup if 'analyze_video' in targets else 0)
+            analysis_results[angle] = result
+            latencies.extend(angle_latencies)
+            frame_total += result['frame_count'] * len(angle_latencies)
+            per_angle[angle] = summarize(angle_latencies, result['frame_count'] * len(angle_latencies), 'frames/s')
+        if 'analyze_video' in targets:
+            results['analyze_video'] = summarize(latencies, frame_total, 'frames/s')
+            results['analyze_video']['views'] = per_angle
+
+    analysis_dir = os.path.join(work_dir, 'analysis_results')
+    reports_dir = os.path.join(work_dir, 'reports')
+    os.makedirs(analysis_dir, exist_ok=True)
+    os.makedirs(reports_dir, exist_ok=True)
+
+    if 'generate_charts' in targets or 'generate_report' in targets:
+        def charts():
+            figures = analyzer.data_processor.generate_charts(analysis_results, 'bench')
+            for name, figure in figures.items():
+                if figure:
+                    figure.savefig(os.path.join(analysis_dir, f"{name}.png"), dpi=300, bbox_inches='tight')
+                    plt.close(figure)
+            return figures
+
+        latencies, _ = time_calls(charts, repeat if 'generate_charts' in targets else 1,
+                                  warmup if 'generate_charts' in targets else 0)
+        if 'generate_charts' in targets:
+            results['generate_charts'] = summarize(latencies, len(latencies), 'calls/s')
+
+    if 'generate_report' in targets:
+        report_data = analyzer.data_processor.process_analysis_data(analysis_results, 'bench', 0)
+        latencies, _ = time_calls(
+            lambda: analyzer.report_generator.generate_report(report_data, reports_dir, 'bench'),
+            repeat, warmup
+        )
+        results['generate_report'] = summarize(latencies, len(latencies), 'calls/s')
+
+    if 'analyze_patient_videos' in targets:
+        absolute_paths = {angle: os.path.abspath(path) for angle, path in video_paths.items()}
+        latencies, frame_total, stages = [], 0, None
+        with working_directory(work_dir):
+            for i in range(warmup + repeat):
+                call_start = time.perf_counter()
+                result = analyzer.analyze_patient_videos(0, 'bench', absolute_paths, conf=conf, iou=iou)
+                if i >= warmup:
+                    latencies.append(time.perf_counter() - call_start)
+                    frame_total += result['performance']['counters'].get('frames', 0)
+                    stages = result['performance']['stages']
+        results['analyze_patient_videos'] = summarize(latencies, frame_total, 'frames/s')
+        results['analyze_patient_videos']['stages'] = stages
+
+    return results
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    与基线对比
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的相对退化比例（0.1表示10%）
+
+    Returns:
+        List[Dict[str, Any]]: 每个环节每个指标的对比，regression为True表示退化超过阈值
+    """
+    rows = []
+    for target, values in current['results'].items():
+        base_values = baseline.get('results', {}).get(target)
+        if not isinstance(values, dict) or not isinstance(base_values, dict):
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            value, base = values.get(metric), base_values.get(metric)
+            if not value or not base:
+                continue
+            change = (value - base) / base
+            worse = change > threshold if direction == 'lower' else change < -threshold
+            rows.append({
+                'target': target,
+                'metric': metric,
+                'baseline': base,
+                'current': value,
+                'change': round(change, 4),
+                'regression': worse
+            })
+    return rows
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """打印结果表格"""
+    print(f"{'环节':<26}{'次数':>6}{'p50(ms)':>12}{'p95(ms)':>12}{'吞吐量':>12}  单位        内存峰值(MB)")
+    for target in ('model_load',) + TARGETS:
+        values = results.get(target)
+        if not values:
+            continue
+        print(f"{target:<26}{values['calls']:>6}{values['p50_ms'] or 0:>12.2f}{values['p95_ms'] or 0:>12.2f}"
+              f"{values['throughput'] or 0:>12.2f}  {values['throughput_unit']:<12}{values['peak_rss_mb']}")
+
+
+def print_comparison(rows: List[Dict[str, Any]], threshold: float) -> None:
+    """打印对比表格"""
+    print(f"\n与基线对比（阈值 {threshold:.0%}）:")
+    for row in rows:
+        flag = '退化' if row['regression'] else ''
+        print(f"  {row['target']:<26}{row['metric']:<12}{row['baseline']:>12.2f} -> {row['current']:>12.2f}"
+              f"  {row['change']:+.1%}  {flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='分析流程性能基准测试')
+    parser.add_argument('--source', choices=('synthetic', 'samples'), default='synthetic',
+                        help='synthetic: 生成合成视频；samples: 使用 patients_data/*/videos 下的样例视频')
+    parser.add_argument('--patient', help='样例患者文件夹名称，例如 1-张三')
+    parser.add_argument('--videos', nargs='+', metavar='ANGLE=PATH', help='直接指定视频，例如 front=a.mp4')
+    parser.add_argument('--width', type=int, default=640, help='合成视频宽度')
+    parser.add_argument('--height', type=int, default=480, help='合成视频高度')
+    parser.add_argument('--fps', type=float, default=30.0, help='合成视频帧率')
+    parser.add_argument('--duration', type=float, default=4.0, help='合成视频时长（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='合成视频随机种子')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='要测量的环节，逗号分隔')
+    parser.add_argument('--model', default=None, help='模型路径，默认使用配置的模型')
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--repeat', type=int, default=3, help='每个环节的重复次数')
+    parser.add_argument('--warmup', type=int, default=1, help='每个环节的预热次数')
+    parser.add_argument('--frames', type=int, default=60, help='detect_pose 测量使用的帧数')
+    parser.add_argument('--output', help='结果JSON路径，默认 benchmarks/results/bench_<时间>.json')
+    parser.add_argument('--baseline', help='对比的基线JSON')
+    parser.add_argument('--threshold', type=float, default=0.1, help='判定退化的相对变化比例')
+    parser.add_argument('--keep', action='store_true', help='保留临时输出目录')
+    args = parser.parse_args(argv)
+
+    targets = [target.strip() for target in args.targets.split(',') if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"未知环节: {', '.join(sorted(unknown))}")
+
+    if args.videos:
+        video_paths = dict(item.split('=', 1) for item in args.videos)
+        source = {'type': 'files', 'videos': video_paths}
+    elif args.source == 'samples':
+        video_paths = find_sample_videos(args.patient)
+        source = {'type': 'samples', 'videos': video_paths}
+    else:
+        video_paths = generate_synthetic_set(SYNTHETIC_DIR, args.width, args.height, args.fps,
+                                             args.duration, args.seed)
+        source = {'type': 'synthetic', 'width': args.width, 'height': args.height, 'fps': args.fps,
+                  'duration': args.duration, 'seed': args.seed}
+
+    model_path = args.model or os.path.join(PROJECT_ROOT, get_model_path())
+    work_dir = tempfile.mkdtemp(prefix='pose_bench_')
+    try:
+        results = run_benchmarks(video_paths, targets, model_path, args.repeat, args.warmup,
+                                 args.frames, args.conf, args.iou, work_dir)
+    finally:
+        if args.keep:
+            print(f"临时输出目录: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'video_output_mode': VIDEO_OUTPUT_CONFIG['mode'],
+            'model_path': model_path,
+            'conf': args.conf,
+            'iou': args.iou,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'source': source,
+            'backend': results.pop('backend')
+        },
+        'results': results
+    }
+
+    print_results(results)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(report, baseline, args.threshold)
+        report['comparison'] = {'baseline': args.baseline, 'threshold': args.threshold, 'rows': rows}
+        print_comparison(rows, args.threshold)
+        if any(row['regression'] for row in rows):
+            exit_code = 1
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,507 @@
+"""
+Web接口压力测试
+在临时工作目录中启动应用（预置SQLite数据库、样例视频和分析结果，可用桩检测器代替模型），
+按逐级增加的并发数模拟医生的混合操作，统计各接口的延迟分位数、错误率和吞吐量
+
+用法（在项目根目录执行）:
+    python -m benchmarks.load_test                                     # 桩检测器，并发 1,2,4,8,16，每级30秒
+    python -m benchmarks.load_test --concurrency 4,8,16,32 --stage-seconds 60
+    python -m benchmarks.load_test --detector yolo                     # 使用真实模型（需要 model/ 下的模型文件）
+    python -m benchmarks.load_test --url http://127.0.0.1:5050 --username admin --password xxx  # 压测已运行的服务
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 各操作的权重（相对比例）
+TRAFFIC_MIX = {
+    'patients_page': 30,
+    'patients_search': 15,
+    'patient_detail': 10,
+    'analysis_results': 15,
+    'download_chart': 8,
+    'download_keyframe': 8,
+    'download_report': 4,
+    'upload_video': 5,
+    'analyze_video': 5
+}
+
+LOAD_TEST_USER = {'username': 'loadtest', 'password': 'loadtest', 'name': '压测用户'}
+SEARCH_TERMS = ['压测', '00', '01', '1', '2', '张', '不存在']
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class Recorder:
+    """请求结果记录类（线程安全）"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, ok))
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        """
+        汇总各接口的结果
+
+        Args:
+            duration: 本级测试时长（秒）
+
+        Returns:
+            Dict[str, Any]: 总请求数、吞吐量、错误率和各接口的延迟分位数
+        """
+        with self._lock:
+            samples = {route: list(values) for route, values in self.samples.items()}
+
+        routes = {}
+        total, total_errors = 0, 0
+        for route, values in sorted(samples.items()):
+            latencies = [seconds for seconds, _ in values]
+            errors = sum(1 for _, ok in values if not ok)
+            total += len(values)
+            total_errors += errors
+            to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+            routes[route] = {
+                'count': len(values),
+                'errors': errors,
+                'error_rate': round(errors / len(values), 4),
+                'rps': round(len(values) / duration, 3) if duration > 0 else None,
+                'p50_ms': to_ms(percentile(latencies, 50)),
+                'p90_ms': to_ms(percentile(latencies, 90)),
+                'p95_ms': to_ms(percentile(latencies, 95)),
+                'p99_ms': to_ms(percentile(latencies, 99)),
+                'max_ms': to_ms(max(latencies))
+            }
+        return {
+            'requests': total,
+            'throughput_rps': round(total / duration, 3) if duration > 0 else None,
+            'error_rate': round(total_errors / total, 4) if total else 0.0,
+            'routes': routes
+        }
+
+
+class VirtualClinician:
+    """模拟一个医生的会话（独立的Cookie）"""
+
+    def __init__(self, base_url: str, recorder: Recorder, rng: random.Random, config: Dict[str, Any]):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.rng = rng
+        self.config = config
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.result_files: Dict[int, Dict[str, List[str]]] = {}
+
+    def request(self, route: str, path: str, data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, method: Optional[str] = None) -> Tuple[int, bytes]:
+        """发送请求并记录耗时，返回状态码和响应内容"""
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers or {}, method=method)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.config['timeout']) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            self.recorder.record(route, time.perf_counter() - start, False)
+            return 0, b''
+        self.recorder.record(route, time.perf_counter() - start, status < 400)
+        return status, body
+
+    def request_json(self, route: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """发送请求并解析JSON响应"""
+        data, headers = None, {}
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        status, body = self.request(route, path, data, headers)
+        try:
+            return json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            return {}
+
+    def login(self) -> bool:
+        data = urllib.parse.urlencode({
+            'username': self.config['username'],
+            'password': self.config['password']
+        }).encode('utf-8')
+        status, _ = self.request('login', '/login', data, {'Content-Type': 'application/x-www-form-urlencoded'})
+        return status == 200
+
+    def _read_only_patient(self) -> int:
+        """有预置分析结果、只读的患者（避免与重新分析冲突）"""
+        return self.rng.randint(1, self.config['analyzed_patients'])
+
+    def _writable_patient(self) -> int:
+        """用于上传和提交分析的患者"""
+        return self.rng.randint(self.config['analyzed_patients'] + 1, self.config['patients'])
+
+    def patients_page(self) -> None:
+        pages = max(1, self.config['patients'] // 20)
+        self.request_json('patients_page', f"/api/patients?page={self.rng.randint(1, pages)}&page_size=20")
+
+    def patients_search(self) -> None:
+        term = urllib.parse.quote(self.rng.choice(SEARCH_TERMS))
+        self.request_json('patients_search', f"/api/patients?search={term}&page=1&page_size=20")
+
+    def patient_detail(self) -> None:
+        self.request_json('patient_detail', f"/api/patients/{self._read_only_patient()}")
+
+    def analysis_results(self, patient_id: Optional[int] = None) -> Dict[str, List[str]]:
+        patient_id = patient_id or self._read_only_patient()
+        result = self.request_json('analysis_results', f"/api/patients/{patient_id}/analysis_results")
+        files = {
+            'charts': [item['url'] for item in result.get('analysis_results', {}).get('charts', [])],
+            'keyframes': [item['url'] for item in result.get('analysis_results', {}).get('keyframes', [])],
+            'reports': [item['url'] for item in result.get('reports', [])]
+        }
+        self.result_files[patient_id] = files
+        return files
+
+    def _download(self, route: str, kind: str) -> None:
+        patient_id = self._read_only_patient()
+        files = self.result_files.get(patient_id) or self.analysis_results(patient_id)
+        if files.get(kind):
+            self.request(route, self.rng.choice(files[kind]))
+
+    def download_chart(self) -> None:
+        self._download('download_chart', 'charts')
+
+    def download_keyframe(self) -> None:
+        self._download('download_keyframe', 'keyframes')
+
+    def download_report(self) -> None:
+        self._download('download_report', 'reports')
+
+    def upload_video(self) -> None:
+        angle = self.rng.choice(['front', 'side', 'back'])
+        boundary = uuid.uuid4().hex
+        with open(self.config['clips'][angle], 'rb') as f:
+            content = f.read()
+        fields = [
+            (f'--{boundary}\r\nContent-Disposition: form-data; name="angle"\r\n\r\n{angle}\r\n').encode('utf-8'),
+            (f'--{boundary}\r\nContent-Disposition: form-data; name="patientId"\r\n\r\n'
+             f'{self._writable_patient()}\r\n').encode('utf-8'),
+            (f'--{boundary}\r\nContent-Disposition: form-data; name="video"; filename="{angle}.mp4"\r\n'
+             f'Content-Type: video/mp4\r\n\r\n').encode('utf-8') + content + b'\r\n',
+            f'--{boundary}--\r\n'.encode('utf-8')
+        ]
+        self.request('upload_video', '/api/upload_video', b''.join(fields),
+                     {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    def analyze_video(self, patient_id: Optional[int] = None) -> None:
+        """提交分析并轮询状态直到完成（整个任务耗时记录为 analysis_job）"""
+        start = time.perf_counter()
+        result = self.request_json('analyze_video', '/api/analyze_video', {
+            'patientId': patient_id or self._writable_patient(),
+            'videos': {'front': True, 'side': True, 'back': True},
+            'confidenceThreshold': 50
+        })
+        analysis_id = result.get('analysisId')
+        if not analysis_id:
+            return
+
+        deadline = time.monotonic() + self.config['analysis_timeout']
+        status = None
+        while time.monotonic() < deadline:
+            time.sleep(self.config['poll_interval'])
+            status = self.request_json('analysis_status', f"/api/analysis_status/{analysis_id}") \
+                .get('status', {}).get('status')
+            if status in ('completed', 'error', 'stopped'):
+                break
+        self.recorder.record('analysis_job', time.perf_counter() - start, status == 'completed')
+
+    def run(self, deadline: float) -> None:
+        """在截止时间前按权重随机执行操作"""
+        if not self.login():
+            return
+        actions = list(TRAFFIC_MIX)
+        weights = [TRAFFIC_MIX[action] for action in actions]
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choices(actions, weights)[0])()
+            think = self.config['think_time']
+            if think > 0:
+                time.sleep(self.rng.uniform(0, 2 * think))
+
+
+def read_server_rss_mb(base_url: str) -> Optional[float]:
+    """从 /metrics 读取服务进程当前内存（MB）"""
+    try:
+        with urllib.request.urlopen(base_url.rstrip('/') + '/metrics', timeout=10) as response:
+            text = response.read().decode('utf-8')
+    except (urllib.error.URLError, OSError):
+        return None
+    match = re.search(r'^pose_process_resident_memory_bytes (\S+)$', text, re.MULTILINE)
+    return round(float(match.group(1)) / (1024 * 1024), 1) if match else None
+
+
+def run_stage(base_url: str, concurrency: int, seconds: float, config: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    """执行一级并发的测试"""
+    recorder = Recorder()
+    deadline = time.monotonic() + seconds
+    threads = []
+    start = time.perf_counter()
+    for i in range(concurrency):
+        clinician = VirtualClinician(base_url, recorder, random.Random(seed * 1000 + i), config)
+        thread = threading.Thread(target=clinician.run, args=(deadline,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    stage = {'concurrency': concurrency, 'duration': round(duration, 2), **recorder.summary(duration)}
+    stage['server_rss_mb'] = read_server_rss_mb(base_url)
+    return stage
+
+
+def print_stage(stage: Dict[str, Any]) -> None:
+    """打印一级并发的结果"""
+    print(f"\n并发 {stage['concurrency']}: {stage['requests']} 个请求, {stage['throughput_rps']} req/s, "
+          f"错误率 {stage['error_rate']:.2%}, 服务内存 {stage['server_rss_mb']} MB")
+    print(f"  {'接口':<20}{'次数':>7}{'错误率':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for route, values in stage['routes'].items():
+        print(f"  {route:<20}{values['count']:>7}{values['error_rate']:>9.2%}{values['p50_ms']:>10.1f}"
+              f"{values['p95_ms']:>10.1f}{values['p99_ms']:>10.1f}")
+
+
+def prepare_workspace(workspace: str) -> Dict[str, str]:
+    """创建工作目录：用户配置和上传用的短视频"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from pose_analysis.synthetic import generate_synthetic_set
+
+    os.makedirs(workspace, exist_ok=True)
+    with open(os.path.join(workspace, 'config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(
+            "credentials:\n"
+            "  usernames:\n"
+            f"    {LOAD_TEST_USER['username']}:\n"
+            "      email: loadtest@example.com\n"
+            f"      name: {LOAD_TEST_USER['name']}\n"
+            f"      password: {LOAD_TEST_USER['password']}\n"
+            "      role: admin\n"
+        )
+    return generate_synthetic_set(os.path.join(workspace, 'clips'), width=320, height=240, fps=30.0, duration=3.0)
+
+
+def seed_database(web: Any, patients: int, seed: int, clips: Dict[str, str]) -> None:
+    """
+    预置患者和三个角度的视频（数据库为空时执行）
+
+    Args:
+        web: app模块
+        patients: 患者数量
+        seed: 随机种子
+        clips: 各角度的样例视频
+    """
+    rng = random.Random(seed)
+    with web.app.app_context():
+        web.db.create_all()
+        if web.Patient.query.count() > 0:
+            return
+
+        for i in range(patients):
+            web.db.session.add(web.Patient(
+                username=f"压测{i:04d}",
+                age=rng.randint(18, 85),
+                gender=rng.choice(['男', '女']),
+                symptoms=rng.choice(['肩痛', '活动受限', '无']),
+                duration=rng.randint(1, 24),
+                height=rng.randint(150, 190),
+                weight=rng.randint(45, 95)
+            ))
+        web.db.session.commit()
+
+        for patient in web.Patient.query.order_by(web.Patient.id).all():
+            folder_name = "".join(c for c in f"{patient.id}-{patient.username}" if c.isalnum() or c in ('-', '_'))
+            videos_dir = os.path.join(web.PATIENTS_DATA_DIR, folder_name, 'videos')
+            os.makedirs(videos_dir, exist_ok=True)
+            for angle, clip in clips.items():
+                shutil.copyfile(clip, os.path.join(videos_dir, f"{angle}.mp4"))
+
+
+def seed_results(base_url: str, config: Dict[str, Any]) -> None:
+    """通过分析接口为只读患者生成图表、关键帧和报告（不计入压测结果）"""
+    clinician = VirtualClinician(base_url, Recorder(), random.Random(0), config)
+    if not clinician.login():
+        raise RuntimeError('压测用户登录失败')
+    for patient_id in range(1, config['analyzed_patients'] + 1):
+        clinician.analyze_video(patient_id)
+    failed = [route for route, values in clinician.recorder.samples.items() if not all(ok for _, ok in values)]
+    if failed:
+        raise RuntimeError(f"预置分析结果失败: {failed}")
+
+
+def serve(args: argparse.Namespace) -> None:
+    """子进程入口：预置数据后启动应用（工作目录为压测工作目录）"""
+    sys.path.insert(0, PROJECT_ROOT)
+    import app as web
+
+    clips = json.loads(args.clips)
+    seed_database(web, args.patients, args.seed, clips)
+    web.app.run(host='127.0.0.1', port=args.port, threaded=True, debug=False, use_reloader=False)
+
+
+def wait_until_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    """等待服务就绪"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"应用进程已退出，退出码 {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + '/ready', timeout=5):
+                return
+        except urllib.error.HTTPError:
+            return  # 服务已响应（模型文件等检查未通过不影响压测Web层）
+        except (urllib.error.URLError, OSError):
+            time.sleep(1)
+    raise TimeoutError(f"等待服务启动超时: {base_url}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Web接口压力测试')
+    parser.add_argument('mode', nargs='?', choices=('run', 'serve'), default='run', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help='压测已运行的服务，不启动本地应用')
+    parser.add_argument('--username', default=LOAD_TEST_USER['username'])
+    parser.add_argument('--password', default=LOAD_TEST_USER['password'])
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='逐级并发数，逗号分隔')
+    parser.add_argument('--stage-seconds', type=float, default=30.0, help='每级并发的持续时间（秒）')
+    parser.add_argument('--think-time', type=float, default=0.5, help='两次操作之间的平均间隔（秒）')
+    parser.add_argument('--patients', type=int, default=100, help='预置患者数量')
+    parser.add_argument('--analyzed', type=int, default=10, help='患者1..N只读，供下载分析结果；其余患者用于上传和提交分析')
+    parser.add_argument('--detector', choices=('stub', 'yolo'), default='stub', help='stub: 桩检测器，只压测Web层')
+    parser.add_argument('--stub-latency', type=float, default=0.02, help='桩检测器模拟单帧推理耗时（秒）')
+    parser.add_argument('--batching', action='store_true', help='启用跨任务动态批处理（POSE_BATCHING=1）')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60.0, help='单个请求超时（秒）')
+    parser.add_argument('--analysis-timeout', type=float, default=300.0, help='单个分析任务等待上限（秒）')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='分析状态轮询间隔（秒）')
+    parser.add_argument('--workspace', help='工作目录，默认创建临时目录')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录')
+    parser.add_argument('--output', help='结果JSON路径，默认 benchmarks/results/load_<时间>.json')
+    parser.add_argument('--clips', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode == 'serve':
+        serve(args)
+        return 0
+
+    if not 0 < args.analyzed < args.patients:
+        parser.error('--analyzed 必须大于0且小于 --patients')
+
+    workspace = args.workspace or tempfile.mkdtemp(prefix='pose_load_')
+    clips = prepare_workspace(workspace)
+    process = None
+    base_url = (args.url or f"http://127.0.0.1:{args.port}").rstrip('/')
+
+    try:
+        if not args.url:
+            env = dict(os.environ)
+            env.update({
+                'PYTHONPATH': PROJECT_ROOT + os.pathsep + env.get('PYTHONPATH', ''),
+                'POSE_DATABASE_URI': 'sqlite:///' + os.path.join(os.path.abspath(workspace), 'patients.db'),
+                'POSE_PATIENTS_DATA_DIR': os.path.join(os.path.abspath(workspace), 'patients_data'),
+                'POSE_DETECTOR': args.detector,
+                'POSE_STUB_LATENCY': str(args.stub_latency),
+                'POSE_BATCHING': '1' if args.batching else '0',
+                'POSE_LOG_LEVEL': env.get('POSE_LOG_LEVEL', 'WARNING')
+            })
+            if args.detector == 'yolo':
+                model_dir = os.path.join(workspace, 'model')
+                if not os.path.exists(model_dir):
+                    os.symlink(os.path.join(PROJECT_ROOT, 'model'), model_dir)
+            command = [sys.executable, '-m', 'benchmarks.load_test', 'serve',
+                       '--port', str(args.port), '--patients', str(args.patients),
+                       '--seed', str(args.seed), '--clips', json.dumps(clips)]
+            print(f"启动应用: {base_url}（工作目录 {workspace}）")
+            process = subprocess.Popen(command, cwd=workspace, env=env)
+            wait_until_ready(base_url, 600, process)
+
+        config = {
+            'username': args.username,
+            'password': args.password,
+            'patients': args.patients,
+            'analyzed_patients': args.analyzed,
+            'clips': clips,
+            'timeout': args.timeout,
+            'analysis_timeout': args.analysis_timeout,
+            'poll_interval': args.poll_interval,
+            'think_time': args.think_time
+        }
+        if not args.url:
+            print(f"预置 {args.analyzed} 位患者的分析结果...")
+            seed_results(base_url, config)
+
+        stages = []
+        for concurrency in [int(value) for value in args.concurrency.split(',') if value.strip()]:
+            stage = run_stage(base_url, concurrency, args.stage_seconds, config, args.seed)
+            print_stage(stage)
+            stages.append(stage)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not args.keep and not args.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'url': base_url,
+            'detector': None if args.url else args.detector,
+            'stub_latency': args.stub_latency if args.detector == 'stub' and not args.url else None,
+            'batching': None if args.url else args.batching,
+            'patients': args.patients,
+            'analyzed_patients': args.analyzed,
+            'think_time': args.think_time,
+            'stage_seconds': args.stage_seconds,
+            'traffic_mix': TRAFFIC_MIX
+        },
+        'stages': stages
+    }
+    output = args.output or os.path.join(PROJECT_ROOT, 'benchmarks', 'results',
+                                         f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+    return 0 if all(stage['error_rate'] == 0 for stage in stages) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
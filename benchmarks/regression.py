@@ -0,0 +1,383 @@
+"""
+分析结果精度回归测试
+记录样例视频的参考输出（逐帧关键点、angle_data、velocity_data、wrist_height_data 和报告摘要），
+之后用任意流程配置重新分析并按容差对比，报告偏离的帧。完全离线、在CPU上运行
+
+用法（在项目根目录执行）:
+    python -m benchmarks.regression record                          # 用当前配置记录参考输出
+    python -m benchmarks.regression compare                         # 用当前配置对比
+    python -m benchmarks.regression compare --set VIDEO_OUTPUT_CONFIG.mode=eager --tol max_angle=0.5
+    python -m benchmarks.regression compare --cases synthetic --report benchmarks/results/regression.json
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 回归测试固定在CPU上运行，且不访问网络
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+os.environ.setdefault('YOLO_OFFLINE', '1')
+
+import numpy as np
+
+from benchmarks.bench_pipeline import PROJECT_ROOT, SYNTHETIC_DIR, get_git_commit
+from pose_analysis import config as analysis_config
+from pose_analysis.config import KEYPOINTS_CONFIG, get_model_path
+from pose_analysis.json_serializer import convert_numpy_types
+from pose_analysis.keypoint_store import KeypointStore
+from pose_analysis.synthetic import generate_synthetic_set
+
+GOLDEN_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'golden')
+
+# 默认容差
+DEFAULT_TOLERANCES = {
+    'frame_angle': 2.0,       # 逐帧角度（度）
+    'frame_wrist_height': 0.02,  # 逐帧手腕高度
+    'keypoint_px': 3.0,       # 逐帧临床关键点平均偏移（像素）
+    'max_angle': 1.0,         # 报告最大角度（度）
+    'stage_velocity': 5.0,    # 分阶段角速度（度/秒）
+    'max_velocity': 10.0,     # 最大角速度（度/秒）
+    'wrist_height': 0.02,     # 报告手腕最大/平均高度
+    'function_score': 1.0,    # 综合评分
+    'divergent_ratio': 0.02   # 允许偏离的帧比例
+}
+
+# 参与关键点对比的关节：双肩、双肘、双腕、双髋
+CLINICAL_KEYPOINTS = [KEYPOINTS_CONFIG[name] for name in (
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip'
+)]
+
+SYNTHETIC_CASE = 'synthetic'
+
+
+def find_cases(selected: Optional[List[str]] = None) -> Dict[str, Dict[str, str]]:
+    """
+    查找测试用例：合成视频和 patients_data/*/videos 下的样例视频
+
+    Args:
+        selected: 用例名称列表（'synthetic' 或患者文件夹名称），None表示全部
+
+    Returns:
+        Dict[str, Dict[str, str]]: {用例名称: {角度: 视频路径}}
+    """
+    cases = {}
+    if not selected or SYNTHETIC_CASE in selected:
+        cases[SYNTHETIC_CASE] = generate_synthetic_set(SYNTHETIC_DIR)
+
+    for videos_dir in sorted(glob.glob(os.path.join(PROJECT_ROOT, 'patients_data', '*', 'videos'))):
+        name = os.path.basename(os.path.dirname(videos_dir))
+        if selected and name not in selected:
+            continue
+        video_paths = {}
+        for angle in ('front', 'side', 'back'):
+            path = os.path.join(videos_dir, f"{angle}.mp4")
+            if os.path.exists(path):
+                video_paths[angle] = path
+        if video_paths:
+            cases[name] = video_paths
+    return cases
+
+
+def apply_overrides(overrides: List[str]) -> Dict[str, Any]:
+    """
+    修改 pose_analysis/config.py 中的配置字典，例如 VIDEO_OUTPUT_CONFIG.mode=eager
+
+    Args:
+        overrides: SECTION.key=value 列表，value按JSON解析，失败时按字符串处理
+
+    Returns:
+        Dict[str, Any]: 实际应用的配置
+    """
+    applied = {}
+    for item in overrides or []:
+        key, _, raw = item.partition('=')
+        section, _, name = key.partition('.')
+        target = getattr(analysis_config, section, None)
+        if not isinstance(target, dict) or not name:
+            raise ValueError(f"无效的配置项: {item}")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        target[name] = value
+        applied[key] = value
+    return applied
+
+
+def first_person_keypoints(store: KeypointStore, conf: float) -> np.ndarray:
+    """
+    提取每帧第一个人的关键点
+
+    Returns:
+        np.ndarray: (帧数, 17, 3)，未检测到人体的帧为NaN
+    """
+    keypoints = np.full((store.frame_count, 17, 3), np.nan, dtype=np.float32)
+    for i in range(store.frame_count):
+        detections, _, _ = store.frame_detections(i, conf)
+        if len(detections):
+            keypoints[i] = detections[0]
+    return keypoints
+
+
+def run_case(analyzer: Any, video_paths: Dict[str, str], conf: float, iou: float,
+             work_dir: str) -> Dict[str, Any]:
+    """
+    分析一个用例的全部角度
+
+    Returns:
+        Dict[str, Any]: {'views': {角度: 逐帧数据}, 'keypoints': {角度: 关键点数组}, 'report': 报告摘要}
+    """
+    views, keypoints, analysis_results = {}, {}, {}
+    for angle, video_path in video_paths.items():
+        track_path = os.path.join(work_dir, f"{angle}_track.npz")
+        result = analyzer.analyze_video(video_path, angle, conf, iou, track_path=track_path)
+        analysis_results[angle] = result
+        views[angle] = convert_numpy_types({
+            'frame_count': result['frame_count'],
+            'angle_data': result['angle_data'],
+            'velocity_data': result['velocity_data'],
+            'wrist_height_data': result['wrist_height_data']
+        })
+        keypoints[angle] = first_person_keypoints(KeypointStore.load(track_path), conf)
+
+    report = convert_numpy_types(analyzer.data_processor.process_analysis_data(analysis_results, 'regression', 0))
+    report.pop('patient_info', None)
+    return {'views': views, 'keypoints': keypoints, 'report': report}
+
+
+def save_golden(case_dir: str, output: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    """保存参考输出"""
+    os.makedirs(case_dir, exist_ok=True)
+    for angle, keypoints in output['keypoints'].items():
+        np.savez_compressed(os.path.join(case_dir, f"{angle}_keypoints.npz"), keypoints=keypoints)
+    with open(os.path.join(case_dir, 'reference.json'), 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'views': output['views'], 'report': output['report']},
+                  f, ensure_ascii=False, indent=2)
+
+
+def load_golden(case_dir: str) -> Optional[Dict[str, Any]]:
+    """加载参考输出，不存在时返回None"""
+    reference_path = os.path.join(case_dir, 'reference.json')
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    golden['keypoints'] = {}
+    for angle in golden['views']:
+        path = os.path.join(case_dir, f"{angle}_keypoints.npz")
+        if os.path.exists(path):
+            golden['keypoints'][angle] = np.load(path)['keypoints']
+    return golden
+
+
+def _compare_value(failures: List[Dict[str, Any]], path: str, expected: Any, actual: Any,
+                   tolerance: float) -> None:
+    """对比单个数值，超出容差时记录"""
+    if expected is None or actual is None:
+        if expected != actual:
+            failures.append({'field': path, 'expected': expected, 'actual': actual})
+        return
+    if abs(float(actual) - float(expected)) > tolerance:
+        failures.append({'field': path, 'expected': expected, 'actual': actual,
+                         'diff': round(float(actual) - float(expected), 4), 'tolerance': tolerance})
+
+
+def compare_report(expected: Dict[str, Any], actual: Dict[str, Any],
+                   tolerances: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    对比报告摘要（最大角度、分阶段角速度、手腕高度、综合评分）
+
+    Returns:
+        List[Dict[str, Any]]: 超出容差的字段
+    """
+    failures = []
+    for section in ('front_shoulder_data', 'side_shoulder_data'):
+        for side in ('left_shoulder_data', 'right_shoulder_data'):
+            exp = expected.get(section, {}).get(side, {})
+            act = actual.get(section, {}).get(side, {})
+            prefix = f"{section}.{side}"
+            for field in ('max_angle', 'min_angle', 'angle_range'):
+                if field in exp or field in act:
+                    _compare_value(failures, f"{prefix}.{field}", exp.get(field), act.get(field),
+                                   tolerances['max_angle'])
+            if 'max_velocity' in exp or 'max_velocity' in act:
+                _compare_value(failures, f"{prefix}.max_velocity", exp.get('max_velocity'),
+                               act.get('max_velocity'), tolerances['max_velocity'])
+            exp_stages = exp.get('velocity_stages') or []
+            act_stages = act.get('velocity_stages') or []
+            for i in range(max(len(exp_stages), len(act_stages))):
+                _compare_value(failures, f"{prefix}.velocity_stages[{i}]",
+                               exp_stages[i] if i < len(exp_stages) else None,
+                               act_stages[i] if i < len(act_stages) else None,
+                               tolerances['stage_velocity'])
+
+    exp_wrist, act_wrist = expected.get('wrist_data', {}), actual.get('wrist_data', {})
+    for field in sorted(set(exp_wrist) | set(act_wrist)):
+        _compare_value(failures, f"wrist_data.{field}", exp_wrist.get(field), act_wrist.get(field),
+                       tolerances['wrist_height'])
+
+    _compare_value(failures, 'summary.function_score', expected.get('summary', {}).get('function_score'),
+                   actual.get('summary', {}).get('function_score'), tolerances['function_score'])
+    return failures
+
+
+def compare_view(angle: str, expected: Dict[str, Any], actual: Dict[str, Any],
+                 expected_keypoints: Optional[np.ndarray], actual_keypoints: np.ndarray,
+                 tolerances: Dict[str, float]) -> Dict[str, Any]:
+    """
+    逐帧对比一个角度的输出
+
+    Returns:
+        Dict[str, Any]: 帧数、偏离帧列表和偏离比例
+    """
+    divergent: Dict[int, Dict[str, Any]] = {}
+
+    def mark(frame: int, field: str, exp: Any, act: Any) -> None:
+        divergent.setdefault(frame, {})[field] = {'expected': exp, 'actual': act}
+
+    if angle in ('front', 'side'):
+        for exp, act in zip(expected['angle_data'], actual['angle_data']):
+            for field in ('left_angle', 'right_angle'):
+                if abs(act[field] - exp[field]) > tolerances['frame_angle']:
+                    mark(exp['frame'], field, exp[field], act[field])
+    else:
+        for exp, act in zip(expected['wrist_height_data'], actual['wrist_height_data']):
+            for field in ('left_wrist_height', 'right_wrist_height'):
+                if abs(act[field] - exp[field]) > tolerances['frame_wrist_height']:
+                    mark(exp['frame'], field, exp[field], act[field])
+
+    if expected_keypoints is not None:
+        frames = min(len(expected_keypoints), len(actual_keypoints))
+        exp_points = expected_keypoints[:frames, CLINICAL_KEYPOINTS, :2]
+        act_points = actual_keypoints[:frames, CLINICAL_KEYPOINTS, :2]
+        exp_missing = np.isnan(exp_points).all(axis=(1, 2))
+        act_missing = np.isnan(act_points).all(axis=(1, 2))
+        with np.errstate(invalid='ignore'):
+            distances = np.nanmean(np.linalg.norm(act_points - exp_points, axis=2), axis=1)
+        for i in range(frames):
+            if exp_missing[i] != act_missing[i]:
+                mark(i + 1, 'detection', not exp_missing[i], not act_missing[i])
+            elif not exp_missing[i] and distances[i] > tolerances['keypoint_px']:
+                mark(i + 1, 'keypoint_px', 0.0, round(float(distances[i]), 2))
+
+    frame_count = expected['frame_count']
+    ratio = len(divergent) / frame_count if frame_count else 0.0
+    return {
+        'frame_count': {'expected': frame_count, 'actual': actual['frame_count']},
+        'divergent_frames': len(divergent),
+        'divergent_ratio': round(ratio, 4),
+        'frames': [{'frame': frame, **fields} for frame, fields in sorted(divergent.items())],
+        'passed': frame_count == actual['frame_count'] and ratio <= tolerances['divergent_ratio']
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='分析结果精度回归测试')
+    parser.add_argument('command', choices=('record', 'compare'), help='record: 记录参考输出；compare: 与参考输出对比')
+    parser.add_argument('--cases', help="用例，逗号分隔（'synthetic' 或患者文件夹名称），默认全部")
+    parser.add_argument('--golden-dir', default=GOLDEN_DIR, help='参考输出目录')
+    parser.add_argument('--model', default=None, help='模型路径，默认使用配置的模型')
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='SECTION.key=value',
+                        help='覆盖 pose_analysis/config.py 中的配置，可重复')
+    parser.add_argument('--tol', action='append', default=[], metavar='name=value',
+                        help=f"覆盖容差，可选: {', '.join(DEFAULT_TOLERANCES)}")
+    parser.add_argument('--report', help='对比报告JSON路径，默认 benchmarks/results/regression_<时间>.json')
+    parser.add_argument('--max-frames', type=int, default=50, help='报告中每个角度最多列出的偏离帧数')
+    args = parser.parse_args(argv)
+
+    tolerances = dict(DEFAULT_TOLERANCES)
+    for item in args.tol:
+        name, _, value = item.partition('=')
+        if name not in tolerances:
+            parser.error(f"未知容差: {name}")
+        tolerances[name] = float(value)
+
+    overrides = apply_overrides(args.overrides)
+    cases = find_cases(args.cases.split(',') if args.cases else None)
+    if not cases:
+        parser.error('没有找到测试用例')
+
+    from pose_analysis.video_analyzer import VideoAnalyzer
+    model_path = args.model or os.path.join(PROJECT_ROOT, get_model_path())
+    analyzer = VideoAnalyzer(model_path)
+
+    meta = {
+        'time': datetime.now().isoformat(),
+        'git_commit': get_git_commit(),
+        'model_path': os.path.relpath(model_path, PROJECT_ROOT),
+        'conf': args.conf,
+        'iou': args.iou,
+        'overrides': overrides
+    }
+
+    summary = {'meta': meta, 'tolerances': tolerances, 'cases': {}}
+    all_passed = True
+    for case, video_paths in cases.items():
+        case_dir = os.path.join(args.golden_dir, case)
+        work_dir = tempfile.mkdtemp(prefix='pose_regression_')
+        try:
+            output = run_case(analyzer, video_paths, args.conf, args.iou, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if args.command == 'record':
+            save_golden(case_dir, output, meta)
+            print(f"已记录参考输出: {case_dir}")
+            continue
+
+        golden = load_golden(case_dir)
+        if golden is None:
+            print(f"{case}: 缺少参考输出，跳过（先运行 record）")
+            continue
+
+        views = {}
+        for angle, expected in golden['views'].items():
+            if angle not in output['views']:
+                views[angle] = {'passed': False, 'error': '本次未分析该角度'}
+                continue
+            view = compare_view(angle, expected, output['views'][angle], golden['keypoints'].get(angle),
+                                output['keypoints'][angle], tolerances)
+            view['frames'] = view['frames'][:args.max_frames]
+            views[angle] = view
+
+        report_failures = compare_report(golden['report'], output['report'], tolerances)
+        passed = not report_failures and all(view['passed'] for view in views.values())
+        all_passed = all_passed and passed
+        summary['cases'][case] = {'passed': passed, 'report': report_failures, 'views': views}
+
+        print(f"{case}: {'通过' if passed else '未通过'}")
+        for failure in report_failures:
+            print(f"  {failure['field']}: {failure['expected']} -> {failure['actual']}")
+        for angle, view in views.items():
+            if 'error' in view:
+                print(f"  {angle}: {view['error']}")
+                continue
+            print(f"  {angle}: 偏离帧 {view['divergent_frames']}/{view['frame_count']['expected']}"
+                  f" ({view['divergent_ratio']:.1%})")
+            for frame in view['frames'][:5]:
+                print(f"    第{frame['frame']}帧: " + ', '.join(
+                    f"{field} {values['expected']} -> {values['actual']}"
+                    for field, values in frame.items() if field != 'frame'))
+
+    if args.command == 'compare':
+        report_path = args.report or os.path.join(
+            PROJECT_ROOT, 'benchmarks', 'results', f"regression_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(convert_numpy_types(summary), f, ensure_ascii=False, indent=2)
+        print(f"\n对比报告已保存: {report_path}")
+        return 0 if all_passed else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+CPU线程分配调优
+在本机按不同的解码/推理线程比例并发运行多个分析任务，测量总吞吐量（帧/秒），
+把最佳比例写入 THREAD_CONFIG['tuning_file']，服务启动后按该比例分配线程
+
+用法（在项目根目录执行）:
+    python -m benchmarks.tune_threads                       # 2和4个并发任务，默认候选比例
+    python -m benchmarks.tune_threads --jobs 1,2,4,8 --shares 0.1,0.25,0.4
+    python -m benchmarks.tune_threads --dry-run             # 只输出结果，不写入调优文件
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from pose_analysis.config import THREAD_CONFIG, get_model_path
+from pose_analysis.resources import ThreadBudget, thread_budget, detect_available_cores, get_available_threads
+from pose_analysis.synthetic import generate_synthetic_set
+from pose_analysis.video_writer import get_track_path
+
+SYNTHETIC_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'synthetic')
+
+
+def run_concurrent(analyzers: List[Any], video_path: str, conf: float, iou: float, work_dir: str) -> Dict[str, Any]:
+    """
+    每个分析器在独立线程中同时分析同一视频
+
+    Returns:
+        Dict[str, Any]: 总帧数、总耗时和总吞吐量
+    """
+    frames = [0] * len(analyzers)
+    errors: List[str] = []
+
+    def job(index: int) -> None:
+        try:
+            output_path = os.path.join(work_dir, f"tune-{index}.mp4")
+            result = analyzers[index].analyze_video(video_path, 'front', conf, iou,
+                                                    track_path=get_track_path(output_path))
+            frames[index] = result['frame_count']
+        except Exception as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(len(analyzers))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    if errors:
+        raise RuntimeError(f"分析失败: {errors[0]}")
+    return {
+        'frames': sum(frames),
+        'seconds': round(seconds, 3),
+        'fps': round(sum(frames) / seconds, 2) if seconds > 0 else None
+    }
+
+
+def choose_share(rows: List[Dict[str, Any]]) -> float:
+    """
+    选择最佳解码线程比例：各并发数下的吞吐量先按该并发数的最大值归一，再取平均最高的比例
+
+    Args:
+        rows: 测量结果 [{'jobs', 'decode_share', 'fps'}, ...]
+
+    Returns:
+        float: 最佳比例
+    """
+    best_by_jobs: Dict[int, float] = {}
+    for row in rows:
+        best_by_jobs[row['jobs']] = max(best_by_jobs.get(row['jobs'], 0.0), row['fps'] or 0.0)
+
+    scores: Dict[float, List[float]] = {}
+    for row in rows:
+        peak = best_by_jobs[row['jobs']]
+        scores.setdefault(row['decode_share'], []).append((row['fps'] or 0.0) / peak if peak else 0.0)
+    return max(scores, key=lambda share: sum(scores[share]) / len(scores[share]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='CPU线程分配调优')
+    parser.add_argument('--jobs', default='2,4', help='并发任务数，逗号分隔')
+    parser.add_argument('--shares', default='0.1,0.2,0.3,0.4,0.5', help='候选解码线程比例，逗号分隔')
+    parser.add_argument('--width', type=int, default=1280, help='合成视频宽度')
+    parser.add_argument('--height', type=int, default=720, help='合成视频高度')
+    parser.add_argument('--fps', type=float, default=30.0, help='合成视频帧率')
+    parser.add_argument('--duration', type=float, default=4.0, help='合成视频时长（秒）')
+    parser.add_argument('--video', help='使用指定视频代替合成视频')
+    parser.add_argument('--model', default=None, help='模型路径，默认使用配置的模型')
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--output', help='调优结果路径，默认 THREAD_CONFIG[\'tuning_file\']')
+    parser.add_argument('--dry-run', action='store_true', help='只输出结果，不写入调优文件')
+    args = parser.parse_args(argv)
+
+    from pose_analysis.video_analyzer import VideoAnalyzer
+
+    jobs_list = [int(value) for value in args.jobs.split(',') if value.strip()]
+    shares = [float(value) for value in args.shares.split(',') if value.strip()]
+    video_path = args.video or generate_synthetic_set(SYNTHETIC_DIR, args.width, args.height, args.fps,
+                                                      args.duration)['front']
+    model_path = args.model or os.path.join(PROJECT_ROOT, get_model_path())
+    print(f"可用核数: {detect_available_cores()}，可分配线程: {get_available_threads()}")
+
+    analyzers = [VideoAnalyzer(model_path) for _ in range(max(jobs_list))]
+    work_dir = tempfile.mkdtemp(prefix='pose_tune_')
+    rows = []
+    try:
+        # 预热：首次推理包含模型初始化
+        run_concurrent(analyzers[:1], video_path, args.conf, args.iou, work_dir)
+        for jobs in jobs_list:
+            for share in shares:
+                thread_budget.decode_share = share
+                measured = run_concurrent(analyzers[:jobs], video_path, args.conf, args.iou, work_dir)
+                budget = ThreadBudget(get_available_threads(), jobs, share).to_dict()
+                row = {'jobs': jobs, 'decode_share': share, 'budget': budget, **measured}
+                rows.append(row)
+                print(f"  并发 {jobs:>2}  解码比例 {share:.2f}  线程 {row['budget']}  总吞吐 {row['fps']} 帧/秒")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = choose_share(rows)
+    print(f"\n最佳解码线程比例: {best:.2f}")
+
+    tuning = {
+        'decode_share': best,
+        'time': datetime.now().isoformat(),
+        'available_cores': detect_available_cores(),
+        'total_threads': get_available_threads(),
+        'video': video_path,
+        'model_path': model_path,
+        'results': rows
+    }
+    if args.dry_run:
+        return 0
+
+    output = args.output or THREAD_CONFIG['tuning_file']
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(tuning, f, ensure_ascii=False, indent=2)
+    print(f"调优结果已保存: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
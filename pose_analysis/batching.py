@@ -0,0 +1,234 @@
+"""
+跨任务动态批处理模块
+同一进程内并发的分析任务各自逐帧调用模型时，由批处理服务线程收集所有任务提交的帧，
+凑满max_batch_size或等待max_wait_ms后做一次前向推理，再把每帧的关键点交回对应的任务
+"""
+
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import BATCHING_CONFIG
+from .pose_detector import PoseDetector, DetectionResult, create_pose_detector
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchRequest:
+    """批处理队列中的一帧"""
+
+    __slots__ = ('frame', 'key', 'client', 'enqueued', 'event', 'result', 'error')
+
+    def __init__(self, frame: np.ndarray, key: Tuple[Any, ...], client: int):
+        self.frame = frame
+        self.key = key
+        self.client = client
+        self.enqueued = time.perf_counter()
+        self.event = threading.Event()
+        self.result: Optional[DetectionResult] = None
+        self.error: Optional[BaseException] = None
+
+
+class BatchingServer:
+    """动态批处理服务类（一个模型一个服务线程）"""
+
+    def __init__(self, model_path: str):
+        """
+        加载模型并启动服务线程
+
+        Args:
+            model_path: 模型路径
+        """
+        self.model_path = model_path
+        self.detector = create_pose_detector(model_path, use_pool=False, use_batching=False, use_cascade=False)
+
+        self._queue: Deque[BatchRequest] = deque()
+        self._condition = threading.Condition()
+        self._clients: Dict[int, float] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, daemon=True, name='pose-batching')
+        self._thread.start()
+
+    def _active_clients(self, now: float) -> int:
+        """最近提交过帧的任务数（调用时持有锁）"""
+        idle = BATCHING_CONFIG['client_idle_seconds']
+        for client in [c for c, seen in self._clients.items() if now - seen > idle]:
+            del self._clients[client]
+        return max(1, len(self._clients))
+
+    def _next_batch(self) -> Optional[List[BatchRequest]]:
+        """
+        取下一批请求：与队首推理参数（含输入尺寸和检测数上限）相同的帧，凑满批次、所有活跃任务都已提交或队首等待超时为止
+
+        Returns:
+            Optional[List[BatchRequest]]: 一批请求，服务关闭时返回None
+        """
+        max_size = max(1, BATCHING_CONFIG['max_batch_size'])
+        max_wait = BATCHING_CONFIG['max_wait_ms'] / 1000.0
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+            first = self._queue[0]
+            while True:
+                now = time.perf_counter()
+                batch = [request for request in self._queue if request.key == first.key][:max_size]
+                remaining = first.enqueued + max_wait - now
+                # 每个任务同一时刻只有一帧在途，活跃任务都已提交时继续等待不会让批次变大
+                if len(batch) >= min(max_size, self._active_clients(now)) or remaining <= 0 or self._closed:
+                    break
+                self._condition.wait(remaining)
+
+            for request in batch:
+                self._queue.remove(request)
+            return batch
+
+    def _serve(self) -> None:
+        """服务线程：循环组批并推理"""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+
+            started = time.perf_counter()
+            for request in batch:
+                metrics.INFERENCE_QUEUE_WAIT.observe(started - request.enqueued)
+            metrics.INFERENCE_BATCH_SIZE.observe(len(batch))
+
+            conf, iou, classes, imgsz, max_det = batch[0].key
+            try:
+                self.detector.imgsz = imgsz
+                self.detector.max_det = max_det
+                results = self.detector.predict_batch([request.frame for request in batch], conf=conf, iou=iou,
+                                                      classes=list(classes) if classes is not None else None)
+                for request, result in zip(batch, results):
+                    request.result = DetectionResult(*self.detector.extract_detections(result))
+            except Exception as e:
+                logger.error("批量推理失败（%d帧）: %s", len(batch), e)
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.frame = None
+                request.event.set()
+
+    def infer(self, frame: np.ndarray, conf: float, iou: float, classes: Optional[List[int]],
+              client: int, imgsz: Optional[int] = None, max_det: Optional[int] = None) -> DetectionResult:
+        """
+        提交一帧并等待结果（线程安全）
+
+        Args:
+            frame: 输入图像
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+            client: 提交任务的标识（用于统计活跃任务数）
+            imgsz: 推理输入尺寸，None表示模型默认
+            max_det: 每帧最多保留的检测数，None表示模型默认
+
+        Returns:
+            DetectionResult: 该帧的检测结果
+        """
+        request = BatchRequest(frame, (conf, iou, tuple(classes) if classes is not None else None, imgsz, max_det),
+                               client)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("批处理服务已关闭")
+            self._clients[client] = request.enqueued
+            self._queue.append(request)
+            self._condition.notify()
+
+        request.event.wait()
+        if request.error is not None:
+            raise RuntimeError(f"批量推理失败: {request.error}") from request.error
+        return request.result
+
+    def close(self) -> None:
+        """处理完队列中的帧后停止服务线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=30)
+
+
+_servers: Dict[str, BatchingServer] = {}
+_servers_lock = threading.Lock()
+
+
+def get_batching_server(model_path: str) -> BatchingServer:
+    """
+    获取模型对应的批处理服务（首次调用时加载模型并启动）
+
+    Args:
+        model_path: 模型路径
+
+    Returns:
+        BatchingServer: 批处理服务
+    """
+    with _servers_lock:
+        server = _servers.get(model_path)
+        if server is None:
+            server = BatchingServer(model_path)
+            _servers[model_path] = server
+            logger.info("动态批处理服务已启动: 最大批次 %d 帧，最长等待 %.1f ms",
+                        BATCHING_CONFIG['max_batch_size'], BATCHING_CONFIG['max_wait_ms'])
+        return server
+
+
+def shutdown_batching_servers() -> None:
+    """关闭全部批处理服务"""
+    with _servers_lock:
+        for server in _servers.values():
+            server.close()
+        _servers.clear()
+
+
+atexit.register(shutdown_batching_servers)
+
+
+class BatchedPoseDetector(PoseDetector):
+    """经进程内动态批处理服务推理的姿态检测器（同一模型的所有任务共享一份模型）"""
+
+    def load_model(self) -> bool:
+        """连接（必要时启动）批处理服务"""
+        try:
+            self.server = get_batching_server(self.model_path)
+            return True
+        except Exception as e:
+            logger.error(f"批处理服务启动失败: {str(e)}")
+            self.server = None
+            return False
+
+    def get_backend_info(self) -> Dict[str, Any]:
+        """推理后端信息"""
+        if self.server is None:
+            return {'model_path': self.model_path, 'device': 'batching (未启动)'}
+        info = self.server.detector.get_backend_info()
+        info['max_batch_size'] = BATCHING_CONFIG['max_batch_size']
+        info['max_wait_ms'] = BATCHING_CONFIG['max_wait_ms']
+        return info
+
+    def predict(self, frame: np.ndarray, conf: float = 0.25,
+                iou: float = 0.45, classes: List[int] = None) -> Any:
+        """
+        提交到批处理服务推理
+
+        Args:
+            frame: 输入图像
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+
+        Returns:
+            Any: [DetectionResult]
+        """
+        if self.server is None:
+            raise RuntimeError("批处理服务未启动")
+        return [self.server.infer(frame, conf, iou, classes, id(self), self.imgsz, self.max_det)]
@@ -0,0 +1,399 @@
+"""
+硬件校准模块
+在本机用合成画面测量各姿态模型在各推理后端上的速度和内存，选出满足实时系数的最大模型和默认性能档位，
+结果连同硬件/软件指纹写入 CALIBRATION_CONFIG['result_file']，之后启动时指纹一致则直接应用
+"""
+
+import os
+import gc
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import config
+from .config import MODEL_CONFIG, PERFORMANCE_PROFILES, CALIBRATION_CONFIG, get_model_path
+from .resources import thread_budget, detect_available_cores, get_available_threads
+from .synthetic import iter_synthetic_frames
+from .profiling import get_current_rss_mb
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 档位优先顺序：满足实时要求时优先选择精度更高的档位
+PROFILE_PREFERENCE = ('accurate', 'balanced', 'fast')
+
+_state: Dict[str, Any] = {'status': 'idle', 'started': None, 'finished': None, 'error': None}
+_state_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def get_runtime_device() -> str:
+    """分析时实际使用的推理后端（与PoseDetector一致：CUDA可用时使用GPU）"""
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def get_calibration_devices() -> List[str]:
+    """需要测量的推理后端"""
+    if CALIBRATION_CONFIG['devices']:
+        return list(CALIBRATION_CONFIG['devices'])
+    import torch
+    return ['cpu', 'cuda'] if torch.cuda.is_available() else ['cpu']
+
+
+def hardware_fingerprint() -> Dict[str, Any]:
+    """
+    硬件和软件环境指纹（任一项变化时校准结果失效）
+
+    Returns:
+        Dict[str, Any]: 可用核数、线程数、GPU型号、torch和ultralytics版本及可用的模型文件
+    """
+    import torch
+    import ultralytics
+
+    return {
+        'available_cores': detect_available_cores(),
+        'total_threads': get_available_threads(),
+        'cuda_device': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+        'torch_version': torch.__version__,
+        'ultralytics_version': ultralytics.__version__,
+        'models': [name for name in MODEL_CONFIG['available_models'] if os.path.exists(get_model_path(name))]
+    }
+
+
+def load_calibration(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取校准结果
+
+    Args:
+        path: 结果路径，None表示CALIBRATION_CONFIG['result_file']
+
+    Returns:
+        Optional[Dict[str, Any]]: 校准结果，不存在或无法解析时返回None
+    """
+    path = path or CALIBRATION_CONFIG['result_file']
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("校准结果无法读取 %s: %s", path, e)
+        return None
+
+
+def save_calibration(result: Dict[str, Any], path: Optional[str] = None) -> str:
+    """
+    保存校准结果（先写临时文件再替换，多个进程同时校准时不会读到半个文件）
+
+    Returns:
+        str: 结果路径
+    """
+    path = path or CALIBRATION_CONFIG['result_file']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+
+def is_current(result: Optional[Dict[str, Any]]) -> bool:
+    """校准结果是否在当前硬件和软件环境下测得"""
+    return bool(result) and result.get('fingerprint') == hardware_fingerprint()
+
+
+def measure_model(model_name: str, device: str, imgsz: Optional[int],
+                  frames: List[np.ndarray]) -> Dict[str, Any]:
+    """
+    测量单个模型在指定推理后端和输入尺寸下的速度和内存
+
+    Args:
+        model_name: 模型文件名
+        device: 'cpu' 或 'cuda'
+        imgsz: 推理输入尺寸，None表示模型默认
+        frames: 合成画面（前warmup_frames帧只预热不计时）
+
+    Returns:
+        Dict[str, Any]: 模型加载耗时、吞吐量（帧/秒）、单帧耗时中位数和P95（毫秒）及新增内存（MB）
+    """
+    import torch
+    from ultralytics import YOLO
+
+    gc.collect()
+    rss_before = get_current_rss_mb()
+    if device == 'cuda':
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+
+    started = time.perf_counter()
+    model = YOLO(get_model_path(model_name))
+    model.to(device)
+    load_seconds = time.perf_counter() - started
+
+    options = {'imgsz': imgsz} if imgsz else {}
+    warmup = min(CALIBRATION_CONFIG['warmup_frames'], len(frames) - 1)
+    latencies = []
+    try:
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            model(frame, conf=0.25, iou=0.45, classes=[0], device=device, verbose=False, **options)
+            if device == 'cuda':
+                torch.cuda.synchronize()
+            if i >= warmup:
+                latencies.append(time.perf_counter() - start)
+
+        rss_after = get_current_rss_mb()
+        memory_mb = None
+        if rss_before is not None and rss_after is not None:
+            memory_mb = max(0.0, rss_after - rss_before)
+        gpu_memory_mb = torch.cuda.max_memory_allocated() / (1024 * 1024) if device == 'cuda' else None
+    finally:
+        del model
+        gc.collect()
+        if device == 'cuda':
+            torch.cuda.empty_cache()
+
+    seconds = float(np.sum(latencies))
+    return {
+        'model': model_name,
+        'device': device,
+        'imgsz': imgsz,
+        'frames': len(latencies),
+        'load_seconds': round(load_seconds, 3),
+        'fps': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+        'median_ms': round(float(np.median(latencies)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+        'memory_mb': round(memory_mb, 1) if memory_mb is not None else None,
+        'gpu_memory_mb': round(gpu_memory_mb, 1) if gpu_memory_mb is not None else None
+    }
+
+
+def estimate_clip_seconds(measurement: Dict[str, Any], frame_stride: int = 1) -> Optional[float]:
+    """
+    按测量结果估算分析一段CALIBRATION_CONFIG['clip_seconds']秒视频的推理耗时（含模型加载）
+
+    Args:
+        measurement: measure_model的结果
+        frame_stride: 每隔几帧推理一次
+
+    Returns:
+        Optional[float]: 估算耗时（秒），测量失败时返回None
+    """
+    if not measurement.get('fps'):
+        return None
+    frames = CALIBRATION_CONFIG['clip_seconds'] * CALIBRATION_CONFIG['clip_fps'] / max(1, frame_stride)
+    return measurement['load_seconds'] + frames / measurement['fps']
+
+
+def meets_target(measurement: Optional[Dict[str, Any]], frame_stride: int = 1) -> bool:
+    """推理耗时是否在实时系数允许的范围内（分析耗时中推理只占inference_share）"""
+    if not measurement:
+        return False
+    seconds = estimate_clip_seconds(measurement, frame_stride)
+    budget = (CALIBRATION_CONFIG['clip_seconds'] * CALIBRATION_CONFIG['realtime_factor']
+              * CALIBRATION_CONFIG['inference_share'])
+    return seconds is not None and seconds <= budget
+
+
+def _find(measurements: List[Dict[str, Any]], model: str, device: str,
+          imgsz: Optional[int]) -> Optional[Dict[str, Any]]:
+    """查找指定条件的测量结果"""
+    for measurement in measurements:
+        if (measurement['model'], measurement['device'], measurement['imgsz']) == (model, device, imgsz):
+            return measurement
+    return None
+
+
+def select_configuration(measurements: List[Dict[str, Any]], device: str) -> Dict[str, Any]:
+    """
+    按测量结果选择默认模型和默认性能档位
+
+    默认模型为在默认输入尺寸、逐帧推理下满足实时系数的最大模型（都不满足时取最小的模型）；
+    默认档位按 accurate、balanced、fast 的顺序取第一个满足实时系数的档位（balanced使用选出的默认模型）
+
+    Args:
+        measurements: 各模型的测量结果
+        device: 分析时实际使用的推理后端
+
+    Returns:
+        Dict[str, Any]: {'model', 'profile', 'device', 'meets_target'}
+    """
+    models = [name for name in MODEL_CONFIG['available_models'] if _find(measurements, name, device, None)]
+    if not models:
+        raise RuntimeError("没有可用的模型测量结果")
+
+    # available_models按从小到大排列
+    passing = [name for name in models if meets_target(_find(measurements, name, device, None))]
+    model = passing[-1] if passing else models[0]
+
+    for name in PROFILE_PREFERENCE:
+        profile = PERFORMANCE_PROFILES[name]
+        profile_model = model if name == 'balanced' else profile['model']
+        measurement = _find(measurements, profile_model, device, profile['imgsz'])
+        if meets_target(measurement, profile['frame_stride']):
+            return {'model': model, 'profile': name, 'device': device, 'meets_target': True}
+
+    logger.warning("本机没有满足实时系数 %.2f 的模型和档位，使用最快的配置", CALIBRATION_CONFIG['realtime_factor'])
+    return {'model': model, 'profile': 'fast', 'device': device, 'meets_target': False}
+
+
+def run_calibration(save: bool = True) -> Dict[str, Any]:
+    """
+    测量全部可用模型（各推理后端、默认输入尺寸）以及 accurate/fast 档位的模型和输入尺寸，并选出默认配置
+
+    Args:
+        save: 是否写入结果文件
+
+    Returns:
+        Dict[str, Any]: 校准结果（指纹、设置、测量结果和选择）
+    """
+    fingerprint = hardware_fingerprint()
+    if not fingerprint['models']:
+        raise RuntimeError(f"模型目录 {MODEL_CONFIG['model_path']} 下没有可用的模型文件")
+
+    frame_total = CALIBRATION_CONFIG['warmup_frames'] + CALIBRATION_CONFIG['sample_frames']
+    frames = list(iter_synthetic_frames('abduction', CALIBRATION_CONFIG['frame_width'],
+                                        CALIBRATION_CONFIG['frame_height'], frame_total))
+    device = get_runtime_device()
+
+    runs = [(name, backend, None) for backend in get_calibration_devices() for name in fingerprint['models']]
+    for name in ('accurate', 'fast'):
+        profile = PERFORMANCE_PROFILES[name]
+        if profile['model'] in fingerprint['models'] and profile['imgsz'] is not None:
+            runs.append((profile['model'], device, profile['imgsz']))
+
+    started = time.perf_counter()
+    jobs_running = int(metrics.ANALYSIS_JOBS_RUNNING.get())
+    measurements = []
+    # 按单个分析任务的线程分配测量
+    thread_budget.configure_process()
+    with thread_budget.job():
+        for model_name, backend, imgsz in runs:
+            try:
+                measurement = measure_model(model_name, backend, imgsz, frames)
+            except Exception as e:
+                logger.error("校准测量失败 %s (%s, imgsz=%s): %s", model_name, backend, imgsz, e)
+                continue
+            measurements.append(measurement)
+            logger.info("校准 %s (%s, imgsz=%s): %.1f 帧/秒，P95 %.1f ms，内存 %s MB",
+                        model_name, backend, imgsz or '默认', measurement['fps'] or 0,
+                        measurement['p95_ms'], measurement['memory_mb'])
+
+    selection = select_configuration(measurements, device)
+    jobs_running = max(jobs_running, int(metrics.ANALYSIS_JOBS_RUNNING.get()))
+    if jobs_running:
+        logger.warning("校准期间有 %d 个分析任务在运行，测量结果可能偏慢", jobs_running)
+
+    result = {
+        'time': datetime.now().isoformat(),
+        'seconds': round(time.perf_counter() - started, 1),
+        'fingerprint': fingerprint,
+        'settings': {key: CALIBRATION_CONFIG[key] for key in
+                     ('realtime_factor', 'clip_seconds', 'clip_fps', 'inference_share',
+                      'frame_width', 'frame_height', 'sample_frames')},
+        'jobs_running': jobs_running,
+        'measurements': measurements,
+        'selection': selection
+    }
+    if save:
+        path = save_calibration(result)
+        logger.info("校准结果已保存: %s（模型 %s，默认档位 %s）", path, selection['model'], selection['profile'])
+    return result
+
+
+def apply_calibration(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    应用校准结果：设置默认模型（balanced档位和预推理使用）和默认性能档位
+
+    按当前的实时系数设置重新选择，环境变量POSE_PERFORMANCE_PROFILE已指定默认档位时不覆盖
+
+    Args:
+        result: 校准结果
+
+    Returns:
+        Dict[str, Any]: 应用的选择
+    """
+    selection = select_configuration(result['measurements'], result['selection']['device'])
+    MODEL_CONFIG['default_model'] = selection['model']
+    PERFORMANCE_PROFILES['balanced']['model'] = selection['model']
+    if not os.environ.get('POSE_PERFORMANCE_PROFILE'):
+        config.DEFAULT_PERFORMANCE_PROFILE = selection['profile']
+    logger.info("已应用校准结果: 默认模型 %s，默认档位 %s", selection['model'], config.DEFAULT_PERFORMANCE_PROFILE)
+    return selection
+
+
+def _run_in_background() -> None:
+    """后台校准线程"""
+    try:
+        result = run_calibration()
+        apply_calibration(result)
+        with _state_lock:
+            _state.update(status='done', finished=datetime.now().isoformat(), error=None)
+    except Exception as e:
+        logger.error("硬件校准失败: %s", e)
+        with _state_lock:
+            _state.update(status='failed', finished=datetime.now().isoformat(), error=str(e))
+
+
+def start_calibration() -> bool:
+    """
+    在后台线程中开始校准
+
+    Returns:
+        bool: 是否已开始（已有校准在运行时返回False）
+    """
+    global _thread
+    with _state_lock:
+        if _state['status'] == 'running':
+            return False
+        _state.update(status='running', started=datetime.now().isoformat(), finished=None, error=None)
+        _thread = threading.Thread(target=_run_in_background, daemon=True, name='pose-calibration')
+        _thread.start()
+    logger.info("硬件校准已在后台开始")
+    return True
+
+
+def get_calibration_status() -> Dict[str, Any]:
+    """
+    校准状态和当前结果
+
+    Returns:
+        Dict[str, Any]: 运行状态、已保存的结果、是否与当前环境一致及当前生效的默认模型和档位
+    """
+    with _state_lock:
+        state = dict(_state)
+    result = load_calibration()
+    return {
+        **state,
+        'result': result,
+        'current': is_current(result),
+        'default_model': MODEL_CONFIG['default_model'],
+        'default_profile': config.DEFAULT_PERFORMANCE_PROFILE
+    }
+
+
+def init_calibration() -> None:
+    """
+    服务启动时调用：已有与当前环境一致的校准结果时直接应用，否则按CALIBRATION_CONFIG['on_startup']在后台校准
+    """
+    if MODEL_CONFIG['detector'] == 'stub':
+        return
+    try:
+        result = load_calibration()
+        if is_current(result):
+            apply_calibration(result)
+            return
+        if result:
+            logger.info("硬件或软件环境已变化，校准结果失效")
+    except Exception as e:
+        logger.error("校准结果应用失败: %s", e)
+        return
+
+    if CALIBRATION_CONFIG['on_startup'] == 'auto':
+        start_calibration()
@@ -0,0 +1,180 @@
+"""
+级联推理模块
+每帧先用小模型（默认yolov8n-pose）推理，只有肩、肘、髋、腕任一关节置信度不足，
+或肩关节角度相对上一推理帧跳变不合理时，才用配置的模型对该帧重新推理；每帧结果记录产生它的模型。
+判断针对受检者（与上一推理帧所选的人检测框重叠最多的人），而不是置信度最高的人
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import CASCADE_CONFIG, KEYPOINTS_CONFIG, SUBJECT_CONFIG, get_model_path
+from .pose_detector import PoseDetector, DetectionResult, create_pose_detector
+from .subject_tracker import box_iou, select_initial_subject
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class CascadePoseDetector(PoseDetector):
+    """级联姿态检测器类（小模型优先，必要时回退到配置的模型）"""
+
+    def __init__(self, model_path: str = "model/yolov8s-pose.pt",
+                 use_pool: Optional[bool] = None, use_batching: Optional[bool] = None):
+        """
+        初始化级联姿态检测器
+
+        Args:
+            model_path: 回退时使用的模型路径（配置的模型）
+            use_pool: 两个模型是否通过推理工作进程池推理，None表示使用INFERENCE_POOL_CONFIG的配置
+            use_batching: 两个模型是否通过动态批处理服务推理，None表示使用BATCHING_CONFIG的配置
+        """
+        self.use_pool = use_pool
+        self.use_batching = use_batching
+        self.fast_detector: Optional[PoseDetector] = None
+        self.full_detector: Optional[PoseDetector] = None
+        self.keypoint_indices = [KEYPOINTS_CONFIG[name] for name in CASCADE_CONFIG['keypoints']]
+        self._previous_angles: Optional[Tuple[float, float]] = None
+        self._previous_box: Optional[np.ndarray] = None  # 上一推理帧所选受检者的检测框
+        self._lost = 0  # 受检者连续缺失的推理帧数
+        super().__init__(model_path)
+
+    def load_model(self) -> bool:
+        """
+        加载小模型和回退模型（配置的模型就是小模型时不级联）
+
+        Returns:
+            bool: 加载是否成功
+        """
+        fast_path = get_model_path(CASCADE_CONFIG['fast_model'])
+        # 开启推理进程池时两个模型同时在用，依赖进程池按模型路径各建一个（不会互相关闭重建）
+        self.full_detector = create_pose_detector(self.model_path, self.use_pool, self.use_batching, use_cascade=False)
+        if os.path.abspath(fast_path) == os.path.abspath(self.model_path):
+            logger.info("级联小模型与配置的模型相同，不级联推理")
+            self.fast_detector = self.full_detector
+        else:
+            self.fast_detector = create_pose_detector(fast_path, self.use_pool, self.use_batching, use_cascade=False)
+            logger.info("级联推理: %s → %s", os.path.basename(fast_path), os.path.basename(self.model_path))
+        # 两个检测器各自记录加载失败，推理时报错
+        return True
+
+    def get_backend_info(self) -> Dict[str, Any]:
+        """推理后端信息（回退模型的信息加上级联设置）"""
+        info = self.full_detector.get_backend_info()
+        info['cascade'] = {
+            'fast_model': os.path.basename(self.fast_detector.model_path),
+            'min_keypoint_conf': CASCADE_CONFIG['min_keypoint_conf'],
+            'max_angle_jump': CASCADE_CONFIG['max_angle_jump']
+        }
+        return info
+
+    def reset_sequence(self) -> None:
+        """开始分析新的视频时清除上一推理帧的角度和受检者"""
+        self._previous_angles = None
+        self._previous_box = None
+        self._lost = 0
+
+    def _shoulder_angles(self, person: np.ndarray) -> Tuple[float, float]:
+        """单人左右肩关节角度（肘-肩-髋，与正面角度计算一致）"""
+        return (self.estimate_pose_angle(self._get_point(person, 'Left Elbow')[:2],
+                                         self._get_point(person, 'Left Shoulder')[:2],
+                                         self._get_point(person, 'Left Hip')[:2]),
+                self.estimate_pose_angle(self._get_point(person, 'Right Elbow')[:2],
+                                         self._get_point(person, 'Right Shoulder')[:2],
+                                         self._get_point(person, 'Right Hip')[:2]))
+
+    def _subject_index(self, boxes: np.ndarray, frame_size: Tuple[int, int]) -> Optional[int]:
+        """
+        找出本帧的受检者，规则与SubjectTracker一致（未开启受检者跟踪时分析只使用第一个人）
+
+        Args:
+            boxes: 检测框 (N, 4)
+            frame_size: 画面尺寸 (width, height)
+
+        Returns:
+            Optional[int]: 受检者下标，本帧没有受检者时返回None
+        """
+        if len(boxes) == 0:
+            return None
+        if not SUBJECT_CONFIG['enabled']:
+            return 0
+        if self._previous_box is None:
+            return select_initial_subject(boxes, frame_size)
+        overlaps = box_iou(self._previous_box, boxes)
+        index = int(np.argmax(overlaps))
+        return index if overlaps[index] >= SUBJECT_CONFIG['min_iou'] else None
+
+    def _fallback_reason(self, keypoints: np.ndarray, index: Optional[int]) -> Optional[str]:
+        """
+        判断小模型的结果是否需要用回退模型重新推理
+
+        Args:
+            keypoints: 小模型的关键点 (N, 17, 3)
+            index: 受检者下标，None表示小模型没有找到受检者
+
+        Returns:
+            Optional[str]: 'low_confidence' 或 'angle_jump'，不需要时返回None
+        """
+        if index is None:
+            return 'low_confidence'
+        person = keypoints[index]
+        if np.min(person[self.keypoint_indices, 2]) < CASCADE_CONFIG['min_keypoint_conf']:
+            return 'low_confidence'
+        if self._previous_angles is not None:
+            angles = self._shoulder_angles(person)
+            jump = max(abs(a - b) for a, b in zip(angles, self._previous_angles))
+            if jump > CASCADE_CONFIG['max_angle_jump']:
+                return 'angle_jump'
+        return None
+
+    def predict(self, frame: np.ndarray, conf: float = 0.25,
+                iou: float = 0.45, classes: List[int] = None) -> Any:
+        """
+        级联推理单帧
+
+        Args:
+            frame: 输入图像
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+
+        Returns:
+            Any: [DetectionResult]，source为产生该帧结果的模型文件名
+        """
+        for sub_detector in (self.fast_detector, self.full_detector):
+            sub_detector.imgsz = self.imgsz
+            sub_detector.max_det = self.max_det
+        detector = self.fast_detector
+        result = detector.predict(frame, conf=conf, iou=iou, classes=classes)[0]
+        keypoints, boxes, scores = detector.extract_detections(result)
+        frame_size = (frame.shape[1], frame.shape[0])
+        index = self._subject_index(boxes, frame_size)
+
+        if self.fast_detector is not self.full_detector:
+            reason = self._fallback_reason(keypoints, index)
+            if reason is not None:
+                logger.debug("小模型结果不可靠（%s），用回退模型重新推理", reason)
+                detector = self.full_detector
+                result = detector.predict(frame, conf=conf, iou=iou, classes=classes)[0]
+                keypoints, boxes, scores = detector.extract_detections(result)
+                index = self._subject_index(boxes, frame_size)
+
+        # 以最终采用的结果中的受检者作为下一帧的参照
+        if index is not None:
+            self._previous_box = np.asarray(boxes[index], dtype=np.float32)
+            self._previous_angles = self._shoulder_angles(keypoints[index])
+            self._lost = 0
+        else:
+            self._previous_angles = None
+            self._lost += 1
+            if self._lost > SUBJECT_CONFIG['max_lost_frames']:
+                # 与SubjectTracker一致，丢失过久后重新锁定
+                self._previous_box = None
+        return [DetectionResult(keypoints, boxes, scores, source=detector.get_frame_source(result))]
+
+    def predict_batch(self, frames: List[np.ndarray], conf: float = 0.25,
+                      iou: float = 0.45, classes: List[int] = None) -> List[Any]:
+        """逐帧级联推理（角度跳变判断依赖前一帧，不能并行）"""
+        return [self.predict(frame, conf=conf, iou=iou, classes=classes)[0] for frame in frames]
@@ -15,7 +15,74 @@ MODEL_CONFIG = {
         'yolov8m-pose.pt',
         'yolov8l-pose.pt',
         'yolov8x-pose.pt'
-    ]
+    ],
+    'verbose': False,  # ultralytics逐帧推理日志，默认关闭
+    # 'yolo': 加载YOLO模型推理；'stub': 不加载模型，返回合成关键点（压测Web层时使用）
+    'detector': os.environ.get('POSE_DETECTOR', 'yolo'),
+    'stub_latency': float(os.environ.get('POSE_STUB_LATENCY', '0.02'))  # 模拟单帧推理耗时（秒）
+}
+
+# 推理工作进程池配置（各进程独立加载模型，帧和关键点通过共享内存环形缓冲区传递）
+INFERENCE_POOL_CONFIG = {
+    'enabled': os.environ.get('POSE_INFERENCE_POOL', '0') == '1',
+    'workers': int(os.environ.get('POSE_INFERENCE_WORKERS', '2')),
+    'slots': 4,  # 每个工作进程的槽位数（同时在途的帧数）
+    'max_frame_pixels': 1920 * 1080,  # 槽位可容纳的最大像素数，更大的帧先缩小再推理，坐标按比例还原
+    'max_detections': 64,  # 每帧最多返回的检测数（不少于RAW_PREDICTION_CONFIG['max_candidates']）
+    'torch_threads': None,  # 每个工作进程的torch线程数，None表示CPU核数/进程数
+    'start_timeout': 120.0,  # 工作进程加载模型的等待上限（秒）
+    'timeout': 30.0  # 单帧推理的等待上限（秒），超时的工作进程会被重启
+}
+
+# 跨任务动态批处理配置（同一进程内并发分析任务的帧合并为一个批次推理）
+BATCHING_CONFIG = {
+    'enabled': os.environ.get('POSE_BATCHING', '0') == '1',
+    'max_batch_size': int(os.environ.get('POSE_BATCH_SIZE', '8')),
+    'max_wait_ms': float(os.environ.get('POSE_BATCH_WAIT_MS', '10')),  # 批次未满时最多等待的时间（毫秒）
+    'client_idle_seconds': 1.0  # 超过该时间未提交帧的任务不再计入活跃任务数（活跃任务都已提交时不等待）
+}
+
+# 级联推理配置（每帧先用小模型推理，关键关节置信度不足或角度跳变不合理时再用配置的模型重新推理）
+CASCADE_CONFIG = {
+    'enabled': os.environ.get('POSE_CASCADE', '0') == '1',
+    'fast_model': os.environ.get('POSE_CASCADE_MODEL', 'yolov8n-pose.pt'),
+    # 需要可靠的关节：肩、肘、髋、腕（KEYPOINTS_CONFIG的名称）
+    'keypoints': ['left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+                  'left_hip', 'right_hip', 'left_wrist', 'right_wrist'],
+    'min_keypoint_conf': float(os.environ.get('POSE_CASCADE_MIN_CONF', '0.5')),  # 任一关节低于该置信度时重新推理
+    'max_angle_jump': 30.0  # 相邻两个推理帧的肩关节角度变化上限（度），超过视为不合理
+}
+
+# 受检者跟踪配置（锁定受检者并逐帧跟踪，路过的其他人不参与角度计算）
+SUBJECT_CONFIG = {
+    'enabled': os.environ.get('POSE_SUBJECT_TRACKING', '1') == '1',
+    # 每帧最多保留的检测数（传给模型的max_det，NMS和关键点解码只处理这么多人）；
+    # 1表示只取置信度最高的人，大于1时由跟踪在其中选出受检者
+    'max_det': int(os.environ.get('POSE_MAX_DET', '3')),
+    'selection': 'largest_central',  # 首次锁定：'largest' 面积最大；'central' 最居中；'largest_central' 面积按离中心距离打折
+    'min_iou': 0.2,  # 与受检者上一次检测框的IoU低于该值视为不是受检者
+    'max_lost_frames': 15  # 连续丢失超过该推理帧数后重新锁定
+}
+
+# 动作周期提前结束配置（被评估一侧抬起到最高点并回到静息位后，再分析一段尾部余量就停止推理；只用于顺序分析）
+CYCLE_CONFIG = {
+    'enabled': os.environ.get('POSE_EARLY_STOP', '0') == '1',  # 性能档位的early_stop为None时使用
+    # 最高点与静息位的差值达到该幅度才算一次有效动作：正面、侧面为肩关节角度（度），背面为腕高度（相对躯干长度）
+    'min_amplitude': {'front': 30.0, 'side': 30.0, 'back': 0.3},
+    'return_ratio': 0.2,  # 回落到静息位以上幅度的该比例以内视为回到静息位
+    'rest_seconds': 0.5,  # 在静息位持续该时长才算动作完成
+    'tail_seconds': 1.0,  # 动作完成后继续分析的尾部余量（秒）
+    'smooth_window': 5  # 判断最高点和静息位时的滑动平均窗口（推理帧）
+}
+
+# CPU线程预算配置（按可用核数在并发分析任务之间分配torch和OpenCV线程，避免超额订阅）
+THREAD_CONFIG = {
+    'enabled': os.environ.get('POSE_THREAD_BUDGET', '1') == '1',
+    'total_threads': int(os.environ.get('POSE_CPU_THREADS', '0')) or None,  # 可用线程总数，None表示按CPU亲和性和cgroup配额检测
+    'decode_share': 0.25,  # 每个任务的线程中用于OpenCV解码和图像处理的比例，其余用于torch推理
+    'render_threads': 1,  # 多任务并发时为每个任务的图表渲染（matplotlib单线程）预留的线程数
+    'interop_threads': 1,  # torch inter-op线程数（进程内只能设置一次）
+    'tuning_file': os.environ.get('POSE_THREAD_TUNING', 'model/thread_tuning.json')  # 调优结果，存在时覆盖decode_share
 }
 
 # 分析参数配置
@@ -28,14 +95,172 @@ ANALYSIS_CONFIG = {
     'chart_format': 'png'
 }
 
+# 性能档位配置（分析请求可通过performanceProfile选择，服务默认档位由POSE_PERFORMANCE_PROFILE设置）
+# model: 模型文件；imgsz: 推理输入尺寸，None表示模型默认（640）；frame_stride: 每隔几帧推理一次，
+# 其余帧沿用上一推理帧的关键点；video_output: 标注视频输出方式，None表示VIDEO_OUTPUT_CONFIG['mode']；
+# video_max_height: 标注视频最大高度，0表示保持原分辨率；chart_dpi: 图表分辨率；keyframe_width: 关键帧拼图宽度（像素）；
+# early_stop: 动作周期完成后是否提前结束分析，None表示使用CYCLE_CONFIG['enabled']
+PERFORMANCE_PROFILES = {
+    'fast': {  # 筛查：快速出结果
+        'model': 'yolov8n-pose.pt',
+        'imgsz': 480,
+        'frame_stride': 2,
+        'iou': ANALYSIS_CONFIG['default_iou'],
+        'video_output': 'none',
+        'video_max_height': 480,
+        'chart_dpi': 120,
+        'keyframe_width': 600,
+        'early_stop': True
+    },
+    'balanced': {  # 日常门诊（使用默认模型，启动时硬件校准会改为校准选出的模型）
+        'model': MODEL_CONFIG['default_model'],
+        'imgsz': None,
+        'frame_stride': ANALYSIS_CONFIG['frame_skip'],
+        'iou': ANALYSIS_CONFIG['default_iou'],
+        'video_output': None,
+        'video_max_height': 0,
+        'chart_dpi': ANALYSIS_CONFIG['chart_dpi'],
+        'keyframe_width': 800,
+        'early_stop': None
+    },
+    'accurate': {  # 科研随访：最高精度
+        'model': 'yolov8l-pose.pt',
+        'imgsz': 960,
+        'frame_stride': 1,
+        'iou': ANALYSIS_CONFIG['default_iou'],
+        'video_output': None,
+        'video_max_height': 0,
+        'chart_dpi': 300,
+        'keyframe_width': 1200,
+        'early_stop': False
+    }
+}
+DEFAULT_PERFORMANCE_PROFILE = os.environ.get('POSE_PERFORMANCE_PROFILE', 'balanced')
+
+# 启动时硬件校准配置（在本机用合成画面测量各模型和推理后端的速度和内存，选出满足实时系数的最大模型和默认档位）
+CALIBRATION_CONFIG = {
+    # 'auto': 无校准结果或硬件/软件环境变化时在后台重新校准；'off': 不校准，只应用已有结果
+    'on_startup': os.environ.get('POSE_CALIBRATE', 'auto'),
+    'result_file': os.environ.get('POSE_CALIBRATION_FILE', 'model/calibration.json'),
+    'realtime_factor': float(os.environ.get('POSE_REALTIME_FACTOR', '1.0')),  # 分析耗时/视频时长的上限
+    'clip_seconds': 20.0,  # 按该时长的视频计算分析耗时（含模型加载）
+    'clip_fps': 30.0,  # 按该帧率的视频计算需推理的帧数
+    'inference_share': 0.8,  # 分析耗时中留给推理的比例，其余为解码、后处理和图表生成
+    'frame_width': 1280,  # 合成画面宽度
+    'frame_height': 720,  # 合成画面高度
+    'warmup_frames': 5,  # 不计时的预热帧数
+    'sample_frames': 60,  # 每个模型和推理后端计时的帧数
+    'devices': None  # 测量的推理后端，None表示CPU和可用的CUDA
+}
+
 # 文件路径配置
 PATH_CONFIG = {
-    'patients_data_dir': 'patients_data',
+    'patients_data_dir': os.environ.get('POSE_PATIENTS_DATA_DIR', 'patients_data'),  # 上传、分析结果和报告共用
     'analysis_results_dir': 'analysis_results',
     'reports_dir': 'reports',
     'videos_dir': 'videos'
 }
 
+# 视频预处理配置（上传后后台执行）
+INGEST_CONFIG = {
+    'enabled': True,
+    'ffprobe_path': 'ffprobe',
+    'ffmpeg_path': 'ffmpeg',
+    'index_suffix': '_index.json',  # 索引文件: videos/front_index.json
+    'build_proxy': False,  # 是否转码生成分析代理视频
+    'use_proxy_for_analysis': True,  # 代理视频存在时分析是否读取代理视频
+    'proxy_suffix': '_proxy.mp4',  # 代理视频: videos/front_proxy.mp4
+    'proxy_max_height': 720,  # 代理视频最大高度（像素）
+    'proxy_fps': 30,  # 代理视频恒定帧率
+    'proxy_gop': 15,  # 代理视频关键帧间隔（帧）
+    'proxy_crf': 23,
+    'proxy_preset': 'veryfast',
+    'build_sprite': True,  # 是否生成时间轴拖动用的缩略图拼图
+    'sprite_suffix': '_sprite.jpg',  # 缩略图拼图: videos/front_sprite.jpg（元数据写入索引文件）
+    'sprite_interval': 0.5,  # 缩略图间隔（秒）
+    'sprite_thumb_width': 160,
+    'sprite_columns': 10,
+    'sprite_max_thumbs': 600
+}
+
+# 单帧取图配置（时间轴界面按需取帧）
+FRAME_SERVER_CONFIG = {
+    'cache_max_mb': 256,  # 解码帧LRU缓存的内存上限
+    'jpeg_quality': 80,
+    'max_width': 1920  # 请求允许的最大输出宽度
+}
+
+# 标注视频输出配置
+VIDEO_OUTPUT_CONFIG = {
+    # 'eager': 分析时同步绘制并编码标注视频
+    # 'deferred': 分析时只保存关键点和逐帧指标，首次请求标注视频时再渲染并缓存
+    # 'background': 同deferred，分析完成后在低优先级后台线程中渲染
+    # 'none': 只保存关键点轨迹，不生成标注视频，由页面在原视频上用canvas绘制标注
+    'mode': 'deferred',
+    'track_suffix': '_track.npz',  # 关键点轨迹: 张三-front_track.npz
+    'track_scale': 10,  # 轨迹接口坐标量化倍数（10表示精确到0.1像素）
+    'overlay_style': 'limbs',  # 'limbs': 只绘制肩、肘、腕、髋相关肢体；'full': 绘制完整COCO骨架
+    'background_nice': 19,  # 后台渲染线程的调度优先级（仅Linux生效）
+    'format': 'mp4',  # 'mp4': H.264分片MP4（浏览器可边下边播）；'avi': XVID AVI
+    'ffmpeg_path': 'ffmpeg',
+    'max_height': 1080,  # 输出最大高度（像素），None表示保持原分辨率
+    'crf': 26,
+    'preset': 'veryfast',
+    'gop_seconds': 1.0,  # 关键帧间隔（秒），每个关键帧开始一个分片
+    'build_preview': True,  # 是否同时生成低分辨率预览版本
+    'preview_suffix': '_preview',  # 预览视频: 张三-front_preview.mp4
+    'preview_height': 360,
+    'preview_crf': 30
+}
+
+# 原始候选缓存配置（以宽松阈值推理一次并保存候选检测，之后修改置信度/IoU阈值只需重新过滤，不必重新推理）
+RAW_PREDICTION_CONFIG = {
+    'enabled': os.environ.get('POSE_RAW_CACHE', '1') == '1',
+    'conf': 0.1,  # 推理使用的宽松置信度阈值，之后分析的阈值不低于此值时可直接复用
+    # 推理时的宽松NMS阈值：只合并几乎重合的重复框，避免同一个人的重复框占满候选数、挤掉置信度较低的其他人；
+    # 之后分析的IoU阈值不高于此值时可直接复用
+    'iou': 0.9,
+    'max_candidates': 64  # 宽松NMS之后每帧最多保存的候选数（按置信度），限制缓存大小
+}
+
+# 上传后预推理配置（低优先级，正式分析时让出资源；模型、推理尺寸和IoU阈值使用服务默认性能档位的配置）
+SPECULATIVE_CONFIG = {
+    'enabled': False,
+    'conf': 0.25,  # 预推理置信度阈值，分析阈值不低于此值时可直接复用
+    'poll_interval': 0.5,  # 让出资源时的检查间隔（秒）
+    'nice': 19  # 预推理线程的调度优先级（仅Linux生效）
+}
+
+# 分析任务内存预算配置
+MEMORY_CONFIG = {
+    'job_budget_mb': float(os.environ.get('POSE_JOB_MEMORY_MB', '1536')),  # 单个分析任务可用内存（MB），0表示不限制
+    'segment_frames': 900,  # 逐帧数据按段分配，每段的帧数
+    'spill_ratio': 0.6,  # 任务内存超过预算的该比例时，逐帧数据改为写入磁盘数组
+    'spill_dir': os.environ.get('POSE_SPILL_DIR'),  # 磁盘数组目录，None表示系统临时目录
+    'check_interval': 30,  # 分析中每隔多少帧采样一次内存
+    'fixed_overhead_mb': 300,  # 估算用：模型推理、图表和报告生成的固定开销
+    'per_frame_bytes': 4096  # 估算用：每帧的逐帧指标、关键点和后处理开销
+}
+
+# 单个长视频分段并行分析配置
+# 只在保存关键点轨迹（非eager模式）且视频已有关键帧索引时生效，否则按原方式顺序分析
+PARALLEL_CONFIG = {
+    'enabled': False,
+    'workers': None,  # 工作进程数，None表示CPU核数
+    'min_segment_seconds': 15.0,  # 每段的最短时长（秒），视频不足两段时顺序分析
+    'overlap_frames': 8,  # 每段多分析的帧数，用于校验相邻段在接缝处的结果一致
+    'seam_tolerance': 1e-3  # 接缝处重叠帧的指标允许误差，超出时退回顺序分析
+}
+
+# 日志配置（可用环境变量覆盖）
+LOGGING_CONFIG = {
+    'level': os.environ.get('POSE_LOG_LEVEL', 'INFO'),
+    'format': os.environ.get('POSE_LOG_FORMAT', 'text'),  # 'text': 单行文本；'json': 每行一个JSON对象
+    'log_file': os.environ.get('POSE_LOG_FILE'),  # None表示输出到标准输出
+    'error_sample_burst': 5,  # 同类错误每个时间窗口内最多完整记录的条数
+    'error_sample_interval': 10.0  # 错误采样时间窗口（秒），超出部分只汇总条数
+}
+
 # 关键点配置
 KEYPOINTS_CONFIG = {
     'nose': 0,
@@ -121,6 +346,26 @@ def get_model_path(model_name: str = None) -> str:
     
     return os.path.join(MODEL_CONFIG['model_path'], model_name)
 
+def get_performance_profile(name: str = None) -> dict:
+    """
+    获取性能档位配置
+    
+    Args:
+        name: 档位名称，如果为None则使用默认档位
+        
+    Returns:
+        dict: 档位配置（包含name字段）
+        
+    Raises:
+        ValueError: 未知的档位名称
+    """
+    if not name:
+        name = DEFAULT_PERFORMANCE_PROFILE
+    if name not in PERFORMANCE_PROFILES:
+        raise ValueError(f"未知的性能档位: {name}（可选: {', '.join(PERFORMANCE_PROFILES)}）")
+    
+    return dict(PERFORMANCE_PROFILES[name], name=name)
+
 def get_patient_folder_path(patient_id: int, patient_name: str) -> str:
     """
     获取患者文件夹路径
@@ -0,0 +1,123 @@
+"""
+动作周期检测模块
+在分析过程中逐帧跟踪被评估一侧的角度（正面、侧面）或腕高度（背面），识别抬起到最高点并回到静息位，
+且左右两侧指标的最大值都已落在完整分析的后半段后，再多分析一段尾部余量就提前结束推理
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from .config import CYCLE_CONFIG
+
+
+class CycleDetector:
+    """在线动作周期检测类（每个视频一个实例）"""
+
+    def __init__(self, angle: str, fps: float, expected_records: int, frame_stride: int = 1,
+                 cycle_key: str = 'left_angle'):
+        """
+        初始化周期检测器
+
+        Args:
+            angle: 视频角度 (front/side/back)，决定最小动作幅度
+            fps: 视频帧率
+            expected_records: 完整分析时的推理帧数（不少于完整分析的逐帧指标条数）
+            frame_stride: 推理间隔（帧）
+            cycle_key: 判断动作周期的指标（被评估一侧），其余指标只跟踪最大值的位置
+        """
+        self.min_amplitude = CYCLE_CONFIG['min_amplitude'][angle]
+        self.cycle_key = cycle_key
+        self.frame_stride = max(1, frame_stride)
+        self.rest_records = max(1, int(round(CYCLE_CONFIG['rest_seconds'] * fps / self.frame_stride)))
+        self.tail_frames = int(round(CYCLE_CONFIG['tail_seconds'] * fps))
+        # 统计只取后50%的记录（DataProcessor），每个指标的最大值都落在完整分析的后半段时提前结束才不改变最大值
+        self.min_peak_index = expected_records // 2
+
+        self._window: Deque[float] = deque(maxlen=max(1, CYCLE_CONFIG['smooth_window']))
+        self._lowest: Optional[float] = None  # 平滑后的最小值
+        self._baseline: Optional[float] = None  # 静息位：最高点之前平滑后的最小值
+        self._peak: Optional[float] = None  # 平滑后的最大值
+        self._peaks: Dict[str, Tuple[float, int, int]] = {}  # 各指标原始值的最大值 {指标: (值, 记录下标, 帧号)}
+        self._rest_count = 0
+        self.complete_frame: Optional[int] = None  # 动作完成（且各指标最大值都在后半段）的帧号
+        self.stop_frame: Optional[int] = None  # 提前结束的帧号（已分析帧数达到该值后停止）
+
+    def update(self, frame: int, record_index: Optional[int] = None,
+               values: Optional[Dict[str, float]] = None) -> None:
+        """
+        输入一条逐帧指标
+
+        Args:
+            frame: 帧号（从1开始，相对分析开始帧）
+            record_index: 该指标在逐帧数据中的下标
+            values: 该帧的全部指标 {指标: 值}，未检测到受检者或处理出错时为None
+        """
+        if self.complete_frame is not None:
+            return
+        if values is None:
+            # 丢失受检者的帧不能说明已回到静息位
+            self._rest_count = 0
+            return
+
+        for key, value in values.items():
+            if key not in self._peaks or value > self._peaks[key][0]:
+                self._peaks[key] = (value, record_index, frame)
+
+        rested = self._update_cycle(values[self.cycle_key])
+        # 最大值在前半段的指标，完整分析的统计取不到它，提前结束会改变结果
+        if rested and min(index for _, index, _ in self._peaks.values()) >= self.min_peak_index:
+            self.complete_frame = frame
+            self.stop_frame = frame + self.tail_frames
+
+    def _update_cycle(self, value: float) -> bool:
+        """
+        跟踪被评估一侧的平滑曲线
+
+        Returns:
+            bool: 当前是否已从最高点回到静息位并持续rest_seconds
+        """
+        self._window.append(value)
+        smoothed = float(np.mean(self._window))
+        self._lowest = smoothed if self._lowest is None else min(self._lowest, smoothed)
+        if self._peak is None or smoothed > self._peak:
+            # 新的最高点：静息位取最高点之前的最小值
+            self._peak, self._baseline = smoothed, self._lowest
+            self._rest_count = 0
+            return False
+
+        amplitude = self._peak - self._baseline
+        if amplitude < self.min_amplitude:
+            return False
+        if smoothed <= self._baseline + CYCLE_CONFIG['return_ratio'] * amplitude:
+            self._rest_count += 1
+        else:
+            self._rest_count = 0
+        return self._rest_count >= self.rest_records
+
+    def should_stop(self, frame_count: int) -> bool:
+        """已分析帧数是否达到提前结束的位置"""
+        return self.stop_frame is not None and frame_count >= self.stop_frame
+
+    def summary(self, frame_count: int, expected_frames: int) -> Dict[str, Any]:
+        """
+        提前结束的记录（写入性能记录）
+
+        Args:
+            frame_count: 实际分析的帧数
+            expected_frames: 完整分析的帧数
+
+        Returns:
+            Dict[str, Any]: 各指标最大值的帧号、动作完成的帧号、提前结束的帧号、少分析的帧数，
+                            以及与完整分析一致的统计项（只保证最大值；最小值、活动范围、平均值和速度只反映实际分析的帧）
+        """
+        stopped = self.should_stop(frame_count)
+        return {
+            'cycle_key': self.cycle_key,
+            'peak_frames': {key: peak_frame for key, (_, _, peak_frame) in self._peaks.items()},
+            'complete_frame': self.complete_frame,
+            'stop_frame': frame_count if stopped else None,
+            'skipped_frames': max(0, expected_frames - frame_count) if stopped else 0,
+            'exact_statistics': 'max' if stopped else 'all'
+        }
@@ -11,6 +11,9 @@ from datetime import datetime
 import os
 from scipy.signal import savgol_filter
 from .font_config import setup_chinese_font, get_font_properties
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 class DataProcessor:
     """数据处理器类"""
@@ -20,26 +23,30 @@ class DataProcessor:
         # 设置中文字体支持
         setup_chinese_font()
     
-    def calculate_velocity(self, angle_data: List[Dict[str, Any]], fps: float = 30.0) -> List[Dict[str, Any]]:
+    def calculate_velocity(self, angle_data: List[Dict[str, Any]], fps: float = 30.0,
+                           output: Optional[Any] = None) -> List[Dict[str, Any]]:
         """
         计算角速度（度/秒）
         
         Args:
             angle_data: 角度数据列表
             fps: 视频帧率，默认30fps
+            output: 追加结果的容器（如FrameRecords），None表示新建列表
             
         Returns:
             List[Dict[str, Any]]: 速度数据列表（度/秒）
         """
-        velocity_data = []
+        velocity_data = [] if output is None else output
         
         for i in range(1, len(angle_data)):
             prev_frame = angle_data[i-1]
             curr_frame = angle_data[i]
+            # 隔帧推理时相邻记录间隔多帧
+            frame_gap = max(1, curr_frame['frame'] - prev_frame['frame'])
             
             # 计算度/帧
-            left_velocity_per_frame = curr_frame['left_angle'] - prev_frame['left_angle']
-            right_velocity_per_frame = curr_frame['right_angle'] - prev_frame['right_angle']
+            left_velocity_per_frame = (curr_frame['left_angle'] - prev_frame['left_angle']) / frame_gap
+            right_velocity_per_frame = (curr_frame['right_angle'] - prev_frame['right_angle']) / frame_gap
             
             # 转换为度/秒
             left_velocity = left_velocity_per_frame * fps
@@ -107,7 +114,7 @@ class DataProcessor:
             filtered_data = savgol_filter(data_array, window_length, polyorder)
             return filtered_data.tolist()
         except Exception as e:
-            print(f"SG滤波失败，使用原始数据: {e}")
+            logger.warning(f"SG滤波失败，使用原始数据: {e}")
             return data
     
     def generate_charts(self, analysis_results: Dict[str, Any], patient_name: str, shoulder_selection: str = 'left') -> Dict[str, plt.Figure]:
@@ -7,6 +7,9 @@ import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import os
 import platform
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 def setup_chinese_font():
     """
@@ -83,11 +86,11 @@ def setup_chinese_font():
     # 设置matplotlib字体
     if available_font:
         plt.rcParams['font.sans-serif'] = [available_font] + plt.rcParams['font.sans-serif']
-        print(f"已设置中文字体: {available_font}")
+        logger.info(f"已设置中文字体: {available_font}")
     else:
         # 如果都没找到，使用默认设置
         plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial Unicode MS'] + plt.rcParams['font.sans-serif']
-        print("警告: 未找到合适的中文字体，使用默认字体")
+        logger.warning("未找到合适的中文字体，使用默认字体")
     
     # 设置负号显示
     plt.rcParams['axes.unicode_minus'] = False
@@ -97,10 +100,10 @@ def setup_chinese_font():
         fig, ax = plt.subplots(figsize=(1, 1))
         ax.text(0.5, 0.5, '测试中文', fontsize=12)
         plt.close(fig)
-        print("中文字体设置成功")
+        logger.info("中文字体设置成功")
         return True
     except Exception as e:
-        print(f"字体设置验证失败: {e}")
+        logger.error(f"字体设置验证失败: {e}")
         return False
 
 def get_font_properties(font_size=12, font_weight='normal'):
@@ -0,0 +1,183 @@
+"""
+单帧取图模块
+按时间点从视频中解码单帧，带内存上限的LRU缓存，供时间轴界面预览
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Any
+
+import cv2
+import numpy as np
+
+from .config import FRAME_SERVER_CONFIG
+from .video_ingest import load_video_index, get_file_signature, seek_to_frame
+
+
+class FrameCache:
+    """解码帧LRU缓存类（按字节数限制内存）"""
+
+    def __init__(self, max_bytes: int):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存的最大字节数
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames: 'OrderedDict[Tuple[Any, ...], np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[np.ndarray]:
+        """获取缓存帧，命中时移到最近使用的位置"""
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key: Tuple[Any, ...], frame: np.ndarray) -> None:
+        """放入缓存帧，超出内存上限时淘汰最久未使用的帧"""
+        if frame.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+
+            self._frames[key] = frame
+            self.current_bytes += frame.nbytes
+
+            while self.current_bytes > self.max_bytes and self._frames:
+                _, evicted = self._frames.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                'frames': len(self._frames),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class FrameServer:
+    """单帧取图服务类"""
+
+    def __init__(self, cache_max_mb: Optional[int] = None):
+        """
+        初始化取图服务
+
+        Args:
+            cache_max_mb: 缓存内存上限（MB），None表示使用FRAME_SERVER_CONFIG配置
+        """
+        if cache_max_mb is None:
+            cache_max_mb = FRAME_SERVER_CONFIG['cache_max_mb']
+        self.cache = FrameCache(cache_max_mb * 1024 * 1024)
+
+    def get_frame(self, video_path: str, timestamp: float) -> Optional[np.ndarray]:
+        """
+        获取指定时间点的解码帧（原始分辨率）
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间点（秒）
+
+        Returns:
+            Optional[np.ndarray]: 解码帧，超出视频范围时返回None
+        """
+        video_index = load_video_index(video_path)
+
+        cap = None
+        if video_index:
+            fps = video_index['metadata']['fps']
+            frame_total = video_index['metadata']['frame_count']
+            keyframes = video_index['keyframes']
+        else:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            keyframes = None
+
+        if fps <= 0:
+            if cap is not None:
+                cap.release()
+            return None
+
+        frame_number = min(max(int(timestamp * fps), 0), max(frame_total - 1, 0))
+
+        # 文件签名作为缓存键的一部分，视频被替换后旧缓存自然失效
+        signature = get_file_signature(video_path)
+        key = (video_path, signature['size'], signature['mtime'], frame_number)
+        frame = self.cache.get(key)
+        if frame is not None:
+            if cap is not None:
+                cap.release()
+            return frame
+
+        if cap is None:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return None
+
+        try:
+            seek_to_frame(cap, frame_number, keyframes)
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+
+        if not ret:
+            return None
+
+        self.cache.put(key, frame)
+        return frame
+
+    def get_frame_jpeg(self, video_path: str, timestamp: float,
+                       max_width: Optional[int] = None,
+                       quality: Optional[int] = None) -> Optional[bytes]:
+        """
+        获取指定时间点的JPEG图片，可选缩小到指定宽度
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间点（秒）
+            max_width: 输出最大宽度（像素），None表示原始宽度
+            quality: JPEG质量，None表示使用配置
+
+        Returns:
+            Optional[bytes]: JPEG数据
+        """
+        frame = self.get_frame(video_path, timestamp)
+        if frame is None:
+            return None
+
+        if max_width:
+            max_width = min(max_width, FRAME_SERVER_CONFIG['max_width'])
+            height, width = frame.shape[:2]
+            if width > max_width:
+                new_height = max(1, int(round(height * max_width / width)))
+                frame = cv2.resize(frame, (max_width, new_height), interpolation=cv2.INTER_AREA)
+
+        if quality is None:
+            quality = FRAME_SERVER_CONFIG['jpeg_quality']
+
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        return buffer.tobytes() if ret else None
@@ -0,0 +1,440 @@
+"""
+推理工作进程池模块
+独立的工作进程各自加载一个姿态模型；解码后的帧通过 multiprocessing.shared_memory 环形缓冲区交给工作进程，
+检测结果也写回共享内存，进程间只传递槽位号、尺寸和推理参数等少量元数据。
+工作进程崩溃或超时只影响在途的帧，进程池会自动重启该进程
+"""
+
+import atexit
+import itertools
+import threading
+import queue
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import INFERENCE_POOL_CONFIG, THREAD_CONFIG, RAW_PREDICTION_CONFIG
+from .resources import get_available_threads
+from .pose_detector import PoseDetector, DetectionResult, create_pose_detector
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+NUM_KEYPOINTS = 17
+# 每个检测在结果缓冲区中的宽度：关键点(17x3) + 检测框(4) + 置信度(1)
+DETECTION_WIDTH = NUM_KEYPOINTS * 3 + 4 + 1
+
+
+def _worker_main(model_path: str, frame_shm_name: str, result_shm_name: str, slots: int,
+                 slot_bytes: int, max_detections: int, connection: Any, torch_threads: int) -> None:
+    """
+    工作进程入口：加载模型，循环处理请求 (请求ID, 槽位, 帧形状, conf, iou, classes, imgsz)
+
+    Args:
+        model_path: 模型路径
+        frame_shm_name: 帧缓冲区共享内存名称
+        result_shm_name: 结果缓冲区共享内存名称
+        slots: 槽位数
+        slot_bytes: 每个槽位的字节数
+        max_detections: 每帧最多返回的检测数
+        connection: 与客户端通信的管道
+        torch_threads: torch线程数
+    """
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    # 线程数已按进程数分配，不再按任务数切分
+    THREAD_CONFIG['enabled'] = False
+
+    frame_shm = shared_memory.SharedMemory(name=frame_shm_name)
+    result_shm = shared_memory.SharedMemory(name=result_shm_name)
+    frames = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=frame_shm.buf)
+    results = np.ndarray((slots, max_detections, DETECTION_WIDTH), dtype=np.float32, buffer=result_shm.buf)
+
+    try:
+        detector = create_pose_detector(model_path, use_pool=False, use_cascade=False)
+        connection.send(('ready', detector.get_backend_info()))
+
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+
+            request_id, slot, shape, conf, iou, classes, imgsz, max_det = message
+            try:
+                detector.imgsz = imgsz
+                detector.max_det = max_det
+                frame = frames[slot, :int(np.prod(shape))].reshape(shape)
+                keypoints, boxes, scores = detector.extract_detections(
+                    detector.predict(frame, conf=conf, iou=iou, classes=classes)[0])
+                count = min(len(scores), max_detections)
+                results[slot, :count, :NUM_KEYPOINTS * 3] = np.asarray(keypoints[:count]).reshape(count, -1)
+                results[slot, :count, NUM_KEYPOINTS * 3:NUM_KEYPOINTS * 3 + 4] = boxes[:count]
+                results[slot, :count, -1] = scores[:count]
+                connection.send((request_id, count, None))
+            except Exception as e:
+                connection.send((request_id, -1, str(e)))
+    finally:
+        del frames, results
+        frame_shm.close()
+        result_shm.close()
+
+
+class InferenceWorker:
+    """一个推理工作进程及其共享内存环形缓冲区（由客户端进程创建和持有）"""
+
+    def __init__(self, index: int, model_path: str):
+        """
+        创建共享内存并启动工作进程（等待模型加载完成）
+
+        Args:
+            index: 工作进程序号
+            model_path: 模型路径
+        """
+        self.index = index
+        self.model_path = model_path
+        self.slots = INFERENCE_POOL_CONFIG['slots']
+        self.slot_bytes = INFERENCE_POOL_CONFIG['max_frame_pixels'] * 3
+        # 原始候选缓存需要每帧前max_candidates个候选，结果槽位不能比它小
+        self.max_detections = max(INFERENCE_POOL_CONFIG['max_detections'], RAW_PREDICTION_CONFIG['max_candidates'])
+
+        self.frame_shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self.result_shm = shared_memory.SharedMemory(
+            create=True, size=self.slots * self.max_detections * DETECTION_WIDTH * 4)
+        self.frames = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=self.frame_shm.buf)
+        self.results = np.ndarray((self.slots, self.max_detections, DETECTION_WIDTH), dtype=np.float32,
+                                  buffer=self.result_shm.buf)
+
+        self.alive = False
+        self.backend_info: Dict[str, Any] = {}
+        self._ids = itertools.count()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._send_lock = threading.Lock()
+        # 空闲槽位队列在重启时保留（等待槽位的线程阻塞在这个队列上）
+        self.free_slots: 'queue.Queue[int]' = queue.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        # 超时时未归还的槽位（旧进程可能仍在写入），进程终止后重启时归还
+        self._lost_slots: List[int] = []
+        self.process = None
+        self.start()
+
+    def start(self) -> None:
+        """启动（或重启）工作进程"""
+        if self.process is not None:
+            # 旧进程的在途请求直接失败（它们的线程会归还各自的槽位），不等超时，
+            # 避免过期的超时再终止新启动的进程
+            with self._send_lock:
+                pending, self._pending = self._pending, {}
+            for request in pending.values():
+                request['error'] = '推理工作进程已重启'
+                request['event'].set()
+            lost, self._lost_slots = self._lost_slots, []
+            for slot in lost:
+                self.free_slots.put(slot)
+
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        workers = INFERENCE_POOL_CONFIG['workers']
+        torch_threads = INFERENCE_POOL_CONFIG['torch_threads'] or max(1, get_available_threads() // workers)
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.model_path, self.frame_shm.name, self.result_shm.name, self.slots, self.slot_bytes,
+                  self.max_detections, child_connection, torch_threads),
+            name=f"pose-inference-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+        if not self.connection.poll(INFERENCE_POOL_CONFIG['start_timeout']):
+            self.process.kill()
+            raise RuntimeError(f"推理工作进程{self.index}启动超时")
+        try:
+            _, self.backend_info = self.connection.recv()
+        except EOFError:
+            raise RuntimeError(f"推理工作进程{self.index}启动失败，退出码 {self.process.exitcode}")
+
+        self.alive = True
+        threading.Thread(target=self._receive, args=(self.connection,), daemon=True,
+                         name=f"pose-inference-recv-{self.index}").start()
+        logger.info("推理工作进程%d已启动 (pid %d)", self.index, self.process.pid)
+
+    def _receive(self, connection: Any) -> None:
+        """接收工作进程的结果并唤醒等待的请求；进程退出时让在途请求全部失败"""
+        while True:
+            try:
+                request_id, count, error = connection.recv()
+            except (EOFError, OSError):
+                break
+            pending = self._pending.pop(request_id, None)
+            if pending is not None:
+                pending['count'], pending['error'] = count, error
+                pending['event'].set()
+
+        if connection is self.connection:
+            self.alive = False
+            for pending in list(self._pending.values()):
+                pending['error'] = '推理工作进程已退出'
+                pending['event'].set()
+            self._pending.clear()
+
+    @property
+    def in_flight(self) -> int:
+        """在途的帧数"""
+        return self.slots - self.free_slots.qsize()
+
+    def infer(self, frame: np.ndarray, conf: float, iou: float, classes: Optional[List[int]],
+              imgsz: Optional[int] = None, max_det: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        把帧写入空闲槽位，等待工作进程返回检测结果
+
+        Args:
+            frame: BGR图像（像素数不超过槽位容量）
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+            imgsz: 推理输入尺寸，None表示模型默认
+            max_det: 每帧最多保留的检测数，None表示模型默认
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 关键点(N, 17, 3), 检测框(N, 4), 置信度(N,)
+        """
+        slot = self.free_slots.get()
+        release_slot = True
+        try:
+            if not self.alive:
+                raise RuntimeError('推理工作进程已退出')
+
+            self.frames[slot, :frame.size] = np.ascontiguousarray(frame).reshape(-1)
+            request_id = next(self._ids)
+            pending = {'event': threading.Event(), 'count': None, 'error': None}
+            with self._send_lock:
+                process = self.process
+                self._pending[request_id] = pending
+                self.connection.send((request_id, slot, frame.shape, conf, iou, classes, imgsz, max_det))
+
+            if not pending['event'].wait(INFERENCE_POOL_CONFIG['timeout']):
+                self._pending.pop(request_id, None)
+                if self.process is process:
+                    # 超时的进程可能稍后仍会写入该槽位，直接终止，由进程池重启时归还槽位
+                    release_slot = False
+                    self._lost_slots.append(slot)
+                    self.kill()
+                raise TimeoutError(f"推理工作进程{self.index}超过{INFERENCE_POOL_CONFIG['timeout']}秒未返回")
+            if pending['error'] is not None:
+                raise RuntimeError(f"推理失败: {pending['error']}")
+
+            detections = self.results[slot, :pending['count']].copy()
+        finally:
+            if release_slot:
+                self.free_slots.put(slot)
+
+        count = len(detections)
+        return (detections[:, :NUM_KEYPOINTS * 3].reshape(count, NUM_KEYPOINTS, 3),
+                detections[:, NUM_KEYPOINTS * 3:NUM_KEYPOINTS * 3 + 4],
+                detections[:, -1])
+
+    def kill(self) -> None:
+        """终止工作进程"""
+        self.alive = False
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+    def close(self) -> None:
+        """通知工作进程退出并释放共享内存"""
+        if self.process.is_alive():
+            try:
+                with self._send_lock:
+                    self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5)
+        self.kill()
+        self.connection.close()
+
+        del self.frames, self.results
+        for shm in (self.frame_shm, self.result_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferencePool:
+    """推理工作进程池类"""
+
+    def __init__(self, model_path: str, workers: Optional[int] = None):
+        """
+        启动工作进程
+
+        Args:
+            model_path: 模型路径
+            workers: 工作进程数，None表示使用INFERENCE_POOL_CONFIG的配置
+        """
+        self.model_path = model_path
+        self.workers: List[InferenceWorker] = []
+        self._restart_lock = threading.Lock()
+        try:
+            for index in range(max(1, workers or INFERENCE_POOL_CONFIG['workers'])):
+                self.workers.append(InferenceWorker(index, model_path))
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def backend_info(self) -> Dict[str, Any]:
+        """推理后端信息（第一个工作进程的模型和设备，加上进程数）"""
+        info = dict(self.workers[0].backend_info) if self.workers else {}
+        info['inference_workers'] = len(self.workers)
+        return info
+
+    def _select_worker(self) -> InferenceWorker:
+        """选择在途帧最少的工作进程，已退出的先重启"""
+        worker = min(self.workers, key=lambda w: (not w.alive, w.in_flight))
+        if not worker.alive:
+            with self._restart_lock:
+                if not worker.alive:
+                    logger.warning("推理工作进程%d已退出（退出码 %s），正在重启", worker.index, worker.process.exitcode)
+                    worker.kill()
+                    worker.start()
+                    metrics.INFERENCE_WORKER_RESTARTS.inc()
+        _update_worker_gauge()
+        return worker
+
+    def infer(self, frame: np.ndarray, conf: float = 0.25, iou: float = 0.45,
+              classes: Optional[List[int]] = None, imgsz: Optional[int] = None,
+              max_det: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        单帧推理（线程安全）
+
+        Args:
+            frame: BGR图像，超过槽位容量时先缩小，结果坐标按比例还原
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+            imgsz: 推理输入尺寸，None表示模型默认
+            max_det: 每帧最多保留的检测数，None表示模型默认
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 关键点(N, 17, 3), 检测框(N, 4), 置信度(N,)
+        """
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if height * width > INFERENCE_POOL_CONFIG['max_frame_pixels']:
+            scale = (INFERENCE_POOL_CONFIG['max_frame_pixels'] / (height * width)) ** 0.5
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        started = time.perf_counter()
+        keypoints, boxes, scores = self._select_worker().infer(frame, conf, iou, classes, imgsz, max_det)
+        metrics.INFERENCE_SECONDS.observe(time.perf_counter() - started)
+
+        if scale != 1.0:
+            scale_x, scale_y = frame.shape[1] / width, frame.shape[0] / height
+            keypoints[..., 0] /= scale_x
+            keypoints[..., 1] /= scale_y
+            boxes[:, [0, 2]] /= scale_x
+            boxes[:, [1, 3]] /= scale_y
+        return keypoints, boxes, scores
+
+    def close(self) -> None:
+        """关闭全部工作进程并释放共享内存"""
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+
+# 按模型路径区分的推理进程池（不同性能档位、校准前后的模型和级联推理的两个模型可同时使用各自的进程池）
+_pools: Dict[str, InferencePool] = {}
+_pools_lock = threading.Lock()
+
+
+def _update_worker_gauge() -> None:
+    """更新全部进程池中存活的工作进程数"""
+    metrics.INFERENCE_WORKERS.set(sum(1 for pool in list(_pools.values()) for w in pool.workers if w.alive))
+
+
+def get_inference_pool(model_path: str) -> InferencePool:
+    """
+    获取模型对应的推理进程池（首次调用时启动，之后一直保留到进程退出）
+
+    Args:
+        model_path: 模型路径
+
+    Returns:
+        InferencePool: 推理进程池
+    """
+    with _pools_lock:
+        pool = _pools.get(model_path)
+        if pool is None:
+            pool = InferencePool(model_path)
+            _pools[model_path] = pool
+        _update_worker_gauge()
+        return pool
+
+
+def shutdown_inference_pool() -> None:
+    """关闭全部推理进程池"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        metrics.INFERENCE_WORKERS.set(0)
+
+
+atexit.register(shutdown_inference_pool)
+
+
+class PooledPoseDetector(PoseDetector):
+    """通过推理工作进程池推理的姿态检测器（本进程不加载模型）"""
+
+    def load_model(self) -> bool:
+        """连接（必要时启动）推理进程池"""
+        try:
+            start = time.perf_counter()
+            self.pool = get_inference_pool(self.model_path)
+            metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - start)
+            metrics.MODEL_LOADED.set(1)
+            return True
+        except Exception as e:
+            logger.error(f"推理进程池启动失败: {str(e)}")
+            self.pool = None
+            return False
+
+    def get_backend_info(self) -> Dict[str, Any]:
+        """推理后端信息"""
+        if self.pool is None:
+            return {'model_path': self.model_path, 'device': 'inference_pool (未启动)'}
+        return self.pool.backend_info
+
+    def predict(self, frame: np.ndarray, conf: float = 0.25,
+                iou: float = 0.45, classes: List[int] = None) -> Any:
+        """
+        经推理进程池推理
+
+        Args:
+            frame: 输入图像
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+
+        Returns:
+            Any: [DetectionResult]
+        """
+        if self.pool is None:
+            raise RuntimeError("推理进程池未启动")
+
+        keypoints, boxes, scores = self.pool.infer(frame, conf=conf, iou=iou, classes=classes, imgsz=self.imgsz,
+                                                   max_det=self.max_det)
+        metrics.MODEL_WARM.set(1)
+        return [DetectionResult(keypoints, boxes, scores)]
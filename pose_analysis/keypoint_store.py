@@ -0,0 +1,411 @@
+"""
+关键点存储模块
+保存逐帧的姿态检测结果（关键点、检测框、置信度），供后续分析直接切片复用；
+原始候选存储以宽松阈值推理（置信度RAW_PREDICTION_CONFIG['conf']、NMS的IoU RAW_PREDICTION_CONFIG['iou']即0.9），
+只合并几乎重合的重复框并按置信度保留前max_candidates个候选；之后置信度阈值不低于、IoU阈值不高于存储时阈值的分析
+都可在此基础上用numpy重新过滤，IoU阈值更高的分析需要重新推理
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+from .video_ingest import get_file_signature
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+STORE_VERSION = 1
+STORE_SUFFIX = '_keypoints.npz'
+NUM_KEYPOINTS = 17
+EXTRA_PREFIX = 'extra_'
+
+
+def nms_indices(boxes: np.ndarray, scores: np.ndarray, iou: float) -> np.ndarray:
+    """
+    贪心非极大值抑制（与ultralytics单类别NMS一致：按置信度从高到低保留，抑制与已保留框IoU大于阈值的框）
+
+    Args:
+        boxes: 检测框 (N, 4)，xyxy格式
+        scores: 置信度 (N,)
+        iou: IoU阈值
+
+    Returns:
+        np.ndarray: 保留的下标，按置信度降序
+    """
+    order = np.argsort(-scores, kind='stable')
+    if iou >= 1.0 or len(order) <= 1:
+        return order
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        overlap = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[overlap <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def filter_detections(keypoints: np.ndarray, boxes: np.ndarray, scores: np.ndarray,
+                      conf: float, iou: Optional[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    对候选检测按置信度过滤并做NMS（先过滤再NMS与先NMS再过滤结果相同）
+
+    Args:
+        keypoints: 关键点 (N, 17, 3)
+        boxes: 检测框 (N, 4)
+        scores: 置信度 (N,)
+        conf: 置信度阈值
+        iou: IoU阈值，None表示不做NMS
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: 过滤后的关键点、检测框和置信度，按置信度降序
+    """
+    keep = np.flatnonzero(scores >= conf)
+    if iou is not None:
+        keep = keep[nms_indices(boxes[keep], scores[keep], iou)]
+    return keypoints[keep], boxes[keep], scores[keep]
+
+
+def get_keypoint_store_path(video_path: str) -> str:
+    """
+    获取视频对应的关键点存储文件路径
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        str: 存储文件路径，例如 videos/front_keypoints.npz
+    """
+    base, _ = os.path.splitext(video_path)
+    return base + STORE_SUFFIX
+
+
+class KeypointStore:
+    """逐帧关键点存储类"""
+
+    def __init__(self, frame_offsets: np.ndarray, keypoints: np.ndarray,
+                 boxes: np.ndarray, scores: np.ndarray, meta: Dict[str, Any],
+                 extras: Optional[Dict[str, np.ndarray]] = None):
+        """
+        初始化关键点存储
+
+        Args:
+            frame_offsets: 每帧检测结果在数组中的起止偏移，长度为帧数+1
+            keypoints: 所有检测的关键点 (M, 17, 3)
+            boxes: 所有检测框 (M, 4)，xyxy格式
+            scores: 所有检测框置信度 (M,)
+            meta: 元数据（视频签名、帧率、推理参数、模型等）
+            extras: 附加的逐帧数组（例如逐帧角度指标），按名称保存
+        """
+        self.frame_offsets = frame_offsets
+        self.keypoints = keypoints
+        self.boxes = boxes
+        self.scores = scores
+        self.meta = meta
+        self.extras = extras or {}
+
+    @property
+    def frame_count(self) -> int:
+        """已存储的帧数"""
+        return len(self.frame_offsets) - 1
+
+    @property
+    def first_frame(self) -> int:
+        """第一帧对应的原视频帧号（只保存了部分时间段时不为0）"""
+        return int(self.meta.get('first_frame', 0))
+
+    @property
+    def raw(self) -> bool:
+        """是否为NMS之前的原始候选存储"""
+        return bool(self.meta.get('raw', False))
+
+    def covers(self, start_frame: int, frame_total: int) -> bool:
+        """
+        检查是否包含原视频 [start_frame, start_frame + frame_total) 范围内的全部帧
+
+        Args:
+            start_frame: 开始帧（从0开始，相对原视频）
+            frame_total: 帧数
+
+        Returns:
+            bool: 是否包含
+        """
+        return self.first_frame <= start_frame and start_frame + frame_total <= self.first_frame + self.frame_count
+
+    def frame_slice(self, frame_index: int) -> slice:
+        """获取指定帧的检测结果在数组中的范围"""
+        frame_index -= self.first_frame
+        return slice(int(self.frame_offsets[frame_index]), int(self.frame_offsets[frame_index + 1]))
+
+    def _has_frame(self, frame_index: int) -> bool:
+        """是否存储了指定帧（帧号相对原视频）"""
+        return 0 <= frame_index - self.first_frame < self.frame_count
+
+    def frame_keypoints(self, frame_index: int, conf: Optional[float] = None) -> np.ndarray:
+        """
+        获取指定帧的关键点
+
+        Args:
+            frame_index: 帧号（从0开始，相对原视频）
+            conf: 置信度阈值，高于存储时的阈值时在此处重新过滤
+
+        Returns:
+            np.ndarray: 关键点 (N, 17, 3)，按置信度降序
+        """
+        return self.frame_detections(frame_index, conf)[0]
+
+    def frame_detections(self, frame_index: int, conf: Optional[float] = None,
+                         iou: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        获取指定帧的全部检测结果
+
+        Args:
+            frame_index: 帧号（从0开始，相对原视频）
+            conf: 置信度阈值，高于存储时的阈值时在此处重新过滤
+            iou: IoU阈值，原始候选存储按此重新做NMS（None表示存储时的阈值）；其他存储忽略
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 关键点(N, 17, 3), 检测框(N, 4), 置信度(N,)
+        """
+        if not self._has_frame(frame_index):
+            return (np.zeros((0, NUM_KEYPOINTS, 3), dtype=np.float32),
+                    np.zeros((0, 4), dtype=np.float32),
+                    np.zeros((0,), dtype=np.float32))
+
+        rows = self.frame_slice(frame_index)
+        keypoints, boxes, scores = self.keypoints[rows], self.boxes[rows], self.scores[rows]
+        if self.raw:
+            return filter_detections(keypoints, boxes, scores, max(conf or 0, self.meta.get('conf', 0)), iou)
+        if conf is not None and conf > self.meta.get('conf', 0):
+            keep = scores >= conf
+            keypoints, boxes, scores = keypoints[keep], boxes[keep], scores[keep]
+        return keypoints, boxes, scores
+
+    def is_valid_for(self, video_path: str, model_path: Optional[str] = None) -> bool:
+        """
+        检查存储是否与视频文件（及模型）匹配
+
+        Args:
+            video_path: 视频文件路径
+            model_path: 模型路径，为None时不检查
+
+        Returns:
+            bool: 是否可复用
+        """
+        if not os.path.exists(video_path):
+            return False
+
+        signature = get_file_signature(video_path)
+        stored = self.meta.get('signature', {})
+        if stored.get('size') != signature['size'] or abs(stored.get('mtime', 0) - signature['mtime']) > 1e-3:
+            return False
+
+        if model_path is not None and self.meta.get('model_path') != model_path:
+            return False
+
+        return True
+
+    def is_compatible(self, conf: float, iou: float, imgsz: Optional[int] = None) -> bool:
+        """
+        检查推理参数是否可由本存储复现
+
+        置信度过滤在NMS之后等价于在NMS之前过滤，因此只要请求的置信度不低于
+        存储时的阈值即可复用；原始候选存储只做过宽松的NMS，请求的IoU阈值不高于存储时的阈值即可重新做NMS
+        （宽松NMS只抑制与更高置信度的框几乎重合的框），其他存储的IoU阈值必须一致；
+        推理输入尺寸改变检测结果，必须一致。
+
+        Args:
+            conf: 请求的置信度阈值
+            iou: 请求的IoU阈值
+            imgsz: 请求的推理输入尺寸，None表示模型默认
+
+        Returns:
+            bool: 是否兼容
+        """
+        stored_iou = self.meta.get('iou')
+        if self.raw:
+            # 早期的原始候选存储不做NMS就截取候选（stored_iou为None），同一个人的重复框可能挤掉其他人，不再复用
+            iou_compatible = stored_iou is not None and iou <= stored_iou + 1e-9
+        else:
+            iou_compatible = stored_iou is not None and abs(iou - stored_iou) < 1e-9
+        return conf >= self.meta.get('conf', 1.0) - 1e-9 and iou_compatible and self.meta.get('imgsz') == imgsz
+
+    def save(self, path: str) -> None:
+        """
+        保存到npz文件（先写临时文件再替换，避免读到不完整的文件）
+
+        Args:
+            path: 文件路径
+        """
+        temp_path = path + '.tmp.npz'
+        np.savez(
+            temp_path,
+            frame_offsets=self.frame_offsets,
+            keypoints=self.keypoints,
+            boxes=self.boxes,
+            scores=self.scores,
+            meta=np.array(json.dumps(self.meta, ensure_ascii=False)),
+            **{EXTRA_PREFIX + name: value for name, value in self.extras.items()}
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['KeypointStore']:
+        """
+        从npz文件加载
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            Optional[KeypointStore]: 加载的存储，文件不存在或版本不符时返回None
+        """
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('version') != STORE_VERSION:
+                    return None
+                return cls(
+                    frame_offsets=data['frame_offsets'],
+                    keypoints=data['keypoints'],
+                    boxes=data['boxes'],
+                    scores=data['scores'],
+                    meta=meta,
+                    extras={key[len(EXTRA_PREFIX):]: data[key] for key in data.files
+                            if key.startswith(EXTRA_PREFIX)}
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"加载关键点存储失败 {path}: {e}")
+            return None
+
+
+class KeypointStoreWriter:
+    """逐帧追加检测结果并生成KeypointStore"""
+
+    def __init__(self, video_path: str, fps: float, conf: float, iou: float,
+                 model_path: str, imgsz: Optional[int] = None, first_frame: int = 0, raw: bool = False):
+        """
+        初始化写入器
+
+        Args:
+            video_path: 视频文件路径（用于记录文件签名）
+            fps: 视频帧率
+            conf: 推理使用的置信度阈值
+            iou: 推理使用的IoU阈值
+            model_path: 推理使用的模型路径
+            imgsz: 推理输入尺寸，None表示模型默认
+            first_frame: 第一帧对应的原视频帧号
+            raw: 是否为宽松阈值推理的原始候选（读取时按请求的阈值重新过滤）
+        """
+        self.meta = {
+            'version': STORE_VERSION,
+            'signature': get_file_signature(video_path),
+            'fps': fps,
+            'conf': conf,
+            'iou': iou,
+            'raw': raw,
+            'first_frame': first_frame,
+            'model_path': model_path,
+            'imgsz': imgsz
+        }
+        self._offsets = [0]
+        self._keypoints: List[np.ndarray] = []
+        self._boxes: List[np.ndarray] = []
+        self._scores: List[np.ndarray] = []
+
+    def append(self, keypoints: np.ndarray, boxes: np.ndarray, scores: np.ndarray) -> None:
+        """
+        追加一帧的检测结果
+
+        Args:
+            keypoints: 关键点 (N, 17, 3)
+            boxes: 检测框 (N, 4)
+            scores: 置信度 (N,)
+        """
+        self._keypoints.append(np.asarray(keypoints, dtype=np.float32).reshape(-1, NUM_KEYPOINTS, 3))
+        self._boxes.append(np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+        self._scores.append(np.asarray(scores, dtype=np.float32).reshape(-1))
+        self._offsets.append(self._offsets[-1] + len(self._scores[-1]))
+
+    def append_empty(self) -> None:
+        """追加一帧空的检测结果（保持帧号对齐）"""
+        self.append(np.zeros((0, NUM_KEYPOINTS, 3)), np.zeros((0, 4)), np.zeros((0,)))
+
+    @property
+    def frame_count(self) -> int:
+        """已追加的帧数"""
+        return len(self._offsets) - 1
+
+    def finalize(self, extras: Optional[Dict[str, np.ndarray]] = None) -> KeypointStore:
+        """
+        生成KeypointStore
+
+        Args:
+            extras: 附加的逐帧数组
+
+        Returns:
+            KeypointStore: 关键点存储
+        """
+        meta = dict(self.meta)
+        meta['frame_count'] = len(self._offsets) - 1
+        meta['created_at'] = datetime.now().isoformat()
+
+        if self._scores:
+            keypoints = np.concatenate(self._keypoints)
+            boxes = np.concatenate(self._boxes)
+            scores = np.concatenate(self._scores)
+        else:
+            keypoints = np.zeros((0, NUM_KEYPOINTS, 3), dtype=np.float32)
+            boxes = np.zeros((0, 4), dtype=np.float32)
+            scores = np.zeros((0,), dtype=np.float32)
+
+        return KeypointStore(
+            frame_offsets=np.asarray(self._offsets, dtype=np.int64),
+            keypoints=keypoints,
+            boxes=boxes,
+            scores=scores,
+            meta=meta,
+            extras=extras
+        )
+
+
+def load_keypoint_store(video_path: str, model_path: Optional[str] = None) -> Optional[KeypointStore]:
+    """
+    加载视频对应的关键点存储，不存在或已与视频不匹配时返回None
+
+    Args:
+        video_path: 视频文件路径
+        model_path: 模型路径，为None时不检查
+
+    Returns:
+        Optional[KeypointStore]: 关键点存储
+    """
+    store = KeypointStore.load(get_keypoint_store_path(video_path))
+    if store is None or not store.is_valid_for(video_path, model_path):
+        return None
+    return store
+
+
+def remove_keypoint_store(video_path: str) -> None:
+    """
+    删除视频对应的关键点存储
+
+    Args:
+        video_path: 视频文件路径
+    """
+    path = get_keypoint_store_path(video_path)
+    if os.path.exists(path):
+        os.remove(path)
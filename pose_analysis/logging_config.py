@@ -0,0 +1,212 @@
+"""
+日志模块
+分级结构化日志：每条日志带分析任务上下文（analysis_id、patient_id），热路径错误按时间窗口采样
+"""
+
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .config import LOGGING_CONFIG, MODEL_CONFIG
+
+# 当前线程的任务上下文（新线程从空上下文开始，需在线程入口处设置）
+_job_context: contextvars.ContextVar = contextvars.ContextVar('pose_job_context', default={})
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    获取日志记录器
+
+    Args:
+        name: 模块名称，通常传入 __name__
+
+    Returns:
+        logging.Logger: 日志记录器
+    """
+    return logging.getLogger(name)
+
+
+def set_job_context(**fields: Any) -> contextvars.Token:
+    """
+    设置当前线程的任务上下文（值为None的字段忽略）
+
+    Args:
+        **fields: 上下文字段，例如 analysis_id、patient_id、angle
+
+    Returns:
+        contextvars.Token: 用于恢复之前上下文的令牌
+    """
+    context = dict(_job_context.get())
+    context.update({key: value for key, value in fields.items() if value is not None})
+    return _job_context.set(context)
+
+
+@contextmanager
+def job_context(**fields: Any):
+    """
+    任务上下文，退出时恢复之前的上下文
+
+    Args:
+        **fields: 上下文字段
+    """
+    token = set_job_context(**fields)
+    try:
+        yield
+    finally:
+        _job_context.reset(token)
+
+
+def get_job_context() -> Dict[str, Any]:
+    """获取当前线程的任务上下文"""
+    return dict(_job_context.get())
+
+
+class JobContextFilter(logging.Filter):
+    """把任务上下文附加到日志记录上"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.job_context = _job_context.get()
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """结构化日志格式：单行文本或JSON"""
+
+    def __init__(self, log_format: str = 'text'):
+        """
+        初始化格式化器
+
+        Args:
+            log_format: 'text' 或 'json'
+        """
+        super().__init__()
+        self.log_format = log_format
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = getattr(record, 'job_context', None) or {}
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')
+        message = record.getMessage()
+
+        if self.log_format == 'json':
+            entry = {
+                'time': timestamp,
+                'level': record.levelname,
+                'logger': record.name,
+                'message': message,
+                **context
+            }
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        context_text = ' '.join(f"{key}={value}" for key, value in context.items())
+        line = f"{timestamp} {record.levelname:<7} {record.name}"
+        if context_text:
+            line += f" [{context_text}]"
+        line += f" {message}"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def setup_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                  log_file: Optional[str] = None) -> None:
+    """
+    配置根日志记录器（重复调用时只生效一次）
+
+    Args:
+        level: 日志级别，None表示使用LOGGING_CONFIG配置
+        log_format: 'text' 或 'json'，None表示使用配置
+        log_file: 日志文件路径，None表示使用配置（未配置时输出到标准输出）
+    """
+    global _configured
+
+    with _setup_lock:
+        if _configured:
+            return
+
+        level = (level or LOGGING_CONFIG['level']).upper()
+        log_format = log_format or LOGGING_CONFIG['format']
+        log_file = log_file or LOGGING_CONFIG['log_file']
+
+        handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter(log_format))
+        handler.addFilter(JobContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(handler)
+
+        # ultralytics默认每帧输出一行推理日志，只保留警告
+        if not MODEL_CONFIG['verbose']:
+            logging.getLogger('ultralytics').setLevel(logging.WARNING)
+
+        _configured = True
+
+
+class ErrorSampler:
+    """热路径错误采样类：同类错误每个时间窗口只完整记录前几条，其余汇总条数"""
+
+    def __init__(self, logger: logging.Logger, burst: Optional[int] = None,
+                 interval: Optional[float] = None):
+        """
+        初始化采样器
+
+        Args:
+            logger: 日志记录器
+            burst: 每个时间窗口内完整记录的条数，None表示使用配置
+            interval: 时间窗口（秒），None表示使用配置
+        """
+        self.logger = logger
+        self.burst = LOGGING_CONFIG['error_sample_burst'] if burst is None else burst
+        self.interval = LOGGING_CONFIG['error_sample_interval'] if interval is None else interval
+        self.total: Dict[str, int] = {}
+        self._windows: Dict[str, list] = {}  # {key: [窗口开始时间, 已记录条数, 已省略条数]}
+        self._lock = threading.Lock()
+
+    def log(self, key: str, msg: str, *args: Any, level: int = logging.ERROR) -> None:
+        """
+        记录一条错误（超出采样配额时只计数）
+
+        Args:
+            key: 错误类别，同类错误共享配额
+            msg: 日志消息（%格式）
+            *args: 消息参数
+            level: 日志级别
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.total[key] = self.total.get(key, 0) + 1
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = [now, 0, 0]
+                self._windows[key] = window
+            else:
+                suppressed = 0
+
+            if window[1] >= self.burst:
+                window[2] += 1
+                return
+            window[1] += 1
+
+        if suppressed:
+            msg += f" (上一时间窗口省略了{suppressed}条同类日志)"
+        self.logger.log(level, msg, *args)
+
+    def flush(self) -> None:
+        """汇总输出尚未报告的省略条数"""
+        with self._lock:
+            pending = {key: window[2] for key, window in self._windows.items() if window[2]}
+            totals = dict(self.total)
+            self._windows.clear()
+
+        for key, suppressed in pending.items():
+            self.logger.warning("%s: 共%d条，其中%d条未完整记录", key, totals.get(key, 0), suppressed)
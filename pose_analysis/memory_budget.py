@@ -0,0 +1,392 @@
+"""
+分析任务内存预算模块
+分析前按视频尺寸和帧数估算内存，超出预算的任务直接拒绝；分析中按帧采样进程内存，
+逐帧数据按段存放，超过预算的一定比例后改为磁盘数组，仍超出预算时终止任务，避免整个服务被OOM杀掉
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import MEMORY_CONFIG
+from .profiling import get_current_rss_mb
+from .video_ingest import load_video_index
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+# 解码、绘制和推理预处理同时存在的帧缓冲数量（估算用）
+FRAME_BUFFERS = 4
+# 以整数保存的字段
+INTEGER_FIELDS = ('frame',)
+
+# 本进程中正在运行的分析任务的预算（并发任务分摊进程内存增量）
+_active_budgets: 'weakref.WeakSet[MemoryBudget]' = weakref.WeakSet()
+_active_lock = threading.Lock()
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """分析任务超出内存预算"""
+
+
+class FrameRecords(Sequence):
+    """
+    逐帧数值记录类
+    按段分配float64数组保存，可整体溢出到磁盘数组；按下标或迭代访问时返回与原来列表元素相同的dict
+    """
+
+    def __init__(self, fields: Tuple[str, ...], segment_frames: Optional[int] = None):
+        """
+        初始化记录
+
+        Args:
+            fields: 字段名，例如 ('frame', 'left_angle', 'right_angle')
+            segment_frames: 每段的帧数，None表示使用MEMORY_CONFIG的配置
+        """
+        self.fields = tuple(fields)
+        self.segment_frames = segment_frames or MEMORY_CONFIG['segment_frames']
+        self._columns = {name: i for i, name in enumerate(self.fields)}
+        self._segments: List[np.ndarray] = []
+        self._length = 0
+        self._spill_dir: Optional[str] = None
+
+    def _new_segment(self) -> np.ndarray:
+        """分配一段（已溢出时直接在磁盘上分配）"""
+        shape = (self.segment_frames, len(self.fields))
+        if self._spill_dir is None:
+            return np.empty(shape, dtype=np.float64)
+        path = os.path.join(self._spill_dir, f"segment_{len(self._segments)}.dat")
+        return np.memmap(path, dtype=np.float64, mode='w+', shape=shape)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        追加一帧的记录
+
+        Args:
+            record: 包含全部字段的dict
+        """
+        position = self._length % self.segment_frames
+        if position == 0:
+            self._segments.append(self._new_segment())
+        self._segments[-1][position] = [record[name] for name in self.fields]
+        self._length += 1
+
+    @property
+    def spilled(self) -> bool:
+        """是否已改为磁盘数组"""
+        return self._spill_dir is not None
+
+    @property
+    def memory_bytes(self) -> int:
+        """内存中的数组字节数（磁盘数组不计）"""
+        return sum(segment.nbytes for segment in self._segments if not isinstance(segment, np.memmap))
+
+    def spill(self, directory: Optional[str] = None) -> int:
+        """
+        把已有的段写入磁盘数组，之后新分配的段也直接使用磁盘数组（对象回收时删除文件）
+
+        Args:
+            directory: 磁盘数组目录，None表示使用MEMORY_CONFIG的配置或系统临时目录
+
+        Returns:
+            int: 释放的内存字节数
+        """
+        if self.spilled:
+            return 0
+
+        self._spill_dir = tempfile.mkdtemp(prefix='pose_records_', dir=directory or MEMORY_CONFIG['spill_dir'])
+        weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        released = 0
+        for i, segment in enumerate(self._segments):
+            disk = np.memmap(os.path.join(self._spill_dir, f"segment_{i}.dat"), dtype=np.float64,
+                             mode='w+', shape=segment.shape)
+            disk[:] = segment
+            self._segments[i] = disk
+            released += segment.nbytes
+        return released
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        获取一个字段的全部值
+
+        Args:
+            name: 字段名
+
+        Returns:
+            np.ndarray: 长度为帧数的float64数组
+        """
+        if not self._segments:
+            return np.zeros(0, dtype=np.float64)
+        index = self._columns[name]
+        return np.concatenate([segment[:, index] for segment in self._segments])[:self._length]
+
+    def _to_record(self, row: np.ndarray) -> Dict[str, Any]:
+        return {name: int(row[i]) if name in INTEGER_FIELDS else float(row[i])
+                for i, name in enumerate(self.fields)}
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('FrameRecords index out of range')
+        return self._to_record(self._segments[index // self.segment_frames][index % self.segment_frames])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for start, segment in zip(range(0, self._length, self.segment_frames), self._segments):
+            for row in segment[:min(self.segment_frames, self._length - start)]:
+                yield self._to_record(row)
+
+    def tolist(self) -> List[Dict[str, Any]]:
+        """转换为dict列表（JSON序列化时使用）"""
+        return list(self)
+
+
+class MemoryBudget:
+    """
+    单个分析任务的内存预算类
+    任务内存 = 本任务登记的逐帧数据和标注帧缓存 + 其余进程内存增量按正在运行的任务数的分摊，
+    同一进程内并发的任务不会因为其他任务的缓存超出预算；只有一个任务时即进程常驻内存相对任务开始时的增量
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None):
+        """
+        初始化预算（首次采样时登记为正在运行的任务）
+
+        Args:
+            budget_mb: 预算（MB），None表示使用MEMORY_CONFIG的配置，0表示不限制
+        """
+        self.budget_mb = MEMORY_CONFIG['job_budget_mb'] if budget_mb is None else budget_mb
+        self.baseline_mb = get_current_rss_mb()
+        self.peak_mb = 0.0
+        self.estimated_mb: Optional[float] = None
+        self.spilled = False
+        self._records: List[FrameRecords] = []
+        self._frame_buffers: List[List[np.ndarray]] = []
+        self._frames_since_sample = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否限制内存（平台无法获取进程内存时不限制）"""
+        return self.budget_mb > 0 and self.baseline_mb is not None
+
+    def check_estimate(self, estimated_mb: float, description: str = '分析任务') -> None:
+        """
+        检查估算的内存是否超出预算
+
+        Args:
+            estimated_mb: 估算内存（MB）
+            description: 错误信息中的任务描述
+
+        Raises:
+            MemoryBudgetExceeded: 超出预算
+        """
+        self.estimated_mb = round(estimated_mb, 1)
+        if self.budget_mb > 0 and estimated_mb > self.budget_mb:
+            metrics.ANALYSIS_MEMORY_REFUSED.inc(phase='estimate')
+            raise MemoryBudgetExceeded(
+                f"{description}预计需要约{estimated_mb:.0f}MB内存，超出单任务内存预算{self.budget_mb:.0f}MB，"
+                f"请缩短分析时间段或降低视频分辨率后重试"
+            )
+
+    def track(self, records: FrameRecords) -> FrameRecords:
+        """
+        登记逐帧记录，超过溢出阈值时一并写入磁盘
+
+        Args:
+            records: 逐帧记录
+
+        Returns:
+            FrameRecords: 同一记录（已触发溢出时直接使用磁盘数组）
+        """
+        self._records.append(records)
+        if self.spilled:
+            records.spill()
+        return records
+
+    def track_frames(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        登记缓存的标注帧列表（计入本任务的内存）
+
+        Args:
+            frames: 标注帧列表（同一视频的帧尺寸相同）
+
+        Returns:
+            List[np.ndarray]: 同一列表
+        """
+        self._frame_buffers.append(frames)
+        return frames
+
+    def own_mb(self) -> float:
+        """本任务登记的逐帧数据和标注帧缓存占用的内存（MB）"""
+        total = sum(records.memory_bytes for records in self._records)
+        total += sum(len(frames) * frames[0].nbytes for frames in self._frame_buffers if frames)
+        return total / MB
+
+    def close(self) -> None:
+        """任务结束，不再参与分摊"""
+        with _active_lock:
+            _active_budgets.discard(self)
+
+    def _used_mb(self) -> float:
+        """
+        本任务的内存占用（MB）
+
+        进程内存增量从最早开始的运行中任务算起，减去各任务登记的缓存后，余下部分（模型推理、解码等）
+        由运行中的任务平均分摊
+        """
+        with _active_lock:
+            _active_budgets.add(self)
+            budgets = [budget for budget in _active_budgets if budget.baseline_mb is not None]
+        baseline_mb = min(budget.baseline_mb for budget in budgets)
+        owned = {id(budget): budget.own_mb() for budget in budgets}
+        shared_mb = max(0.0, (get_current_rss_mb() or 0.0) - baseline_mb - sum(owned.values()))
+        return owned[id(self)] + shared_mb / len(budgets)
+
+    def spill(self) -> None:
+        """把已登记的逐帧记录写入磁盘数组"""
+        self.spilled = True
+        released = sum(records.spill() for records in self._records)
+        logger.warning("分析任务内存超过预算的%d%%，逐帧数据改为写入磁盘（释放%.1fMB）",
+                       MEMORY_CONFIG['spill_ratio'] * 100, released / MB)
+
+    def check(self) -> None:
+        """每处理一帧调用一次，按MEMORY_CONFIG['check_interval']的间隔采样内存"""
+        self._frames_since_sample += 1
+        if self._frames_since_sample >= MEMORY_CONFIG['check_interval']:
+            self.sample()
+
+    def sample(self, enforce: bool = True) -> Optional[float]:
+        """
+        采样当前任务内存并更新峰值，超过溢出阈值时溢出到磁盘
+
+        Args:
+            enforce: 超出预算时是否抛出异常（工作已完成时只记录峰值）
+
+        Returns:
+            Optional[float]: 当前任务内存（MB），未启用时返回None
+
+        Raises:
+            MemoryBudgetExceeded: 超出预算
+        """
+        self._frames_since_sample = 0
+        if not self.enabled:
+            return None
+
+        used_mb = self._used_mb()
+        self.peak_mb = max(self.peak_mb, used_mb)
+        if not self.spilled and used_mb > self.budget_mb * MEMORY_CONFIG['spill_ratio']:
+            self.spill()
+        if enforce and used_mb > self.budget_mb:
+            metrics.ANALYSIS_MEMORY_REFUSED.inc(phase='running')
+            raise MemoryBudgetExceeded(
+                f"分析任务内存占用{used_mb:.0f}MB，超出单任务内存预算{self.budget_mb:.0f}MB，已停止分析，"
+                f"请缩短分析时间段或降低视频分辨率后重试"
+            )
+        return used_mb
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        内存使用汇总
+
+        Returns:
+            Dict[str, Any]: 预算、估算值、任务开始时的进程内存、任务内存峰值和是否溢出到磁盘
+        """
+        return {
+            'budget_mb': self.budget_mb if self.budget_mb > 0 else None,
+            'estimated_mb': self.estimated_mb,
+            'baseline_rss_mb': round(self.baseline_mb, 1) if self.baseline_mb is not None else None,
+            'peak_mb': round(self.peak_mb, 1) if self.enabled else None,
+            'spilled': self.spilled
+        }
+
+
+def get_video_dimensions(video_path: str) -> Tuple[int, int, int, float]:
+    """
+    获取视频的宽、高、帧数和帧率（优先读取上传时生成的视频索引）
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        Tuple[int, int, int, float]: (宽, 高, 帧数, 帧率)
+    """
+    video_index = load_video_index(video_path)
+    if video_index:
+        metadata = video_index['metadata']
+        return metadata['width'], metadata['height'], metadata['frame_count'], metadata['fps']
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS))
+    finally:
+        cap.release()
+
+
+def estimate_job_mb(video_paths: Dict[str, str], timeline_data: Optional[Dict[str, Any]] = None,
+                    buffer_frames: bool = False) -> float:
+    """
+    估算分析任务需要的内存
+
+    各角度依次分析：帧缓冲只同时存在一个角度的，逐帧数据（及缓存的标注帧）在任务结束前一直保留
+
+    Args:
+        video_paths: 视频文件路径字典 {'front': path, ...}
+        timeline_data: 时间轴数据字典 {'front': {'start': 0, 'end': 10}, ...}
+        buffer_frames: 是否在内存中缓存全部标注帧
+
+    Returns:
+        float: 估算内存（MB）
+    """
+    transient_mb, retained_mb = 0.0, 0.0
+    for angle, video_path in video_paths.items():
+        if not video_path or not os.path.exists(video_path):
+            continue
+
+        width, height, frame_count, fps = get_video_dimensions(video_path)
+        timeline = (timeline_data or {}).get(angle)
+        if timeline and fps > 0:
+            start_frame = int(timeline.get('start', 0) * fps)
+            end_frame = int(timeline.get('end', frame_count / fps) * fps)
+            frame_count = min(frame_count, max(0, end_frame - start_frame))
+
+        frame_mb = width * height * 3 / MB
+        transient_mb = max(transient_mb, frame_mb * FRAME_BUFFERS)
+        retained_mb += frame_count * MEMORY_CONFIG['per_frame_bytes'] / MB
+        if buffer_frames:
+            retained_mb += frame_count * frame_mb
+
+    return MEMORY_CONFIG['fixed_overhead_mb'] + transient_mb + retained_mb
+
+
+def check_job_memory(video_paths: Dict[str, str], timeline_data: Optional[Dict[str, Any]] = None) -> float:
+    """
+    提交分析前检查估算内存是否超出单任务预算
+
+    Args:
+        video_paths: 视频文件路径字典
+        timeline_data: 时间轴数据字典
+
+    Returns:
+        float: 估算内存（MB）
+
+    Raises:
+        MemoryBudgetExceeded: 超出预算
+    """
+    estimated_mb = estimate_job_mb(video_paths, timeline_data)
+    MemoryBudget().check_estimate(estimated_mb)
+    return estimated_mb
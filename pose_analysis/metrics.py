@@ -0,0 +1,291 @@
+"""
+运行指标模块
+进程内的计数器、仪表和直方图，按Prometheus文本格式输出，供 /metrics 接口抓取
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .profiling import get_current_rss_mb
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...],
+                   extra: Optional[Dict[str, str]] = None) -> str:
+    """生成标签字符串，例如 {route="/metrics",method="GET"}"""
+    pairs = list(zip(label_names, label_values)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    """格式化数值（整数不带小数点）"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        """
+        初始化指标
+
+        Args:
+            name: 指标名称
+            documentation: 指标说明
+            label_names: 标签名称
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """按标签名称顺序生成键"""
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        """输出样本行"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """输出Prometheus文本格式"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """增加计数"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """获取当前值"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                    for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """可增可减的仪表，可设置为抓取时计算"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        """设置数值"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """增加数值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        """减少数值"""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        """获取当前值"""
+        if self._function is not None:
+            return self._function() or 0
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def set_function(self, function: Callable[[], Optional[float]]) -> None:
+        """设置抓取时计算数值的函数（仅用于无标签的指标）"""
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [f"{self.name} {_format_value(value)}"]
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                    for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """分桶直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: Dict[Tuple[str, ...], Dict[str, object]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """记录一次观测值"""
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, entry in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry['counts']):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, {'le': _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(entry['sum'])}")
+                lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """注册指标，同名指标已存在时返回已有指标"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """输出全部指标的Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _current_rss_bytes() -> Optional[float]:
+    """当前进程常驻内存（字节），无/proc时退回内存峰值"""
+    rss = get_current_rss_mb()
+    return None if rss is None else rss * 1024 * 1024
+
+
+# 分析任务
+ANALYSIS_JOBS = REGISTRY.register(Counter(
+    'pose_analysis_jobs_total', '分析任务数（按状态: queued/completed/failed/cancelled）', ['status']))
+ANALYSIS_JOBS_RUNNING = REGISTRY.register(Gauge(
+    'pose_analysis_jobs_running', '正在运行的分析任务数'))
+ANALYSIS_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'pose_analysis_stage_seconds', '分析任务各阶段耗时（秒，每个任务每阶段一次观测）', ['stage']))
+ANALYSIS_FRAMES = REGISTRY.register(Counter(
+    'pose_analysis_frames_total', '已处理的视频帧数'))
+ANALYSIS_FPS = REGISTRY.register(Histogram(
+    'pose_analysis_frames_per_second', '分析任务的处理帧率', buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 240)))
+ANALYSIS_PEAK_RSS = REGISTRY.register(Gauge(
+    'pose_analysis_worker_peak_rss_bytes', '最近一次分析任务结束时的进程内存峰值（字节）'))
+ANALYSIS_JOB_MEMORY = REGISTRY.register(Histogram(
+    'pose_analysis_job_memory_megabytes', '分析任务占用内存峰值（MB，相对任务开始时的进程内存）',
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)))
+ANALYSIS_MEMORY_SPILLS = REGISTRY.register(Counter(
+    'pose_analysis_memory_spills_total', '逐帧数据因超出内存预算改为写入磁盘的任务数'))
+ANALYSIS_MEMORY_REFUSED = REGISTRY.register(Counter(
+    'pose_analysis_memory_refused_total', '因超出内存预算被拒绝或终止的分析任务数（按阶段: estimate/running）',
+    ['phase']))
+
+# 模型
+MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    'pose_model_load_seconds', '姿态模型加载耗时（秒）', buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)))
+MODEL_LOADED = REGISTRY.register(Gauge(
+    'pose_model_loaded', '本进程是否已成功加载过姿态模型'))
+MODEL_WARM = REGISTRY.register(Gauge(
+    'pose_model_warm', '本进程是否已完成过至少一次推理'))
+
+# 推理工作进程池
+INFERENCE_WORKERS = REGISTRY.register(Gauge(
+    'pose_inference_workers_alive', '存活的推理工作进程数'))
+INFERENCE_WORKER_RESTARTS = REGISTRY.register(Counter(
+    'pose_inference_worker_restarts_total', '推理工作进程异常退出或超时后的重启次数'))
+INFERENCE_SECONDS = REGISTRY.register(Histogram(
+    'pose_inference_roundtrip_seconds', '经推理进程池的单帧推理往返耗时（秒）',
+    buckets=(0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)))
+
+# 跨任务动态批处理
+INFERENCE_BATCH_SIZE = REGISTRY.register(Histogram(
+    'pose_inference_batch_size', '动态批处理每次推理的帧数', buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)))
+INFERENCE_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'pose_inference_queue_wait_seconds', '帧在批处理队列中等待组批的时间（秒）',
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5)))
+
+# 上传
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    'pose_upload_bytes_total', '上传视频的总字节数'))
+UPLOAD_SECONDS = REGISTRY.register(Histogram(
+    'pose_upload_seconds', '上传请求的处理耗时（秒）'))
+
+# HTTP请求
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'pose_http_request_seconds', 'HTTP请求耗时（秒）', ['route', 'method', 'status']))
+
+# 进程内存
+PROCESS_RSS = REGISTRY.register(Gauge(
+    'pose_process_resident_memory_bytes', '进程当前常驻内存（字节）'))
+PROCESS_RSS.set_function(_current_rss_bytes)
+
+
+def record_analysis_performance(performance: Dict[str, object]) -> None:
+    """
+    记录一次分析任务的性能汇总（StageTimer.summary()的结果）
+
+    Args:
+        performance: 性能汇总
+    """
+    for stage, values in (performance.get('stages') or {}).items():
+        ANALYSIS_STAGE_SECONDS.observe(values['seconds'], stage=stage)
+    frames = (performance.get('counters') or {}).get('frames', 0)
+    if frames:
+        ANALYSIS_FRAMES.inc(frames)
+    if performance.get('fps'):
+        ANALYSIS_FPS.observe(performance['fps'])
+    if performance.get('peak_rss_mb') is not None:
+        ANALYSIS_PEAK_RSS.set(performance['peak_rss_mb'] * 1024 * 1024)
+    memory = performance.get('memory') or {}
+    if memory.get('peak_mb') is not None:
+        ANALYSIS_JOB_MEMORY.observe(memory['peak_mb'])
+    if memory.get('spilled'):
+        ANALYSIS_MEMORY_SPILLS.inc()
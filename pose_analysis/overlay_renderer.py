@@ -0,0 +1,353 @@
+"""
+标注渲染模块
+根据分析时保存的关键点轨迹绘制骨架和角度标注：服务端按需生成标注视频（不依赖模型），
+或输出紧凑的轨迹数据由页面在原视频上叠加绘制
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple, Any
+
+import cv2
+import numpy as np
+
+from .config import VIDEO_OUTPUT_CONFIG, KEYPOINTS_CONFIG
+from .keypoint_store import KeypointStore
+from .video_ingest import load_video_index, seek_to_frame
+from .video_writer import AnnotatedVideoWriter, get_track_path, resolve_output_format
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# COCO骨架连接（关键点索引对）
+SKELETON = [
+    (15, 13), (13, 11), (16, 14), (14, 12), (11, 12),
+    (5, 11), (6, 12), (5, 6), (5, 7), (6, 8), (7, 9), (8, 10),
+    (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6)
+]
+
+# 临床相关肢体：双肩、上臂、前臂、躯干两侧和髋部
+CLINICAL_SKELETON = [
+    (5, 6), (5, 7), (7, 9), (6, 8), (8, 10), (5, 11), (6, 12), (11, 12)
+]
+CLINICAL_KEYPOINTS = [5, 6, 7, 8, 9, 10, 11, 12]
+
+_render_locks: Dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+
+class OverlayRenderer:
+    """骨架与角度标注绘制类"""
+
+    def __init__(self, kpt_conf: float = 0.5, style: Optional[str] = None):
+        """
+        初始化绘制器
+
+        Args:
+            kpt_conf: 关键点置信度阈值，低于该值的关键点不绘制
+            style: 'limbs' 或 'full'，None表示使用VIDEO_OUTPUT_CONFIG配置
+        """
+        if style is None:
+            style = VIDEO_OUTPUT_CONFIG['overlay_style']
+        self.kpt_conf = kpt_conf
+        if style == 'full':
+            self.skeleton = SKELETON
+            self.keypoint_indices = list(range(len(KEYPOINTS_CONFIG)))
+        else:
+            self.skeleton = CLINICAL_SKELETON
+            self.keypoint_indices = CLINICAL_KEYPOINTS
+
+    def draw_skeleton(self, frame: np.ndarray, keypoints: Any,
+                      kpt_conf: Optional[float] = None) -> None:
+        """
+        在图像上原地绘制人体骨架
+
+        Args:
+            frame: 输入图像
+            keypoints: 关键点 (N, 17, 3)，np.ndarray或torch.Tensor
+            kpt_conf: 关键点置信度阈值，None表示使用初始化时的阈值
+        """
+        if kpt_conf is None:
+            kpt_conf = self.kpt_conf
+        if hasattr(keypoints, 'cpu'):
+            keypoints = keypoints.cpu().numpy()
+
+        for k in keypoints:
+            for a, b in self.skeleton:
+                if k[a][2] < kpt_conf or k[b][2] < kpt_conf:
+                    continue
+                cv2.line(frame, (int(k[a][0]), int(k[a][1])), (int(k[b][0]), int(k[b][1])),
+                         (255, 153, 51), 2, cv2.LINE_AA)
+            for i in self.keypoint_indices:
+                x, y, c = k[i]
+                if c >= kpt_conf:
+                    cv2.circle(frame, (int(x), int(y)), 4, (0, 255, 0), -1, cv2.LINE_AA)
+
+    def draw_label(self, frame: np.ndarray, value: float, position: np.ndarray,
+                   color: Tuple[int, int, int] = (104, 31, 17),
+                   txt_color: Tuple[int, int, int] = (255, 255, 255),
+                   sf: float = 1, tf: int = 1) -> None:
+        """
+        在图像上绘制数值标注（与PoseDetector.plot_angle样式一致）
+
+        Args:
+            frame: 输入图像
+            value: 数值
+            position: 标注位置 [x, y]
+            color: 背景颜色
+            txt_color: 文字颜色
+            sf: 文字缩放因子
+            tf: 文字粗细
+        """
+        text = f" {value:.2f}"
+
+        (text_width, text_height), _ = cv2.getTextSize(text, 0, sf, tf)
+        text_position = (int(position[0]), int(position[1]))
+        background_position = (text_position[0], text_position[1] - text_height - 5)
+        background_size = (text_width + 2 * 5, text_height + 2 * 5 + (tf * 2))
+
+        cv2.rectangle(
+            frame,
+            background_position,
+            (background_position[0] + background_size[0], background_position[1] + background_size[1]),
+            color,
+            -1,
+        )
+        cv2.putText(frame, text, text_position, 0, sf, txt_color, tf)
+
+    def draw_metrics(self, frame: np.ndarray, angle: str, keypoints: np.ndarray,
+                     values: np.ndarray) -> None:
+        """
+        绘制该角度视频的指标标注：正面/侧面为肩关节角度，背面为腕高度比例和躯干基线
+
+        Args:
+            frame: 输入图像
+            angle: 视频角度 (front/side/back)
+            keypoints: 第一个人体的关键点 (17, 3)
+            values: 左右两侧的指标值 [left, right]
+        """
+        if np.isnan(values).any():
+            return
+
+        if angle in ('front', 'side'):
+            self.draw_label(frame, values[0], keypoints[KEYPOINTS_CONFIG['left_shoulder']])
+            self.draw_label(frame, values[1], keypoints[KEYPOINTS_CONFIG['right_shoulder']])
+        elif angle == 'back':
+            shoulder_center = (keypoints[KEYPOINTS_CONFIG['left_shoulder']] +
+                               keypoints[KEYPOINTS_CONFIG['right_shoulder']]) / 2
+            hip_center = (keypoints[KEYPOINTS_CONFIG['left_hip']] +
+                          keypoints[KEYPOINTS_CONFIG['right_hip']]) / 2
+            cv2.line(frame,
+                     (int(shoulder_center[0]), int(shoulder_center[1])),
+                     (int(hip_center[0]), int(hip_center[1])),
+                     (0, 0, 255), 2)
+            self.draw_label(frame, values[0], keypoints[KEYPOINTS_CONFIG['left_wrist']])
+            self.draw_label(frame, values[1], keypoints[KEYPOINTS_CONFIG['right_wrist']])
+
+    def render_frame(self, frame: np.ndarray, angle: str, keypoints: np.ndarray,
+                     values: Optional[np.ndarray] = None) -> None:
+        """
+        在单帧上原地绘制骨架和指标标注
+
+        Args:
+            frame: 输入图像
+            angle: 视频角度
+            keypoints: 关键点 (N, 17, 3)
+            values: 左右两侧的指标值，None表示不绘制指标
+        """
+        self.draw_skeleton(frame, keypoints)
+        if values is not None and len(keypoints) > 0:
+            self.draw_metrics(frame, angle, keypoints[0], values)
+
+
+def _get_render_lock(output_path: str) -> threading.Lock:
+    """获取输出文件对应的渲染锁，避免同一视频被重复渲染"""
+    with _render_locks_guard:
+        return _render_locks.setdefault(os.path.abspath(output_path), threading.Lock())
+
+
+def get_rendered_video_path(output_path: str) -> str:
+    """
+    获取实际渲染输出的视频路径（扩展名由输出格式决定）
+
+    Args:
+        output_path: 标注视频路径
+
+    Returns:
+        str: 实际输出路径
+    """
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.{resolve_output_format()}"
+
+
+def render_annotated_video(output_path: str, stop_check_func=None) -> Dict[str, Optional[str]]:
+    """
+    根据关键点轨迹渲染标注视频，已渲染时直接返回
+
+    Args:
+        output_path: 标注视频路径，轨迹文件为同名的 _track.npz
+        stop_check_func: 停止检查函数，返回True时放弃渲染
+
+    Returns:
+        Dict[str, Optional[str]]: {'video': 视频路径, 'preview': 预览视频路径}，无法渲染时路径为None
+    """
+    output_path = get_rendered_video_path(output_path)
+    track_path = get_track_path(output_path)
+
+    with _get_render_lock(output_path):
+        if os.path.exists(output_path):
+            return {'video': output_path, 'preview': None}
+
+        track = KeypointStore.load(track_path)
+        if track is None:
+            return {'video': None, 'preview': None}
+
+        video_path = track.meta.get('video_path')
+        if not video_path or not track.is_valid_for(video_path):
+            logger.warning(f"原始视频已变更，无法渲染标注视频: {output_path}")
+            return {'video': None, 'preview': None}
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return {'video': None, 'preview': None}
+
+        video_index = load_video_index(video_path)
+        seek_to_frame(cap, track.meta.get('start_frame', 0), video_index['keyframes'] if video_index else None)
+
+        renderer = OverlayRenderer()
+        angle = track.meta.get('angle')
+        metrics = track.extras.get('metrics')
+        writer = AnnotatedVideoWriter(output_path, track.meta.get('fps', 0),
+                                      max_height=track.meta.get('video_max_height'))
+
+        try:
+            for frame_index in range(track.frame_count):
+                if stop_check_func and stop_check_func():
+                    writer.failed = True
+                    break
+
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                keypoints = track.keypoints[track.frame_slice(frame_index)]
+                values = metrics[frame_index] if metrics is not None and frame_index < len(metrics) else None
+                renderer.render_frame(frame, angle, keypoints, values)
+                writer.write(frame)
+        except Exception:
+            writer.failed = True
+            raise
+        finally:
+            cap.release()
+            outputs = writer.close()
+
+        return outputs
+
+
+def ensure_annotated_video(file_path: str) -> bool:
+    """
+    确保请求的标注视频（或其预览版本）已渲染，用于首次请求时按需生成
+
+    Args:
+        file_path: 请求的文件路径
+
+    Returns:
+        bool: 文件是否存在
+    """
+    if os.path.exists(file_path):
+        return True
+
+    base, ext = os.path.splitext(file_path)
+    preview_suffix = VIDEO_OUTPUT_CONFIG['preview_suffix']
+    if base.endswith(preview_suffix):
+        base = base[:-len(preview_suffix)]
+
+    output_path = base + ext
+    if VIDEO_OUTPUT_CONFIG['mode'] == 'none' or not os.path.exists(get_track_path(output_path)):
+        return False
+
+    render_annotated_video(output_path)
+    return os.path.exists(file_path)
+
+
+def render_pending_videos(output_paths: List[str], nice: Optional[int] = None,
+                          stop_check_func=None) -> None:
+    """
+    依次渲染尚未生成的标注视频（在后台线程中调用）
+
+    Args:
+        output_paths: 标注视频路径列表
+        nice: 渲染线程的调度优先级，None表示不调整
+        stop_check_func: 停止检查函数
+    """
+    if nice is not None:
+        try:
+            # Linux下setpriority作用于单个线程
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+        except (AttributeError, OSError):
+            pass
+
+    for output_path in output_paths:
+        if stop_check_func and stop_check_func():
+            return
+        try:
+            render_annotated_video(output_path, stop_check_func)
+        except Exception as e:
+            logger.error(f"后台渲染标注视频失败 {output_path}: {str(e)}")
+
+
+def build_track_payload(track_path: str, kpt_conf: float = 0.5) -> Optional[Dict[str, Any]]:
+    """
+    生成客户端叠加绘制用的轨迹数据（与原视频时间对齐，差分编码）
+
+    每帧只保留第一个人体的关键点，坐标按track_scale量化为整数、置信度量化为0-100，
+    相对上一个有检测结果的帧做差分；没有检测结果的帧为null。第i帧对应原视频时间
+    (start_frame + i) / fps 秒。
+
+    Args:
+        track_path: 轨迹文件路径
+        kpt_conf: 客户端绘制时使用的关键点置信度阈值
+
+    Returns:
+        Optional[Dict[str, Any]]: 轨迹数据，文件不存在时返回None
+    """
+    track = KeypointStore.load(track_path)
+    if track is None:
+        return None
+
+    scale = VIDEO_OUTPUT_CONFIG['track_scale']
+    frames: List[Optional[List[int]]] = []
+    previous = None
+    for frame_index in range(track.frame_count):
+        keypoints = track.keypoints[track.frame_slice(frame_index)]
+        if len(keypoints) == 0:
+            frames.append(None)
+            continue
+
+        quantized = np.empty((len(keypoints[0]), 3), dtype=np.int64)
+        quantized[:, :2] = np.round(keypoints[0][:, :2] * scale)
+        quantized[:, 2] = np.round(keypoints[0][:, 2] * 100)
+        quantized = quantized.reshape(-1)
+        frames.append((quantized if previous is None else quantized - previous).tolist())
+        previous = quantized
+
+    metrics = track.extras.get('metrics')
+    metric_values = []
+    if metrics is not None:
+        for left, right in metrics:
+            metric_values.append(None if np.isnan(left) or np.isnan(right)
+                                 else [round(float(left), 2), round(float(right), 2)])
+
+    return {
+        'angle': track.meta.get('angle'),
+        'fps': track.meta.get('fps'),
+        'start_frame': track.meta.get('start_frame', 0),
+        'frame_count': track.frame_count,
+        'width': track.meta.get('width'),
+        'height': track.meta.get('height'),
+        'scale': scale,
+        'kpt_conf': kpt_conf,
+        'skeleton': OverlayRenderer().skeleton,
+        'keypoints': frames,
+        'metrics': metric_values
+    }
@@ -9,6 +9,25 @@ import torch
 from ultralytics import YOLO
 from typing import Tuple, List, Optional, Dict, Any
 import os
+import time
+from types import SimpleNamespace
+from .overlay_renderer import OverlayRenderer
+from .resources import thread_budget
+from .config import MODEL_CONFIG, INFERENCE_POOL_CONFIG, BATCHING_CONFIG, CASCADE_CONFIG
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class DetectionResult:
+    """已提取为numpy数组的单帧检测结果（keypoints.data与ultralytics Results一致），供不直接持有模型的检测器返回"""
+    
+    def __init__(self, keypoints: np.ndarray, boxes: np.ndarray, scores: np.ndarray,
+                 source: Optional[str] = None):
+        self.keypoints = SimpleNamespace(data=keypoints)
+        self.boxes_xyxy = boxes
+        self.scores = scores
+        self.source = source  # 产生该帧结果的模型文件名，None表示检测器自身的模型
 
 class PoseDetector:
     """姿态检测器类"""
@@ -22,6 +41,8 @@ class PoseDetector:
         """
         self.model_path = model_path
         self.model = None
+        self.imgsz = None  # 推理输入尺寸，None表示模型默认
+        self.max_det = None  # 每帧最多保留的检测数，None表示模型默认
         self.keypoints_dict = {
             'Nose': 0,
             'Left Eye': 1,
@@ -54,6 +75,10 @@ class PoseDetector:
             self.keypoints_dict['Right Shoulder']
         ]
         
+        # 标注绘制器（只绘制临床相关肢体，原地绘制）
+        self.renderer = OverlayRenderer()
+        self.skeleton = self.renderer.skeleton
+        
         self.load_model()
     
     def load_model(self) -> bool:
@@ -67,22 +92,65 @@ class PoseDetector:
             if not os.path.exists(self.model_path):
                 raise FileNotFoundError(f"模型文件不存在: {self.model_path}")
             
+            # 首次加载模型前设置torch和OpenCV的线程数
+            thread_budget.configure_process()
+            
+            start = time.perf_counter()
             self.model = YOLO(self.model_path)
             
             # 检查CUDA可用性
             import torch
             if torch.cuda.is_available():
                 self.model = self.model.to('cuda')
-                print(f"模型加载成功，运行在GPU: {torch.cuda.get_device_name(0)}")
+                logger.info(f"模型加载成功，运行在GPU: {torch.cuda.get_device_name(0)}")
             else:
-                print("模型加载成功，运行在CPU")
+                logger.info("模型加载成功，运行在CPU")
             
+            metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - start)
+            metrics.MODEL_LOADED.set(1)
             return True
             
         except Exception as e:
-            print(f"模型加载失败: {str(e)}")
+            logger.error(f"模型加载失败: {str(e)}")
             return False
     
+    def get_backend_info(self) -> Dict[str, Any]:
+        """
+        获取模型和推理后端信息（用于性能记录）
+        
+        Returns:
+            Dict[str, Any]: 模型路径、设备、torch和ultralytics版本
+        """
+        import ultralytics
+        
+        device = 'cpu'
+        if torch.cuda.is_available():
+            device = f"cuda ({torch.cuda.get_device_name(0)})"
+        
+        return {
+            'model_path': self.model_path,
+            'device': device,
+            'torch_version': torch.__version__,
+            'ultralytics_version': ultralytics.__version__,
+            'torch_threads': torch.get_num_threads()
+        }
+    
+    def _get_point(self, k: Any, name: str) -> np.ndarray:
+        """
+        获取单个人体的指定关键点坐标
+        
+        Args:
+            k: 单个人体的关键点数据（torch.Tensor或np.ndarray，形状为(17, 3)）
+            name: 关键点名称
+            
+        Returns:
+            np.ndarray: 关键点 [x, y, conf]
+        """
+        point = k[self.keypoints_dict[name]]
+        if hasattr(point, 'cpu'):
+            point = point.cpu().numpy()
+        return np.asarray(point)
+    
     def estimate_pose_angle(self, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
         """
         计算三点之间的角度
@@ -119,24 +187,7 @@ class PoseDetector:
             sf: 文字缩放因子
             tf: 文字粗细
         """
-        angle_text = f" {angle:.2f}"
-        
-        (angle_text_width, angle_text_height), _ = cv2.getTextSize(angle_text, 0, sf, tf)
-        angle_text_position = (int(center_kpt[0]), int(center_kpt[1]))
-        angle_background_position = (angle_text_position[0], angle_text_position[1] - angle_text_height - 5)
-        angle_background_size = (angle_text_width + 2 * 5, angle_text_height + 2 * 5 + (tf * 2))
-        
-        cv2.rectangle(
-            frame,
-            angle_background_position,
-            (
-                angle_background_position[0] + angle_background_size[0],
-                angle_background_position[1] + angle_background_size[1],
-            ),
-            color,
-            -1,
-        )
-        cv2.putText(frame, angle_text, angle_text_position, 0, sf, txt_color, tf)
+        self.renderer.draw_label(frame, angle, center_kpt, color, txt_color, sf, tf)
     
     def calculate_front_shoulder_angle(self, frame: np.ndarray, keypoints: torch.Tensor, 
                                      show_angle: bool = False) -> Tuple[float, float]:
@@ -153,15 +204,15 @@ class PoseDetector:
         """
         for k in keypoints:
             # 左肩角度计算
-            left_elbow = k[self.keypoints_dict['Left Elbow']].cpu().numpy()
-            left_shoulder = k[self.keypoints_dict['Left Shoulder']].cpu().numpy()
-            left_hip = k[self.keypoints_dict['Left Hip']].cpu().numpy()
+            left_elbow = self._get_point(k, 'Left Elbow')
+            left_shoulder = self._get_point(k, 'Left Shoulder')
+            left_hip = self._get_point(k, 'Left Hip')
             left_angle = self.estimate_pose_angle(left_elbow, left_shoulder, left_hip)
             
             # 右肩角度计算
-            right_elbow = k[self.keypoints_dict['Right Elbow']].cpu().numpy()
-            right_shoulder = k[self.keypoints_dict['Right Shoulder']].cpu().numpy()
-            right_hip = k[self.keypoints_dict['Right Hip']].cpu().numpy()
+            right_elbow = self._get_point(k, 'Right Elbow')
+            right_shoulder = self._get_point(k, 'Right Shoulder')
+            right_hip = self._get_point(k, 'Right Hip')
             right_angle = self.estimate_pose_angle(right_elbow, right_shoulder, right_hip)
             
             if show_angle:
@@ -189,15 +240,15 @@ class PoseDetector:
         """
         for k in keypoints:
             # 左肩前屈角度计算：髋关节-肩关节-肘关节
-            left_hip = k[self.keypoints_dict['Left Hip']].cpu().numpy()
-            left_shoulder = k[self.keypoints_dict['Left Shoulder']].cpu().numpy()
-            left_elbow = k[self.keypoints_dict['Left Elbow']].cpu().numpy()
+            left_hip = self._get_point(k, 'Left Hip')
+            left_shoulder = self._get_point(k, 'Left Shoulder')
+            left_elbow = self._get_point(k, 'Left Elbow')
             left_angle = self.estimate_pose_angle(left_hip, left_shoulder, left_elbow)
             
             # 右肩前屈角度计算：髋关节-肩关节-肘关节
-            right_hip = k[self.keypoints_dict['Right Hip']].cpu().numpy()
-            right_shoulder = k[self.keypoints_dict['Right Shoulder']].cpu().numpy()
-            right_elbow = k[self.keypoints_dict['Right Elbow']].cpu().numpy()
+            right_hip = self._get_point(k, 'Right Hip')
+            right_shoulder = self._get_point(k, 'Right Shoulder')
+            right_elbow = self._get_point(k, 'Right Elbow')
             right_angle = self.estimate_pose_angle(right_hip, right_shoulder, right_elbow)
             
             if show_angle:
@@ -222,12 +273,12 @@ class PoseDetector:
             Tuple[float, float]: 左腕高度百分比, 右腕高度百分比
         """
         for k in keypoints:
-            left_wrist = k[self.keypoints_dict['Left Wrist']].cpu().numpy()
-            right_wrist = k[self.keypoints_dict['Right Wrist']].cpu().numpy()
-            left_hip = k[self.keypoints_dict['Left Hip']].cpu().numpy()
-            right_hip = k[self.keypoints_dict['Right Hip']].cpu().numpy()
-            left_shoulder = k[self.keypoints_dict['Left Shoulder']].cpu().numpy()
-            right_shoulder = k[self.keypoints_dict['Right Shoulder']].cpu().numpy()
+            left_wrist = self._get_point(k, 'Left Wrist')
+            right_wrist = self._get_point(k, 'Right Wrist')
+            left_hip = self._get_point(k, 'Left Hip')
+            right_hip = self._get_point(k, 'Right Hip')
+            left_shoulder = self._get_point(k, 'Left Shoulder')
+            right_shoulder = self._get_point(k, 'Right Shoulder')
             
             hip_line_center = (left_hip + right_hip) / 2
             shoulder_line_center = (left_shoulder + right_shoulder) / 2
@@ -258,10 +309,33 @@ class PoseDetector:
         return 0.0, 0.0
     
     def detect_pose(self, frame: np.ndarray, conf: float = 0.25, 
-                   iou: float = 0.45, classes: List[int] = None) -> Tuple[np.ndarray, torch.Tensor]:
+                   iou: float = 0.45, classes: List[int] = None,
+                   annotate: bool = True) -> Tuple[np.ndarray, torch.Tensor]:
         """
         检测姿态关键点
         
+        Args:
+            frame: 输入图像（标注时原地绘制，不再分配新图像）
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+            annotate: 是否绘制骨架，不需要标注输出时跳过
+            
+        Returns:
+            Tuple[np.ndarray, torch.Tensor]: 标注后的图像（即输入图像）, 关键点数据
+        """
+        results = self.predict(frame, conf=conf, iou=iou, classes=classes)
+        keypoints = results[0].keypoints.data
+        if annotate:
+            self.renderer.draw_skeleton(frame, keypoints)
+        
+        return frame, keypoints
+    
+    def predict(self, frame: np.ndarray, conf: float = 0.25, 
+                iou: float = 0.45, classes: List[int] = None) -> Any:
+        """
+        运行模型推理，返回原始结果
+        
         Args:
             frame: 输入图像
             conf: 置信度阈值
@@ -269,7 +343,7 @@ class PoseDetector:
             classes: 检测类别
             
         Returns:
-            Tuple[np.ndarray, torch.Tensor]: 标注后的图像, 关键点数据
+            Any: ultralytics的Results列表
         """
         if self.model is None:
             raise RuntimeError("模型未加载")
@@ -277,8 +351,114 @@ class PoseDetector:
         if classes is None:
             classes = [0]  # 默认只检测人体
         
-        results = self.model(frame, conf=conf, iou=iou, classes=classes)
-        annotated_frame = results[0].plot()
-        keypoints = results[0].keypoints.data
+        # 并发任务数变化后按新的分配设置本线程的推理线程数
+        thread_budget.refresh()
+        options = {'imgsz': self.imgsz} if self.imgsz else {}
+        if self.max_det:
+            options['max_det'] = self.max_det
+        results = self.model(frame, conf=conf, iou=iou, classes=classes, verbose=MODEL_CONFIG['verbose'], **options)
+        metrics.MODEL_WARM.set(1)
+        return results
+    
+    def predict_batch(self, frames: List[np.ndarray], conf: float = 0.25,
+                      iou: float = 0.45, classes: List[int] = None) -> List[Any]:
+        """
+        一次前向推理处理多帧
+        
+        Args:
+            frames: 输入图像列表（尺寸可以不同）
+            conf: 置信度阈值
+            iou: IoU阈值
+            classes: 检测类别
+            
+        Returns:
+            List[Any]: 与frames一一对应的单帧结果
+        """
+        return list(self.predict(frames, conf=conf, iou=iou, classes=classes))
+    
+    def extract_detections(self, result: Any) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        从单帧推理结果中提取关键点、检测框和置信度
+        
+        Args:
+            result: 单帧的ultralytics Results对象或DetectionResult
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 关键点(N, 17, 3), 检测框(N, 4), 置信度(N,)
+        """
+        if isinstance(result, DetectionResult):
+            return result.keypoints.data, result.boxes_xyxy, result.scores
+        
+        if result.keypoints is None or result.boxes is None or len(result.boxes) == 0:
+            return (np.zeros((0, 17, 3), dtype=np.float32),
+                    np.zeros((0, 4), dtype=np.float32),
+                    np.zeros((0,), dtype=np.float32))
+        
+        keypoints = result.keypoints.data.cpu().numpy()
+        boxes = result.boxes.xyxy.cpu().numpy()
+        scores = result.boxes.conf.cpu().numpy()
+        return keypoints, boxes, scores
+    
+    def draw_keypoints(self, frame: np.ndarray, keypoints: np.ndarray, 
+                       kpt_conf: float = 0.5) -> None:
+        """
+        在图像上绘制人体骨架（用于复用已存储关键点时的标注）
+        
+        Args:
+            frame: 输入图像（原地绘制）
+            keypoints: 关键点 (N, 17, 3)
+            kpt_conf: 关键点置信度阈值，低于该值的关键点不绘制
+        """
+        self.renderer.draw_skeleton(frame, keypoints, kpt_conf)
+    
+    def reset_sequence(self) -> None:
+        """开始分析新的视频时调用，清除依赖前后帧的状态（本类无状态）"""
+    
+    def get_frame_source(self, result: Any) -> str:
+        """
+        获取产生单帧结果的模型
+        
+        Args:
+            result: 单帧的ultralytics Results对象或DetectionResult
+            
+        Returns:
+            str: 模型文件名
+        """
+        return getattr(result, 'source', None) or os.path.basename(self.model_path)
+
+def create_pose_detector(model_path: str = "model/yolov8s-pose.pt",
+                         use_pool: Optional[bool] = None,
+                         use_batching: Optional[bool] = None,
+                         use_cascade: Optional[bool] = None) -> PoseDetector:
+    """
+    按MODEL_CONFIG['detector']、CASCADE_CONFIG、BATCHING_CONFIG和INFERENCE_POOL_CONFIG创建姿态检测器
+    
+    Args:
+        model_path: YOLO模型文件路径
+        use_pool: 是否通过推理工作进程池推理，None表示使用INFERENCE_POOL_CONFIG的配置
+        use_batching: 是否通过进程内动态批处理服务推理，None表示使用BATCHING_CONFIG的配置
+        use_cascade: 是否先用小模型推理、必要时再用model_path的模型，None表示使用CASCADE_CONFIG的配置
         
-        return annotated_frame, keypoints
\ No newline at end of file
+    Returns:
+        PoseDetector: 姿态检测器（级联、批处理或进程池客户端，或'stub'时为不加载模型的桩检测器）
+    """
+    if use_cascade is None:
+        use_cascade = CASCADE_CONFIG['enabled'] and MODEL_CONFIG['detector'] != 'stub'
+    if use_cascade:
+        # 级联的两个模型各自按批处理或进程池配置推理
+        from .cascade import CascadePoseDetector
+        return CascadePoseDetector(model_path, use_pool=use_pool, use_batching=use_batching)
+    if use_batching is None:
+        use_batching = BATCHING_CONFIG['enabled']
+    if use_batching:
+        from .batching import BatchedPoseDetector
+        return BatchedPoseDetector(model_path)
+    if use_pool is None:
+        use_pool = INFERENCE_POOL_CONFIG['enabled']
+    if use_pool:
+        from .inference_pool import PooledPoseDetector
+        return PooledPoseDetector(model_path)
+    if MODEL_CONFIG['detector'] == 'stub':
+        from .stub_detector import StubPoseDetector
+        return StubPoseDetector(model_path)
+    return PoseDetector(model_path)
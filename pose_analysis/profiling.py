@@ -0,0 +1,191 @@
+"""
+性能分析模块
+记录分析任务各阶段耗时、处理帧数和内存峰值，可选cProfile/pyinstrument采样
+"""
+
+import os
+import io
+import sys
+import time
+import threading
+import pstats
+import cProfile
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_MODES = ('cprofile', 'pyinstrument')
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    获取当前进程的内存峰值（MB）
+
+    Returns:
+        Optional[float]: 内存峰值，平台不支持时返回None
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS单位为字节
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def get_current_rss_mb() -> Optional[float]:
+    """
+    获取当前进程的常驻内存（MB）
+
+    Returns:
+        Optional[float]: 常驻内存，无/proc时退回内存峰值，平台不支持时返回None
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return get_peak_rss_mb()
+
+
+class StageTimer:
+    """分阶段计时类（线程安全，同一阶段多次计时累加）"""
+
+    def __init__(self):
+        """初始化计时器"""
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.info: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        计时上下文
+
+        Args:
+            name: 阶段名称
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        """
+        累加阶段耗时
+
+        Args:
+            name: 阶段名称
+            seconds: 耗时（秒）
+            calls: 调用次数
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+
+    def count(self, name: str, value: float = 1) -> None:
+        """
+        累加计数（例如处理帧数）
+
+        Args:
+            name: 计数名称
+            value: 增加的值
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        生成耗时汇总
+
+        Returns:
+            Dict[str, Any]: 各阶段耗时、占比、计数、帧率和内存峰值
+        """
+        with self._lock:
+            total = time.perf_counter() - self.started_at
+            stages = {}
+            for name, stage in self.stages.items():
+                stages[name] = {
+                    'seconds': round(stage['seconds'], 4),
+                    'calls': stage['calls'],
+                    'share': round(stage['seconds'] / total, 4) if total > 0 else 0.0
+                }
+            counters = dict(self.counters)
+
+        frames = counters.get('frames', 0)
+        analysis_seconds = stages.get('analyze_video', {}).get('seconds', 0)
+        return {
+            'total_seconds': round(total, 4),
+            'stages': stages,
+            'counters': counters,
+            'fps': round(frames / analysis_seconds, 2) if analysis_seconds > 0 else None,
+            'peak_rss_mb': get_peak_rss_mb(),
+            **self.info
+        }
+
+
+class ProfileCapture:
+    """单个任务的函数级性能采样（cProfile或pyinstrument）"""
+
+    def __init__(self, mode: Optional[str], output_dir: str):
+        """
+        初始化采样
+
+        Args:
+            mode: 'cprofile'、'pyinstrument'，None表示不采样
+            output_dir: 采样结果输出目录
+        """
+        self.mode = mode if mode in PROFILE_MODES else None
+        self.output_dir = output_dir
+        self.output_path: Optional[str] = None
+        self._profiler = None
+
+    def __enter__(self) -> 'ProfileCapture':
+        if self.mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("未安装pyinstrument，改用cProfile采样")
+                self.mode = 'cprofile'
+            else:
+                self._profiler = Profiler()
+                self._profiler.start()
+                return self
+
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._profiler is None:
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.mode == 'pyinstrument':
+            self._profiler.stop()
+            self.output_path = os.path.join(self.output_dir, 'profile.html')
+            with open(self.output_path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            self.output_path = os.path.join(self.output_dir, 'profile.prof')
+            self._profiler.dump_stats(self.output_path)
+
+            # 同时输出按累计耗时排序的文本摘要，便于直接查看
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(50)
+            with open(os.path.join(self.output_dir, 'profile.txt'), 'w', encoding='utf-8') as f:
+                f.write(stream.getvalue())
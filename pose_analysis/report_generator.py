@@ -10,6 +10,9 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import datetime
 import os
 from typing import Dict, Any, Tuple
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 class ReportGenerator:
     """报告生成器类"""
@@ -384,7 +387,7 @@ class ReportGenerator:
         hdr_cells[1].text = report_data['result_report']['check_date']
         
         # 保存文档
-        print("报告已生成")
+        logger.info("报告已生成")
         # 文档名称，报告-姓名-当前信息
         time_str = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
         file_name = "report-" + report_data['base_info']['name'] + "-" + time_str + ".docx"
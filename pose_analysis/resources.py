@@ -0,0 +1,243 @@
+"""
+CPU线程预算模块
+检测本进程可用的核数（CPU亲和性和cgroup配额），按当前并发的分析任务数为每个任务分配
+OpenCV解码、torch推理和图表渲染线程，并统一设置torch和OpenCV的线程数，避免多个任务时线程超额订阅
+"""
+
+import os
+import json
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import cv2
+
+from .config import THREAD_CONFIG
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _read_cgroup_cpu_limit() -> Optional[float]:
+    """
+    读取cgroup的CPU配额（核数）
+
+    Returns:
+        Optional[float]: 配额对应的核数，未限制或无法读取时返回None
+    """
+    # cgroup v2: "max 100000" 或 "200000 100000"
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max' and int(period) > 0:
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read().strip())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read().strip())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def detect_available_cores() -> int:
+    """
+    检测本进程可用的核数：CPU亲和性掩码和cgroup配额中较小的一个
+
+    Returns:
+        int: 可用核数（至少为1）
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):  # 非Linux
+        cores = os.cpu_count() or 1
+
+    limit = _read_cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, int(limit)))
+    return max(1, cores)
+
+
+def get_available_threads() -> int:
+    """可分配的线程总数（THREAD_CONFIG['total_threads']优先，否则为检测到的可用核数）"""
+    return max(1, THREAD_CONFIG['total_threads'] or detect_available_cores())
+
+
+def load_tuning(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取线程调优结果
+
+    Args:
+        path: 调优结果路径，None表示THREAD_CONFIG['tuning_file']
+
+    Returns:
+        Optional[Dict[str, Any]]: 调优结果，不存在或无法解析时返回None
+    """
+    path = path or THREAD_CONFIG['tuning_file']
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("线程调优结果无法读取 %s: %s", path, e)
+        return None
+
+
+class ThreadBudget:
+    """单个分析任务的线程分配"""
+
+    def __init__(self, total: int, jobs: int, decode_share: float):
+        """
+        按并发任务数切分线程
+
+        Args:
+            total: 可分配的线程总数
+            jobs: 并发任务数
+            decode_share: 解码和图像处理线程占比
+        """
+        self.total = total
+        self.jobs = max(1, jobs)
+        self.per_job = max(1, total // self.jobs)
+        # 单任务时图表渲染和推理不会同时进行，不必预留
+        self.render = min(THREAD_CONFIG['render_threads'], self.per_job - 1) if self.jobs > 1 else 0
+        available = max(1, self.per_job - self.render)
+        self.decode = max(1, int(round(available * decode_share)))
+        self.inference = max(1, available - self.decode)
+
+    def to_dict(self) -> Dict[str, int]:
+        """转换为可序列化的字典（写入性能记录）"""
+        return {
+            'total': self.total,
+            'jobs': self.jobs,
+            'decode': self.decode,
+            'inference': self.inference,
+            'render': self.render
+        }
+
+
+class ThreadBudgetManager:
+    """线程预算管理类（进程内单例，任务开始和结束时重新切分）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._generation = 0
+        self._local = threading.local()
+        self._interop_configured = False
+        self.decode_share: Optional[float] = None
+
+    def _decode_share(self) -> float:
+        """解码线程占比：调优结果优先"""
+        if self.decode_share is None:
+            tuning = load_tuning()
+            self.decode_share = float(tuning['decode_share']) if tuning else THREAD_CONFIG['decode_share']
+        return self.decode_share
+
+    def current(self) -> ThreadBudget:
+        """按当前并发任务数计算的线程分配"""
+        return ThreadBudget(get_available_threads(), self._jobs, self._decode_share())
+
+    def configure_process(self) -> None:
+        """进程级设置：torch inter-op线程数只能在首次并行计算前设置一次"""
+        if not THREAD_CONFIG['enabled']:
+            return
+        with self._lock:
+            if self._interop_configured:
+                return
+            self._interop_configured = True
+        try:
+            import torch
+            torch.set_num_interop_threads(THREAD_CONFIG['interop_threads'])
+        except (ImportError, RuntimeError) as e:
+            logger.debug("torch inter-op线程数未设置: %s", e)
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        在调用线程中应用当前线程分配（并发任务数变化后才重新设置）
+
+        torch的intra-op线程数按线程生效，各任务线程需各自调用；OpenCV线程数为进程级设置
+
+        Args:
+            force: 是否忽略并发任务数未变化而强制设置
+        """
+        if not THREAD_CONFIG['enabled']:
+            return
+        generation = self._generation
+        if not force and getattr(self._local, 'generation', None) == generation:
+            return
+        self._local.generation = generation
+
+        budget = self.current()
+        cv2.setNumThreads(budget.decode)
+        try:
+            import torch
+            torch.set_num_threads(budget.inference)
+        except ImportError:
+            pass
+
+    @contextmanager
+    def job(self) -> Iterator[ThreadBudget]:
+        """
+        登记一个分析任务（同一线程内嵌套调用只计一次），期间按并发任务数分配线程
+
+        Yields:
+            ThreadBudget: 登记后本任务的线程分配
+        """
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        if depth == 0:
+            with self._lock:
+                self._jobs += 1
+                self._generation += 1
+            self.refresh()
+        try:
+            yield self.current()
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._lock:
+                    self._jobs -= 1
+                    self._generation += 1
+
+
+thread_budget = ThreadBudgetManager()
+
+
+def budgeted(func: Callable) -> Callable:
+    """装饰器：函数执行期间登记为一个分析任务"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with thread_budget.job():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def open_capture(video_path: str) -> cv2.VideoCapture:
+    """
+    打开视频，FFmpeg解码线程数限制为当前的解码线程分配（OpenCV不支持该参数时按默认方式打开）
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        cv2.VideoCapture: 视频读取对象
+    """
+    threads_prop = getattr(cv2, 'CAP_PROP_N_THREADS', None)
+    if THREAD_CONFIG['enabled'] and threads_prop is not None:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [threads_prop, thread_budget.current().decode])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return cv2.VideoCapture(video_path)
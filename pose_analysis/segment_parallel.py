@@ -0,0 +1,269 @@
+"""
+分段并行分析模块
+在关键帧处把一个长视频切成若干时间段，由独立的工作进程（各自的解码器和姿态检测器）并行分析，
+再按帧号拼接逐帧结果；每段多分析少量重叠帧，用于校验相邻段在接缝处的结果一致
+"""
+
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+
+from .config import PARALLEL_CONFIG, THREAD_CONFIG
+from .video_ingest import nearest_keyframe
+from .resources import get_available_threads
+from .profiling import StageTimer
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_key: Optional[Tuple[str, int]] = None
+_pool_lock = threading.Lock()
+
+# 工作进程内的分析器（每个进程加载一次模型）
+_worker_analyzer = None
+
+
+def get_worker_count() -> int:
+    """工作进程数"""
+    return max(1, PARALLEL_CONFIG['workers'] or get_available_threads())
+
+
+def _init_worker(model_path: str, torch_threads: int) -> None:
+    """工作进程初始化：限制每个进程的计算线程数并加载模型"""
+    global _worker_analyzer
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    # 工作进程内直接加载模型，不再嵌套启动推理进程池；线程数已按进程数分配，不再按任务数切分；
+    # 各段不写原始候选缓存（多个进程会同时写同一个文件）
+    from .config import INFERENCE_POOL_CONFIG, RAW_PREDICTION_CONFIG
+    INFERENCE_POOL_CONFIG['enabled'] = False
+    RAW_PREDICTION_CONFIG['enabled'] = False
+    THREAD_CONFIG['enabled'] = False
+
+    from .video_analyzer import VideoAnalyzer
+    _worker_analyzer = VideoAnalyzer(model_path)
+
+
+def _analyze_segment(video_path: str, angle: str, conf: float, iou: float, fps: float,
+                     start_frame: int, end_frame: int, track_path: str,
+                     imgsz: Optional[int] = None) -> Dict[str, Any]:
+    """
+    在工作进程中分析 [start_frame, end_frame) 范围内的帧
+
+    Returns:
+        Dict[str, Any]: 分析帧数、逐帧指标（帧号从1开始，相对本段）、轨迹路径和各阶段耗时
+    """
+    timer = StageTimer()
+    _worker_analyzer.pose_detector.imgsz = imgsz
+    # 取帧中点对应的时间，换算回帧号时不受浮点误差影响
+    timeline = {'start': (start_frame + 0.5) / fps, 'end': (end_frame + 0.5) / fps}
+    result = _worker_analyzer.analyze_video(video_path, angle, conf, iou, timeline,
+                                            track_path=track_path, timer=timer, parallel=False, early_stop=False)
+    return {
+        'start_frame': start_frame,
+        'frame_count': result['frame_count'],
+        'angle_data': result['angle_data'].tolist(),
+        'wrist_height_data': result['wrist_height_data'].tolist(),
+        'track_path': track_path,
+        'frame_model_runs': result['performance'].get('frame_model_runs', []),
+        'subject_runs': result['performance'].get('subject', {}).get('runs', []),
+        'stages': {name: values['seconds'] for name, values in timer.summary()['stages'].items()}
+    }
+
+
+def get_pool(model_path: str) -> ProcessPoolExecutor:
+    """
+    获取工作进程池（按模型路径和进程数复用）
+
+    Args:
+        model_path: 模型路径
+
+    Returns:
+        ProcessPoolExecutor: 进程池
+    """
+    global _pool, _pool_key
+    workers = get_worker_count()
+    with _pool_lock:
+        if _pool is not None and _pool_key != (model_path, workers):
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn：不继承Flask进程中的线程和已加载的模型
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_path, max(1, get_available_threads() // workers))
+            )
+            _pool_key = (model_path, workers)
+            logger.info("分段并行分析进程池已启动: %d个工作进程", workers)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """关闭工作进程池"""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool, _pool_key = None, None
+
+
+atexit.register(shutdown_pool)
+
+
+def plan_segments(start_frame: int, end_frame: int, keyframes: List[Dict[str, Any]],
+                  fps: float) -> List[Tuple[int, int]]:
+    """
+    在关键帧处切分分析范围
+
+    Args:
+        start_frame: 分析开始帧
+        end_frame: 分析结束帧（不含）
+        keyframes: 关键帧列表（视频索引）
+        fps: 帧率
+
+    Returns:
+        List[Tuple[int, int]]: 各段的 (开始帧, 结束帧)，不足两段时只有一段
+    """
+    frames = end_frame - start_frame
+    min_frames = max(1, int(PARALLEL_CONFIG['min_segment_seconds'] * fps))
+    count = min(get_worker_count(), frames // min_frames)
+    if count < 2:
+        return [(start_frame, end_frame)]
+
+    boundaries = [start_frame]
+    for k in range(1, count):
+        boundary = nearest_keyframe(keyframes, start_frame + frames * k // count)
+        if boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    boundaries.append(end_frame)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def run_segments(model_path: str, video_path: str, angle: str, conf: float, iou: float, fps: float,
+                 segments: List[Tuple[int, int]], work_dir: str,
+                 imgsz: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    并行分析各段（除最后一段外每段多分析overlap_frames帧）
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: 按顺序的各段结果，工作进程异常退出时返回None
+    """
+    end_frame = segments[-1][1]
+    futures = []
+    for i, (start, end) in enumerate(segments):
+        if i < len(segments) - 1:
+            end = min(end + PARALLEL_CONFIG['overlap_frames'], end_frame)
+        track_path = os.path.join(work_dir, f"segment_{i}_track.npz")
+        futures.append(get_pool(model_path).submit(
+            _analyze_segment, video_path, angle, conf, iou, fps, start, end, track_path, imgsz))
+
+    try:
+        return [future.result() for future in futures]
+    except BrokenProcessPool as e:
+        logger.error("分段并行分析的工作进程异常退出: %s", e)
+        shutdown_pool()
+        return None
+
+
+def stitch_records(outputs: List[Dict[str, Any]], key: str, start_frame: int,
+                   owned_counts: List[int]) -> Optional[List[Dict[str, Any]]]:
+    """
+    按帧号拼接各段的逐帧指标，并校验重叠帧
+
+    Args:
+        outputs: 各段结果
+        key: 'angle_data' 或 'wrist_height_data'
+        start_frame: 整个分析范围的开始帧
+        owned_counts: 各段实际负责的帧数（不含重叠帧）
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: 帧号相对整个分析范围的记录，接缝处不一致时返回None
+    """
+    stitched = []
+    overlap: Dict[int, Dict[str, Any]] = {}
+    for output, owned in zip(outputs, owned_counts):
+        offset = output['start_frame'] - start_frame
+        for record in output[key]:
+            record = dict(record, frame=record['frame'] + offset)
+            expected = overlap.pop(record['frame'], None)
+            if expected is not None:
+                for name, value in record.items():
+                    if abs(value - expected[name]) > PARALLEL_CONFIG['seam_tolerance']:
+                        logger.warning("第%d帧在相邻两段的结果不一致（%s: %s / %s）",
+                                       record['frame'], name, expected[name], value)
+                        return None
+            if record['frame'] - offset <= owned:
+                stitched.append(record)
+            else:
+                overlap[record['frame']] = record
+    return stitched
+
+
+def _run_value(runs: List[List[Any]], frame: int) -> Any:
+    """游程记录中某一帧的取值（帧号从1开始，不在任何游程内时返回None）"""
+    for first, last, value in runs:
+        if first <= frame <= last:
+            return value
+    return None
+
+
+def stitch_runs(outputs: List[Dict[str, Any]], key: str, start_frame: int,
+                owned_counts: List[int], renumber: bool = False,
+                continued: Optional[List[bool]] = None) -> List[List[Any]]:
+    """
+    按帧号拼接各段的游程记录（丢弃重叠帧）
+
+    Args:
+        outputs: 各段结果
+        key: 'frame_model_runs' 或 'subject_runs'
+        start_frame: 整个分析范围的开始帧
+        owned_counts: 各段实际负责的帧数（不含重叠帧）
+        renumber: 取值是否为各段独立分配的编号（受检者编号），是时按段累加使编号不重复
+        continued: 各段第一帧的受检者是否与上一段在重叠帧中的受检者为同一人，是时沿用上一段的编号
+
+    Returns:
+        List[List[Any]]: [[开始帧, 结束帧, 取值], ...]，帧号相对整个分析范围
+    """
+    stitched: List[List[Any]] = []
+    id_offset = 0
+    previous_ids: Dict[Any, Any] = {}
+    for index, (output, owned) in enumerate(zip(outputs, owned_counts)):
+        offset = output['start_frame'] - start_frame
+        segment_ids = [value for _, _, value in output[key] if value is not None]
+        ids: Dict[Any, Any] = {}
+        if renumber and index > 0 and continued and continued[index]:
+            # 本段第一帧即上一段的第owned+1帧（重叠帧）
+            previous_id = _run_value(outputs[index - 1][key], owned_counts[index - 1] + 1)
+            current_id = _run_value(output[key], 1)
+            if previous_id is not None and current_id is not None:
+                ids[current_id] = previous_ids.get(previous_id, previous_id)
+        for value in segment_ids:
+            ids.setdefault(value, value + id_offset)
+        for first, last, value in output[key]:
+            if first > owned:
+                break
+            if renumber and value is not None:
+                value = ids[value]
+            first, last = first + offset, min(last, owned) + offset
+            if stitched and stitched[-1][2] == value and stitched[-1][1] == first - 1:
+                stitched[-1][1] = last
+            else:
+                stitched.append([first, last, value])
+        if renumber and segment_ids:
+            id_offset += max(segment_ids)
+        previous_ids = ids
+    return stitched
@@ -0,0 +1,104 @@
+"""
+桩姿态检测器模块
+不加载模型，按帧序号返回合成的外展动作关键点并模拟推理耗时，用于单独压测Web层
+"""
+
+import time
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .config import MODEL_CONFIG, KEYPOINTS_CONFIG
+from .pose_detector import PoseDetector, DetectionResult
+from .synthetic import pose_at
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 一次抬起-放下动作的帧数
+STUB_CYCLE_FRAMES = 90
+
+
+class StubPoseDetector(PoseDetector):
+    """桩姿态检测器类"""
+
+    def __init__(self, model_path: str = "model/yolov8s-pose.pt"):
+        self._frame_index = 0
+        self._lock = threading.Lock()
+        super().__init__(model_path)
+
+    def load_model(self) -> bool:
+        """不加载模型，只记录为已加载"""
+        logger.info("使用桩姿态检测器（不加载模型），模拟单帧推理耗时 %.3fs", MODEL_CONFIG['stub_latency'])
+        metrics.MODEL_LOAD_SECONDS.observe(0.0)
+        metrics.MODEL_LOADED.set(1)
+        return True
+
+    def get_backend_info(self) -> Dict[str, Any]:
+        """推理后端信息"""
+        return {
+            'model_path': self.model_path,
+            'device': 'stub',
+            'stub_latency': MODEL_CONFIG['stub_latency']
+        }
+
+    def _synthetic_keypoints(self, width: int, height: int) -> np.ndarray:
+        """按帧序号生成一个人的合成关键点 (1, 17, 3)"""
+        with self._lock:
+            frame_index = self._frame_index
+            self._frame_index += 1
+
+        phase = (1 - np.cos(2 * np.pi * frame_index / STUB_CYCLE_FRAMES)) / 2
+        joints = pose_at('abduction', phase, width, height)
+        keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+        for name, index in KEYPOINTS_CONFIG.items():
+            point = joints.get(name, joints['head'])
+            keypoints[0, index, :2] = point
+            keypoints[0, index, 2] = 0.9
+        return keypoints
+
+    def predict(self, frame: np.ndarray, conf: float = 0.25,
+                iou: float = 0.45, classes: List[int] = None) -> Any:
+        """
+        模拟推理，返回与ultralytics结果接口一致的对象列表
+
+        Args:
+            frame: 输入图像
+            conf: 置信度阈值（未使用）
+            iou: IoU阈值（未使用）
+            classes: 检测类别（未使用）
+
+        Returns:
+            Any: [DetectionResult]
+        """
+        return self.predict_batch([frame], conf=conf, iou=iou, classes=classes)
+
+    def predict_batch(self, frames: List[np.ndarray], conf: float = 0.25,
+                      iou: float = 0.45, classes: List[int] = None) -> List[Any]:
+        """
+        模拟批量推理：整批只模拟一次推理耗时（近似GPU批量推理的吞吐）
+
+        Args:
+            frames: 输入图像列表
+            conf: 置信度阈值（未使用）
+            iou: IoU阈值（未使用）
+            classes: 检测类别（未使用）
+
+        Returns:
+            List[Any]: 与frames一一对应的DetectionResult
+        """
+        if MODEL_CONFIG['stub_latency'] > 0:
+            time.sleep(MODEL_CONFIG['stub_latency'])
+
+        results = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            keypoints = self._synthetic_keypoints(width, height)
+            points = keypoints[0, :, :2]
+            boxes = np.array([[points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()]],
+                             dtype=np.float32)
+            results.append(DetectionResult(keypoints, boxes, np.array([0.9], dtype=np.float32)))
+        metrics.MODEL_WARM.set(1)
+        return results
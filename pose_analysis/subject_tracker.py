@@ -0,0 +1,129 @@
+"""
+受检者跟踪模块
+在第一帧有人的画面中按面积和居中程度锁定受检者，之后按检测框IoU逐帧跟踪，
+只把受检者的检测结果交给角度计算；受检者丢失时该帧不采用其他人的结果，连续丢失过久后重新锁定（分配新的编号）
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import SUBJECT_CONFIG
+
+Detections = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """
+    计算一个检测框与多个检测框的IoU
+
+    Args:
+        box: 检测框 (4,)，xyxy格式
+        boxes: 检测框 (N, 4)
+
+    Returns:
+        np.ndarray: IoU (N,)
+    """
+    w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    inter = w * h
+    area = max(0.0, float(box[2] - box[0])) * max(0.0, float(box[3] - box[1]))
+    areas = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def select_initial_subject(boxes: np.ndarray, frame_size: Tuple[int, int]) -> int:
+    """
+    按SUBJECT_CONFIG['selection']选择要锁定的人
+
+    Args:
+        boxes: 检测框 (N, 4)，至少一个
+        frame_size: 画面尺寸 (width, height)
+
+    Returns:
+        int: 下标
+    """
+    width, height = frame_size
+    areas = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+    # 检测框中心到画面中心的距离，按半对角线归一化到0~1
+    distances = np.hypot(centers[:, 0] - width / 2, centers[:, 1] - height / 2) / max(np.hypot(width, height) / 2, 1e-9)
+
+    selection = SUBJECT_CONFIG['selection']
+    if selection == 'largest':
+        return int(np.argmax(areas))
+    if selection == 'central':
+        return int(np.argmin(distances))
+    # 'largest_central': 面积按离中心的距离打折
+    return int(np.argmax(areas * (1 - np.clip(distances, 0, 1))))
+
+
+class SubjectTracker:
+    """受检者跟踪类（每个视频一个实例）"""
+
+    def __init__(self):
+        self.last_id = 0  # 已分配的最大编号
+        self.subject_id: Optional[int] = None  # 当前锁定的受检者编号
+        self.box: Optional[np.ndarray] = None  # 受检者上一次出现时的检测框
+        self.lost = 0  # 连续丢失的推理帧数
+
+    def _lose(self) -> Tuple[Detections, Optional[int]]:
+        """本帧没有找到受检者"""
+        self.lost += 1
+        if self.lost > SUBJECT_CONFIG['max_lost_frames']:
+            # 丢失过久，下一帧有人时重新锁定
+            self.subject_id, self.box = None, None
+        empty = (np.zeros((0, 17, 3), dtype=np.float32),
+                 np.zeros((0, 4), dtype=np.float32),
+                 np.zeros((0,), dtype=np.float32))
+        return empty, None
+
+    def update(self, keypoints: np.ndarray, boxes: np.ndarray, scores: np.ndarray,
+               frame_size: Tuple[int, int]) -> Tuple[Detections, Optional[int]]:
+        """
+        在本帧的检测结果中找到受检者
+
+        Args:
+            keypoints: 关键点 (N, 17, 3)
+            boxes: 检测框 (N, 4)
+            scores: 置信度 (N,)
+            frame_size: 画面尺寸 (width, height)
+
+        Returns:
+            Tuple[Detections, Optional[int]]: 只含受检者的 (关键点, 检测框, 置信度) 和受检者编号，丢失时为空结果和None
+        """
+        if len(boxes) == 0:
+            return self._lose()
+
+        if self.box is None:
+            index = select_initial_subject(boxes, frame_size)
+            self.last_id += 1
+            self.subject_id = self.last_id
+        else:
+            overlaps = box_iou(self.box, boxes)
+            index = int(np.argmax(overlaps))
+            if overlaps[index] < SUBJECT_CONFIG['min_iou']:
+                return self._lose()
+
+        self.box = np.asarray(boxes[index], dtype=np.float32)
+        self.lost = 0
+        return (keypoints[index:index + 1], boxes[index:index + 1], scores[index:index + 1]), self.subject_id
+
+
+def summarize_subject_runs(runs: List[List[Any]]) -> Dict[str, Any]:
+    """
+    汇总受检者跟踪结果
+
+    Args:
+        runs: [[开始帧, 结束帧, 受检者编号], ...]，编号为None表示丢失
+
+    Returns:
+        Dict[str, Any]: 丢失的帧数和帧段、锁定过的受检者编号数及完整游程
+    """
+    lost_runs = [[start, end] for start, end, subject_id in runs if subject_id is None]
+    return {
+        'lost_frames': sum(end - start + 1 for start, end in lost_runs),
+        'lost_runs': lost_runs,
+        'subject_ids': len({subject_id for _, _, subject_id in runs if subject_id is not None}),
+        'runs': runs
+    }
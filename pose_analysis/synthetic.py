@@ -0,0 +1,264 @@
+"""
+合成测试视频模块
+生成确定性的火柴人动作视频（外展、前屈、背后上举），用于性能基准测试和回归测试
+"""
+
+import os
+from typing import Dict, Iterator, Tuple
+
+import cv2
+import numpy as np
+
+# 各拍摄角度对应的合成动作
+SYNTHETIC_MOTIONS = {
+    'front': 'abduction',
+    'side': 'flexion',
+    'back': 'reach'
+}
+
+# 动作的最大角度（度）
+MOTION_MAX_ANGLE = {
+    'abduction': 170.0,
+    'flexion': 160.0,
+    'reach': 90.0
+}
+
+SKIN_COLOR = (150, 180, 225)
+SHIRT_COLOR = (160, 90, 40)
+TROUSERS_COLOR = (60, 50, 45)
+
+
+def _arm_joints(shoulder: np.ndarray, angle: float, direction: int, upper: float, lower: float,
+                elbow_bend: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算上臂抬起指定角度时的肘、腕坐标
+
+    Args:
+        shoulder: 肩关节坐标
+        angle: 上臂与躯干（竖直向下）的夹角（度）
+        direction: 抬起方向，1表示向画面右侧，-1表示向画面左侧
+        upper: 上臂长度（像素）
+        lower: 前臂长度（像素）
+        elbow_bend: 肘关节弯曲角度（度，负值表示前臂向身体中线弯曲）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 肘关节坐标, 腕关节坐标
+    """
+    theta = np.radians(angle)
+    elbow = shoulder + upper * np.array([direction * np.sin(theta), np.cos(theta)])
+    theta2 = np.radians(angle + elbow_bend)
+    wrist = elbow + lower * np.array([direction * np.sin(theta2), np.cos(theta2)])
+    return elbow, wrist
+
+
+def pose_at(motion: str, phase: float, width: int, height: int) -> Dict[str, np.ndarray]:
+    """
+    计算动作在指定进度时的各关节坐标
+
+    Args:
+        motion: 'abduction'（正面外展）、'flexion'（侧面前屈）或 'reach'（背面上举）
+        phase: 动作进度，0表示手臂下垂，1表示达到最大角度
+        width: 画面宽度
+        height: 画面高度
+
+    Returns:
+        Dict[str, np.ndarray]: 关节名称到坐标的映射（名称与KEYPOINTS_CONFIG一致）
+    """
+    scale = height / 480.0
+    cx = width / 2.0
+    top = height * 0.12
+
+    head = np.array([cx, top + 30 * scale])
+    neck = np.array([cx, top + 65 * scale])
+    hip_y = top + 210 * scale
+    knee_y = top + 290 * scale
+    ankle_y = top + 365 * scale
+    upper, lower = 62 * scale, 58 * scale
+    angle = MOTION_MAX_ANGLE[motion] * phase
+
+    if motion == 'flexion':
+        # 侧面：两肩、两髋几乎重合，手臂向画面右侧（前方）抬起
+        shoulder = np.array([cx, top + 75 * scale])
+        hip = np.array([cx, hip_y])
+        elbow, wrist = _arm_joints(shoulder, angle, 1, upper, lower)
+        joints = {
+            'left_shoulder': shoulder + np.array([-3 * scale, 0]),
+            'right_shoulder': shoulder + np.array([3 * scale, 0]),
+            'left_elbow': elbow, 'left_wrist': wrist,
+            'right_elbow': elbow + np.array([2 * scale, 0]), 'right_wrist': wrist + np.array([2 * scale, 0]),
+            'left_hip': hip + np.array([-3 * scale, 0]), 'right_hip': hip + np.array([3 * scale, 0]),
+            'left_knee': np.array([cx - 3 * scale, knee_y]), 'right_knee': np.array([cx + 3 * scale, knee_y]),
+            'left_ankle': np.array([cx - 3 * scale, ankle_y]), 'right_ankle': np.array([cx + 3 * scale, ankle_y])
+        }
+    else:
+        half_shoulder, half_hip = 45 * scale, 30 * scale
+        # 拍摄者视角：人物左侧位于画面右侧（正面），背面时左右互换
+        left_side = 1 if motion == 'abduction' else -1
+        left_shoulder = np.array([cx + left_side * half_shoulder, top + 75 * scale])
+        right_shoulder = np.array([cx - left_side * half_shoulder, top + 75 * scale])
+
+        if motion == 'abduction':
+            left_elbow, left_wrist = _arm_joints(left_shoulder, angle, left_side, upper, lower)
+            right_elbow, right_wrist = _arm_joints(right_shoulder, angle, -left_side, upper, lower)
+        else:
+            # 背面上举：屈肘，手腕沿脊柱方向向上移动
+            left_elbow, left_wrist = _arm_joints(left_shoulder, 20 + angle * 0.3, left_side, upper, lower,
+                                                 elbow_bend=-(60 + angle))
+            right_elbow, right_wrist = _arm_joints(right_shoulder, 20 + angle * 0.3, -left_side, upper, lower,
+                                                   elbow_bend=-(60 + angle))
+
+        joints = {
+            'left_shoulder': left_shoulder, 'right_shoulder': right_shoulder,
+            'left_elbow': left_elbow, 'left_wrist': left_wrist,
+            'right_elbow': right_elbow, 'right_wrist': right_wrist,
+            'left_hip': np.array([cx + left_side * half_hip, hip_y]),
+            'right_hip': np.array([cx - left_side * half_hip, hip_y]),
+            'left_knee': np.array([cx + left_side * half_hip, knee_y]),
+            'right_knee': np.array([cx - left_side * half_hip, knee_y]),
+            'left_ankle': np.array([cx + left_side * half_hip, ankle_y]),
+            'right_ankle': np.array([cx - left_side * half_hip, ankle_y])
+        }
+
+    joints['head'] = head
+    joints['neck'] = neck
+    return joints
+
+
+def _point(p: np.ndarray) -> Tuple[int, int]:
+    """坐标转为整数像素"""
+    return int(round(p[0])), int(round(p[1]))
+
+
+def render_stick_figure(frame: np.ndarray, joints: Dict[str, np.ndarray], scale: float) -> None:
+    """
+    在图像上绘制带躯干和衣服的火柴人（粗肢体，便于姿态模型识别）
+
+    Args:
+        frame: BGR图像，原地绘制
+        joints: 关节坐标
+        scale: 尺寸缩放（画面高度/480）
+    """
+    limb = max(2, int(16 * scale))
+
+    # 腿
+    for side in ('left', 'right'):
+        cv2.line(frame, _point(joints[f'{side}_hip']), _point(joints[f'{side}_knee']), TROUSERS_COLOR, limb + 4)
+        cv2.line(frame, _point(joints[f'{side}_knee']), _point(joints[f'{side}_ankle']), TROUSERS_COLOR, limb + 2)
+
+    # 躯干
+    torso = np.array([_point(joints['left_shoulder']), _point(joints['right_shoulder']),
+                      _point(joints['right_hip']), _point(joints['left_hip'])], dtype=np.int32)
+    hull = cv2.convexHull(torso)
+    cv2.fillConvexPoly(frame, hull, SHIRT_COLOR)
+    cv2.polylines(frame, [hull], True, SHIRT_COLOR, limb)
+
+    # 头、颈
+    cv2.line(frame, _point(joints['neck']), _point((joints['left_shoulder'] + joints['right_shoulder']) / 2),
+             SKIN_COLOR, limb)
+    cv2.circle(frame, _point(joints['head']), int(26 * scale), SKIN_COLOR, -1)
+
+    # 手臂（上臂穿袖子）
+    for side in ('left', 'right'):
+        cv2.line(frame, _point(joints[f'{side}_shoulder']), _point(joints[f'{side}_elbow']), SHIRT_COLOR, limb + 2)
+        cv2.line(frame, _point(joints[f'{side}_elbow']), _point(joints[f'{side}_wrist']), SKIN_COLOR, limb)
+        cv2.circle(frame, _point(joints[f'{side}_wrist']), max(2, int(9 * scale)), SKIN_COLOR, -1)
+
+
+def iter_synthetic_frames(motion: str = 'abduction', width: int = 640, height: int = 480,
+                          frame_total: int = 120, cycles: int = 1, seed: int = 0) -> Iterator[np.ndarray]:
+    """
+    逐帧生成确定性的合成动作画面（不写入文件，供基准测试直接推理）
+
+    Args:
+        motion: 'abduction'、'flexion' 或 'reach'
+        width: 画面宽度
+        height: 画面高度
+        frame_total: 帧数
+        cycles: 抬起-放下的动作次数
+        seed: 背景噪声的随机种子
+
+    Yields:
+        np.ndarray: BGR图像
+    """
+    if motion not in MOTION_MAX_ANGLE:
+        raise ValueError(f"不支持的动作: {motion}")
+
+    rng = np.random.default_rng(seed)
+
+    # 纵向渐变背景加固定噪声，模拟诊室墙面
+    gradient = np.linspace(200, 150, height, dtype=np.float32)[:, None, None]
+    background = np.repeat(np.repeat(gradient, width, axis=1), 3, axis=2)
+    background += rng.normal(0, 4, size=background.shape).astype(np.float32)
+    background = np.clip(background, 0, 255).astype(np.uint8)
+    cv2.rectangle(background, (0, int(height * 0.88)), (width, height), (120, 130, 140), -1)
+
+    scale = height / 480.0
+    for i in range(frame_total):
+        t = i / frame_total
+        phase = (1 - np.cos(2 * np.pi * cycles * t)) / 2
+        frame = background.copy()
+        render_stick_figure(frame, pose_at(motion, phase, width, height), scale)
+        yield frame
+
+
+def generate_synthetic_video(output_path: str, motion: str = 'abduction', width: int = 640,
+                             height: int = 480, fps: float = 30.0, duration: float = 4.0,
+                             cycles: int = 1, seed: int = 0) -> str:
+    """
+    生成确定性的合成动作视频（相同参数生成的帧内容完全一致）
+
+    Args:
+        output_path: 输出路径（.mp4）
+        motion: 'abduction'、'flexion' 或 'reach'
+        width: 画面宽度
+        height: 画面高度
+        fps: 帧率
+        duration: 时长（秒）
+        cycles: 抬起-放下的动作次数
+        seed: 背景噪声的随机种子
+
+    Returns:
+        str: 输出路径
+    """
+    if motion not in MOTION_MAX_ANGLE:
+        raise ValueError(f"不支持的动作: {motion}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    frame_total = max(1, int(round(duration * fps)))
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"无法创建视频文件: {output_path}")
+
+    try:
+        for frame in iter_synthetic_frames(motion, width, height, frame_total, cycles, seed):
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    return output_path
+
+
+def generate_synthetic_set(output_dir: str, width: int = 640, height: int = 480, fps: float = 30.0,
+                           duration: float = 4.0, seed: int = 0) -> Dict[str, str]:
+    """
+    生成正面、侧面、背面三个角度的合成视频（文件已存在时直接复用）
+
+    Args:
+        output_dir: 输出目录
+        width: 画面宽度
+        height: 画面高度
+        fps: 帧率
+        duration: 时长（秒）
+        seed: 随机种子
+
+    Returns:
+        Dict[str, str]: {'front': 路径, 'side': 路径, 'back': 路径}
+    """
+    video_paths = {}
+    for angle, motion in SYNTHETIC_MOTIONS.items():
+        file_name = f"{angle}_{width}x{height}_{fps:g}fps_{duration:g}s_seed{seed}.mp4"
+        path = os.path.join(output_dir, file_name)
+        if not os.path.exists(path):
+            generate_synthetic_video(path, motion, width, height, fps, duration, seed=seed)
+        video_paths[angle] = path
+    return video_paths
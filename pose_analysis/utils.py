@@ -9,6 +9,10 @@ import numpy as np
 from typing import List, Tuple, Optional
 import json
 from datetime import datetime
+from .video_ingest import load_video_index
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 def ensure_directory_exists(directory_path: str) -> None:
     """
@@ -49,6 +53,11 @@ def get_video_info(video_path: str) -> dict:
     if not os.path.exists(video_path):
         return None
     
+    # 上传时已生成索引的视频直接读取索引中的元数据
+    video_index = load_video_index(video_path)
+    if video_index:
+        return dict(video_index['metadata'])
+    
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return None
@@ -85,7 +94,7 @@ def save_json_data(data: dict, file_path: str) -> bool:
             json.dump(data, f, ensure_ascii=False, indent=2)
         return True
     except Exception as e:
-        print(f"保存JSON数据失败: {str(e)}")
+        logger.error(f"保存JSON数据失败: {str(e)}")
         return False
 
 def load_json_data(file_path: str) -> Optional[dict]:
@@ -105,7 +114,7 @@ def load_json_data(file_path: str) -> Optional[dict]:
         with open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        print(f"加载JSON数据失败: {str(e)}")
+        logger.error(f"加载JSON数据失败: {str(e)}")
         return None
 
 def calculate_angle_between_points(p1: np.ndarray, p2: np.ndarray, p3: np.ndarray) -> float:
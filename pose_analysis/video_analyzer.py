@@ -10,32 +10,132 @@ import matplotlib.pyplot as plt
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
 import json
+import time
+import tempfile
 from PIL import Image, ImageDraw, ImageFont
-from .pose_detector import PoseDetector
+from .pose_detector import create_pose_detector
 from .data_processor import DataProcessor
 from .report_generator import ReportGenerator
 from .json_serializer import serialize_data, convert_numpy_types
 from .font_config import setup_chinese_font
+from .video_ingest import load_video_index, seek_to_frame
+from .keypoint_store import (KeypointStore, KeypointStoreWriter, get_keypoint_store_path, load_keypoint_store,
+                             filter_detections)
+from .video_writer import AnnotatedVideoWriter, remove_annotated_videos, get_track_path, get_preview_path
+from .overlay_renderer import get_rendered_video_path
+from .config import (VIDEO_OUTPUT_CONFIG, PARALLEL_CONFIG, RAW_PREDICTION_CONFIG, SUBJECT_CONFIG,
+                     CYCLE_CONFIG, get_performance_profile, get_patient_folder_path)
+from .profiling import StageTimer, ProfileCapture
+from .resources import thread_budget, budgeted, open_capture
+from .memory_budget import MemoryBudget, MemoryBudgetExceeded, FrameRecords, estimate_job_mb
+from .subject_tracker import SubjectTracker, summarize_subject_runs, box_iou
+from .cycle_detector import CycleDetector
+from .segment_parallel import plan_segments, run_segments, stitch_records, stitch_runs
+from .logging_config import get_logger, job_context, ErrorSampler
+
+logger = get_logger(__name__)
+
+# 关键帧标注文字字体，按优先级尝试
+LABEL_FONT_PATHS = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Medium.ttc",  # Noto Sans CJK
+    "/usr/share/fonts/opentype/noto/NotoSerifCJK-Bold.ttc",   # Noto Serif CJK
+    "/usr/share/fonts/truetype/arphic/ukai.ttc",              # AR PL UKai
+    "/usr/share/fonts/truetype/arphic/uming.ttc",             # AR PL UMing
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",        # DejaVu Sans
+    "/System/Library/Fonts/Arial.ttf",                        # macOS Arial
+    "C:/Windows/Fonts/arial.ttf",                             # Windows Arial
+]
+_label_fonts: Dict[int, Any] = {}  # 已加载的字体 {字号: ImageFont}
+
+
+def record_run(runs: List[List[Any]], frame: int, value: Any) -> None:
+    """
+    按游程记录逐帧的取值（例如产生结果的模型），隔帧推理时未推理的帧归入上一推理帧
+
+    Args:
+        runs: [[开始帧, 结束帧, 取值], ...]，帧号从1开始，原地追加
+        frame: 推理帧的帧号
+        value: 本帧的取值
+    """
+    if runs and runs[-1][2] == value:
+        runs[-1][1] = frame
+        return
+    if runs:
+        runs[-1][1] = frame - 1
+    runs.append([frame, frame, value])
+
+
+def count_frame_models(runs: List[List[Any]]) -> Dict[str, int]:
+    """各模型产生结果的帧数"""
+    counts: Dict[str, int] = {}
+    for start, end, model in runs:
+        counts[model] = counts.get(model, 0) + end - start + 1
+    return counts
+
+
+def _load_label_font(font_size: int) -> Any:
+    """
+    加载中文标注字体（按字号缓存，每个进程只查找和记录一次）
+    
+    Args:
+        font_size: 字体大小
+        
+    Returns:
+        Any: PIL字体对象
+    """
+    font = _label_fonts.get(font_size)
+    if font is not None:
+        return font
+    
+    for font_path in LABEL_FONT_PATHS:
+        try:
+            if os.path.exists(font_path):
+                font = ImageFont.truetype(font_path, font_size)
+                logger.debug("成功加载字体: %s", font_path)
+                break
+        except Exception as e:
+            logger.warning("加载字体失败 %s: %s", font_path, e)
+    
+    # 如果所有字体都加载失败，使用默认字体
+    if font is None:
+        logger.warning("未找到中文字体，使用默认字体")
+        font = ImageFont.load_default()
+    
+    _label_fonts[font_size] = font
+    return font
 
 class VideoAnalyzer:
     """视频分析器类"""
     
-    def __init__(self, model_path: str = "model/yolov8s-pose.pt"):
+    def __init__(self, model_path: str = "model/yolov8s-pose.pt", imgsz: Optional[int] = None):
         """
         初始化视频分析器
         
         Args:
             model_path: YOLO模型文件路径
+            imgsz: 推理输入尺寸，None表示模型默认
         """
         # 设置中文字体支持
         setup_chinese_font()
         
-        self.pose_detector = PoseDetector(model_path)
+        self.pose_detector = create_pose_detector(model_path)
+        self.pose_detector.imgsz = imgsz
         self.data_processor = DataProcessor()
         self.report_generator = ReportGenerator()
         
+    @budgeted
     def analyze_video(self, video_path: str, angle: str, conf: float = 0.25, 
-                     iou: float = 0.45, timeline_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                     iou: float = 0.45, timeline_data: Optional[Dict[str, Any]] = None,
+                     keypoint_store: Optional[KeypointStore] = None,
+                     output_path: Optional[str] = None,
+                     track_path: Optional[str] = None,
+                     timer: Optional[StageTimer] = None,
+                     memory_budget: Optional[MemoryBudget] = None,
+                     parallel: Optional[bool] = None,
+                     frame_stride: int = 1,
+                     video_max_height: Optional[int] = None,
+                     early_stop: Optional[bool] = None,
+                     cycle_side: str = 'left') -> Dict[str, Any]:
         """
         分析单个视频文件
         
@@ -45,109 +145,449 @@ class VideoAnalyzer:
             conf: 置信度阈值
             iou: IoU阈值
             timeline_data: 时间轴数据，包含start和end时间点
+            keypoint_store: 预先推理得到的关键点存储，参数兼容时跳过模型推理
+            output_path: 标注视频输出路径，指定时边分析边编码，不再缓存标注帧
+            track_path: 关键点轨迹输出路径，指定时保存逐帧关键点和指标，供之后渲染标注视频；
+                        同时未指定output_path时不绘制标注
+            timer: 分阶段计时器，None表示只统计本视频
+            memory_budget: 任务内存预算，None表示按本视频估算并新建预算
+            parallel: 是否分段并行分析，None表示使用PARALLEL_CONFIG的配置（只在保存轨迹且不编码标注视频时生效）
+            frame_stride: 每隔几帧推理一次，其余帧沿用上一推理帧的关键点，逐帧指标只记录推理帧
+            video_max_height: 标注视频最大高度，0表示保持原分辨率，None表示使用VIDEO_OUTPUT_CONFIG的配置
+            early_stop: 被评估一侧的动作周期完成后是否提前结束分析，None表示使用CYCLE_CONFIG的配置（分段并行分析时不生效）
+            cycle_side: 判断动作周期的一侧，'left'或'right'
             
         Returns:
             Dict[str, Any]: 分析结果
+            
+        Raises:
+            MemoryBudgetExceeded: 估算或分析中的内存超出预算
         """
+        if timer is None:
+            timer = StageTimer()
+        analysis_started = time.perf_counter()
+        
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"视频文件不存在: {video_path}")
         
-        cap = cv2.VideoCapture(video_path)
+        if keypoint_store is not None and not keypoint_store.is_compatible(conf, iou, self.pose_detector.imgsz):
+            logger.warning(f"关键点存储的推理参数与本次分析不兼容，重新推理: {video_path}")
+            keypoint_store = None
+        
+        # 只有既不边分析边编码、也不保存轨迹时才缓存全部标注帧
+        buffer_frames = output_path is None and track_path is None
+        owns_budget = memory_budget is None
+        if owns_budget:
+            memory_budget = MemoryBudget()
+        try:
+            if owns_budget:
+                memory_budget.check_estimate(
+                    estimate_job_mb({angle: video_path}, {angle: timeline_data} if timeline_data else None, buffer_frames),
+                    f"{angle}角度视频分析"
+                )
+            
+            # 只保存关键点轨迹时，长视频可分段并行分析
+            if parallel is None:
+                parallel = PARALLEL_CONFIG['enabled']
+            frame_stride = max(1, int(frame_stride))
+            if parallel and track_path and output_path is None and keypoint_store is None and frame_stride == 1:
+                result = self._analyze_video_segments(video_path, angle, conf, iou, timeline_data, track_path,
+                                                      timer, memory_budget, owns_budget, video_max_height)
+                if result is not None:
+                    return result
+            
+            return self._analyze_video_sequential(video_path, angle, conf, iou, timeline_data, keypoint_store,
+                                                  output_path, track_path, timer, memory_budget, owns_budget,
+                                                  frame_stride, video_max_height, early_stop, cycle_side,
+                                                  analysis_started)
+        finally:
+            if owns_budget:
+                # 失败或停止时也退出分摊，否则其余任务会一直分摊本任务之后的进程内存增长
+                memory_budget.close()
+    
+    def _analyze_video_sequential(self, video_path: str, angle: str, conf: float, iou: float,
+                                  timeline_data: Optional[Dict[str, Any]],
+                                  keypoint_store: Optional[KeypointStore],
+                                  output_path: Optional[str], track_path: Optional[str],
+                                  timer: StageTimer, memory_budget: MemoryBudget, owns_budget: bool,
+                                  frame_stride: int, video_max_height: Optional[int],
+                                  early_stop: Optional[bool], cycle_side: str,
+                                  analysis_started: float) -> Dict[str, Any]:
+        """
+        逐帧顺序分析单个视频（参数含义同analyze_video）
+        
+        Args:
+            owns_budget: 预算是否由analyze_video创建，是时把内存统计记入计时器
+            analysis_started: 分析开始时间（perf_counter）
+            
+        Returns:
+            Dict[str, Any]: 分析结果
+        """
+        cap = open_capture(video_path)
         if not cap.isOpened():
             raise RuntimeError(f"无法打开视频文件: {video_path}")
         
-        # 初始化数据列表
-        angle_data = []
-        velocity_data = []
-        wrist_height_data = []
-        annotated_frames = []
+        # 初始化逐帧数据（按段分配，超过内存预算的比例时写入磁盘）
+        angle_data = memory_budget.track(FrameRecords(('frame', 'left_angle', 'right_angle')))
+        velocity_data = memory_budget.track(FrameRecords(('frame', 'left_velocity', 'right_velocity')))
+        wrist_height_data = memory_budget.track(FrameRecords(('frame', 'left_wrist_height', 'right_wrist_height')))
+        annotated_frames = memory_budget.track_frames([])
         
         frame_count = 0
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        # 优先使用上传时生成的视频索引，避免重复探测视频信息
+        video_index = load_video_index(video_path)
+        if video_index:
+            fps = video_index['metadata']['fps']
+            total_frames = video_index['metadata']['frame_count']
+            keyframes = video_index['keyframes']
+        else:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            keyframes = None
         duration = total_frames / fps if fps > 0 else 0
         
         # 处理时间轴数据
         start_time = 0
         end_time = duration
-        print(f"时间轴数据: {timeline_data}")
+        logger.debug(f"时间轴数据: {timeline_data}")
         if timeline_data:
             # timeline_data 直接就是该角度的时间轴数据
             start_time = timeline_data.get('start', 0)
             end_time = timeline_data.get('end', duration)
-            print(f"时间轴设置: {angle}角度视频分析时间范围 {start_time:.2f}s - {end_time:.2f}s")
+            logger.info(f"时间轴设置: {angle}角度视频分析时间范围 {start_time:.2f}s - {end_time:.2f}s")
         
         # 计算开始和结束帧
         start_frame = int(start_time * fps)
         end_frame = int(end_time * fps)
         
-        print(f"开始分析视频: {video_path}")
-        print(f"视频FPS: {fps}, 总时长: {duration:.2f}s")
-        print(f"分析帧范围: {start_frame} - {end_frame}")
+        logger.info(f"开始分析视频: {video_path}")
+        logger.info(f"视频FPS: {fps}, 总时长: {duration:.2f}s")
+        logger.debug(f"分析帧范围: {start_frame} - {end_frame}")
         
-        # 跳过开始帧之前的帧
-        for _ in range(start_frame):
-            cap.read()
+        # 跳过开始帧之前的帧（有索引时先跳到最近的关键帧）
+        seek_to_frame(cap, start_frame, keyframes)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret or frame_count >= (end_frame - start_frame):
-                break
-            
-            frame_count += 1
-            
-            try:
-                # 检测姿态
-                annotated_frame, keypoints = self.pose_detector.detect_pose(
-                    frame, conf=conf, iou=iou
-                )
+        if keypoint_store is not None and not keypoint_store.covers(start_frame, min(end_frame, total_frames) - start_frame):
+            logger.info(f"关键点存储不包含本次分析的时间段，重新推理: {video_path}")
+            keypoint_store = None
+        
+        # 逐帧推理时以宽松阈值推理并缓存候选，之后修改阈值重新分析时只需重新过滤
+        raw_writer = None
+        infer_conf, infer_iou = conf, iou
+        if (keypoint_store is None and RAW_PREDICTION_CONFIG['enabled'] and frame_stride == 1
+                and conf >= RAW_PREDICTION_CONFIG['conf'] and iou <= RAW_PREDICTION_CONFIG['iou']):
+            raw_writer = KeypointStoreWriter(video_path, fps, RAW_PREDICTION_CONFIG['conf'], RAW_PREDICTION_CONFIG['iou'],
+                                             self.pose_detector.model_path, self.pose_detector.imgsz,
+                                             first_frame=start_frame, raw=True)
+            infer_conf, infer_iou = RAW_PREDICTION_CONFIG['conf'], RAW_PREDICTION_CONFIG['iou']
+        
+        video_writer = AnnotatedVideoWriter(output_path, fps, max_height=video_max_height) if output_path else None
+        track_writer = None
+        if track_path:
+            track_writer = KeypointStoreWriter(video_path, fps, conf, iou, self.pose_detector.model_path,
+                                               self.pose_detector.imgsz)
+        # 只保存轨迹时跳过所有绘制
+        annotate = output_path is not None or track_path is None
+        # 不缓存标注帧时复用同一帧缓冲区解码
+        reuse_buffer = video_writer is not None or not annotate
+        frame = None
+        # 隔帧推理时，未推理的帧沿用上一推理帧的检测结果（关键点、检测框、置信度）
+        held_detections = None
+        # 逐帧错误按时间窗口采样记录，避免坏视频刷满日志
+        frame_errors = ErrorSampler(logger)
+        # 产生各帧结果的模型（级联推理时逐帧可能不同）
+        frame_models: List[List[Any]] = []
+        self.pose_detector.reset_sequence()
+        # 锁定并跟踪受检者，其他人不参与角度计算；模型的max_det限制NMS和关键点解码的人数，
+        # 原始候选缓存需要保存max_candidates个候选，此时按候选数限制
+        subject_tracker = SubjectTracker() if SUBJECT_CONFIG['enabled'] else None
+        subject_runs: List[List[Any]] = []
+        if raw_writer is not None:
+            self.pose_detector.max_det = RAW_PREDICTION_CONFIG['max_candidates']
+        else:
+            self.pose_detector.max_det = SUBJECT_CONFIG['max_det'] if subject_tracker else None
+        # 被评估一侧的动作周期完成后提前结束（峰值统计只取后50%的记录，左右两侧的最大值都须落在完整分析的后半段）
+        if early_stop is None:
+            early_stop = CYCLE_CONFIG['enabled']
+        expected_frames = max(0, min(end_frame, total_frames) - start_frame)
+        cycle_records = wrist_height_data if angle == "back" else angle_data
+        cycle_detector = None
+        if early_stop and angle in CYCLE_CONFIG['min_amplitude'] and fps > 0:
+            cycle_side = 'right' if cycle_side == 'right' else 'left'
+            cycle_detector = CycleDetector(angle, fps, -(-expected_frames // frame_stride), frame_stride,
+                                           cycle_key=f"{cycle_side}_wrist_height" if angle == "back" else f"{cycle_side}_angle")
+        
+        try:
+            while True:
+                if cycle_detector is not None and cycle_detector.should_stop(frame_count):
+                    logger.info(f"动作周期已完成，第{frame_count}帧提前结束分析: {video_path}")
+                    break
+                skipped = frame_count % frame_stride != 0
+                with timer.stage('decode'):
+                    if skipped and not annotate:
+                        # 不需要画面时只推进解码位置，不转换图像
+                        ret = cap.grab()
+                    else:
+                        ret, frame = cap.read(frame) if reuse_buffer and frame is not None else cap.read()
+                if not ret or frame_count >= (end_frame - start_frame):
+                    break
                 
-                # 根据角度计算不同的指标
-                if angle == "front":
-                    left_angle, right_angle = self.pose_detector.calculate_front_shoulder_angle(
-                        annotated_frame, keypoints, show_angle=True
-                    )
-                    angle_data.append({
-                        'frame': frame_count,
-                        'left_angle': left_angle,
-                        'right_angle': right_angle
-                    })
-                    
-                elif angle == "side":
-                    left_angle, right_angle = self.pose_detector.calculate_side_shoulder_angle(
-                        annotated_frame, keypoints, show_angle=True
-                    )
-                    angle_data.append({
-                        'frame': frame_count,
-                        'left_angle': left_angle,
-                        'right_angle': right_angle
-                    })
-                    
-                elif angle == "back":
-                    left_wrist_height, right_wrist_height = self.pose_detector.calculate_wrist_distance(
-                        annotated_frame, keypoints, show_distance=True
-                    )
-                    wrist_height_data.append({
-                        'frame': frame_count,
-                        'left_wrist_height': left_wrist_height,
-                        'right_wrist_height': right_wrist_height
-                    })
+                frame_count += 1
+                # 按间隔采样内存，超过溢出阈值时逐帧数据写入磁盘，超出预算时终止
+                memory_budget.check()
                 
-                # 只保存选择时间段内的标注帧
-                annotated_frames.append(annotated_frame.copy())
+                if skipped:
+                    self._write_held_frame(frame if annotate else None, held_detections, track_writer,
+                                           video_writer, annotated_frames, annotate, timer)
+                    continue
                 
-            except Exception as e:
-                print(f"处理第{frame_count}帧时出错: {str(e)}")
-                continue
+                try:
+                    if keypoint_store is not None:
+                        # 复用已存储的关键点，只做后处理
+                        with timer.stage('keypoint_store'):
+                            keypoints, boxes, scores = keypoint_store.frame_detections(
+                                start_frame + frame_count - 1, conf, iou)
+                        record_run(frame_models, frame_count,
+                                   os.path.basename(keypoint_store.meta.get('model_path') or ''))
+                    else:
+                        # 检测姿态
+                        with timer.stage('inference'):
+                            results = self.pose_detector.predict(frame, conf=infer_conf, iou=infer_iou)
+                        with timer.stage('postprocess'):
+                            keypoints, boxes, scores = self.pose_detector.extract_detections(results[0])
+                            if raw_writer is not None:
+                                raw_writer.append(*self._top_candidates(keypoints, boxes, scores))
+                                keypoints, boxes, scores = filter_detections(keypoints, boxes, scores, conf, iou)
+                        record_run(frame_models, frame_count, self.pose_detector.get_frame_source(results[0]))
+                    
+                    if subject_tracker is not None:
+                        # 只保留受检者（检测结果按置信度降序，先截取max_det个候选）
+                        max_det = SUBJECT_CONFIG['max_det']
+                        (keypoints, boxes, scores), subject_id = subject_tracker.update(
+                            keypoints[:max_det], boxes[:max_det], scores[:max_det], (frame.shape[1], frame.shape[0]))
+                        record_run(subject_runs, frame_count, subject_id)
+                    held_detections = (keypoints, boxes, scores)
+                    
+                    # 在原帧上绘制临床相关肢体，不需要标注输出时跳过
+                    annotated_frame = frame
+                    if annotate:
+                        with timer.stage('overlay'):
+                            self.pose_detector.draw_keypoints(annotated_frame, keypoints)
+                    
+                    postprocess_started = time.perf_counter()
+                    if track_writer is not None:
+                        track_writer.append(keypoints, boxes, scores)
+                    
+                    # 根据角度计算不同的指标
+                    if angle == "front":
+                        left_angle, right_angle = self.pose_detector.calculate_front_shoulder_angle(
+                            annotated_frame, keypoints, show_angle=annotate
+                        )
+                        angle_data.append({
+                            'frame': frame_count,
+                            'left_angle': left_angle,
+                            'right_angle': right_angle
+                        })
+                        
+                    elif angle == "side":
+                        left_angle, right_angle = self.pose_detector.calculate_side_shoulder_angle(
+                            annotated_frame, keypoints, show_angle=annotate
+                        )
+                        angle_data.append({
+                            'frame': frame_count,
+                            'left_angle': left_angle,
+                            'right_angle': right_angle
+                        })
+                        
+                    elif angle == "back":
+                        left_wrist_height, right_wrist_height = self.pose_detector.calculate_wrist_distance(
+                            annotated_frame, keypoints, show_distance=annotate
+                        )
+                        wrist_height_data.append({
+                            'frame': frame_count,
+                            'left_wrist_height': left_wrist_height,
+                            'right_wrist_height': right_wrist_height
+                        })
+                    
+                    if cycle_detector is not None:
+                        # 未检测到受检者的帧指标为0，不参与周期判断；按逐帧数据的下标判断最大值是否在后半段
+                        record = cycle_records[-1]
+                        cycle_detector.update(frame_count, len(cycle_records) - 1,
+                                              {key: value for key, value in record.items() if key != 'frame'}
+                                              if len(keypoints) else None)
+                    
+                    # 角度计算（标注时包含角度标签绘制）
+                    timer.add('postprocess', time.perf_counter() - postprocess_started)
+                    
+                    # 只保存选择时间段内的标注帧
+                    if video_writer is not None:
+                        with timer.stage('video_write'):
+                            video_writer.write(annotated_frame)
+                    elif annotate:
+                        # 未复用缓冲区时每帧都是新解码的图像，无需复制
+                        annotated_frames.append(annotated_frame)
+                    
+                except Exception as e:
+                    frame_errors.log('处理帧出错', "处理第%d帧时出错: %s", frame_count, e)
+                    # 保持轨迹与帧号对齐
+                    if track_writer is not None and track_writer.frame_count < frame_count:
+                        track_writer.append_empty()
+                    # 候选缓存缺了这一帧，不再保存
+                    raw_writer = None
+                    if cycle_detector is not None:
+                        cycle_detector.update(frame_count)
+                    continue
+        except MemoryBudgetExceeded:
+            cap.release()
+            if video_writer is not None:
+                # 丢弃未完成的标注视频
+                video_writer.failed = True
+                video_writer.close()
+            raise
         
+        frame_errors.flush()
+        for runs in (frame_models, subject_runs):
+            if runs:
+                runs[-1][1] = frame_count
+        frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
         cap.release()
+        video_output = None
+        if video_writer is not None:
+            with timer.stage('video_write'):
+                video_output = video_writer.close()
+        
+        if track_writer is not None:
+            with timer.stage('track_save'):
+                self._save_track(track_writer, track_path, video_path, angle, start_frame,
+                                 frame_count, angle_data or wrist_height_data, frame_size,
+                                 frame_stride, video_max_height)
+        
+        if raw_writer is not None and raw_writer.frame_count > 0:
+            with timer.stage('raw_cache_save'):
+                self._save_raw_predictions(raw_writer, video_path)
+        
+        analysis_seconds = time.perf_counter() - analysis_started
+        timer.add('analyze_video', analysis_seconds)
+        timer.count('frames', frame_count)
         
         # 计算速度
         if angle in ["front", "side"] and angle_data:
-            velocity_data = self.data_processor.calculate_velocity(angle_data, fps)
+            velocity_data = self.data_processor.calculate_velocity(angle_data, fps, output=velocity_data)
+        
+        memory_budget.sample(enforce=False)
+        if owns_budget:
+            timer.info['memory'] = memory_budget.summary()
+        
+        analysis_result = self._build_result(
+            angle, fps, frame_count, duration, start_time, end_time, angle_data, velocity_data,
+            wrist_height_data, analysis_seconds, memory_budget,
+            annotated_frames=annotated_frames,
+            video_output=video_output,
+            track_path=track_path if track_writer is not None else None,
+            used_keypoint_store=keypoint_store is not None,
+            frame_models=frame_models,
+            subject_runs=subject_runs,
+            cycle=cycle_detector.summary(frame_count, expected_frames) if cycle_detector is not None else None
+        )
+        
+        logger.info(f"视频分析完成: {video_path}")
+        logger.info(f"分析帧数: {frame_count}, 分析时长: {frame_count/fps:.2f}s")
+        
+        return analysis_result
+    
+    def _top_candidates(self, keypoints: np.ndarray, boxes: np.ndarray,
+                        scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """按置信度保留每帧前max_candidates个候选（已做过宽松NMS，写入原始候选缓存）"""
+        limit = RAW_PREDICTION_CONFIG['max_candidates']
+        if len(scores) <= limit:
+            return keypoints, boxes, scores
+        keep = np.argsort(-scores, kind='stable')[:limit]
+        return keypoints[keep], boxes[keep], scores[keep]
+    
+    def _save_raw_predictions(self, raw_writer: KeypointStoreWriter, video_path: str) -> None:
+        """
+        保存原始候选缓存（与预推理关键点共用存储路径），已有的存储包含更多帧时保留已有的存储
+        
+        Args:
+            raw_writer: 原始候选写入器
+            video_path: 视频文件路径
+        """
+        store = raw_writer.finalize()
+        existing = load_keypoint_store(video_path, self.pose_detector.model_path)
+        if (existing is not None and existing.raw and existing.meta.get('imgsz') == store.meta['imgsz']
+                and existing.meta.get('conf', 1.0) <= store.meta['conf']
+                and (existing.meta.get('iou') or 0) >= store.meta['iou']
+                and existing.covers(store.first_frame, store.frame_count)):
+            return
+        store.save(get_keypoint_store_path(video_path))
+        logger.info(f"原始候选缓存已保存: {video_path}, 共{store.frame_count}帧")
+    
+    def _write_held_frame(self, frame: Optional[np.ndarray], held_detections: Optional[Tuple[np.ndarray, ...]],
+                          track_writer: Optional[KeypointStoreWriter],
+                          video_writer: Optional[AnnotatedVideoWriter],
+                          annotated_frames: List[np.ndarray], annotate: bool, timer: StageTimer) -> None:
+        """
+        处理隔帧推理时跳过的帧：轨迹和标注沿用上一推理帧的检测结果，保持与视频帧号对齐
+        
+        Args:
+            frame: 解码的图像（不需要标注时为None）
+            held_detections: 上一推理帧的 (关键点, 检测框, 置信度)
+            track_writer: 轨迹写入器
+            video_writer: 标注视频写入器
+            annotated_frames: 缓存的标注帧
+            annotate: 是否绘制标注
+            timer: 分阶段计时器
+        """
+        if track_writer is not None:
+            if held_detections is not None:
+                track_writer.append(*held_detections)
+            else:
+                track_writer.append_empty()
         
-        # 整理分析结果
-        analysis_result = {
+        if not annotate or frame is None:
+            return
+        if held_detections is not None:
+            with timer.stage('overlay'):
+                self.pose_detector.draw_keypoints(frame, held_detections[0])
+        if video_writer is not None:
+            with timer.stage('video_write'):
+                video_writer.write(frame)
+        else:
+            annotated_frames.append(frame)
+    
+    def _build_result(self, angle: str, fps: float, frame_count: int, duration: float,
+                      start_time: float, end_time: float, angle_data: FrameRecords,
+                      velocity_data: FrameRecords, wrist_height_data: FrameRecords,
+                      analysis_seconds: float, memory_budget: MemoryBudget,
+                      annotated_frames: Optional[List[np.ndarray]] = None,
+                      video_output: Optional[Dict[str, Optional[str]]] = None,
+                      track_path: Optional[str] = None, used_keypoint_store: bool = False,
+                      segments: Optional[int] = None,
+                      frame_models: Optional[List[List[Any]]] = None,
+                      subject_runs: Optional[List[List[Any]]] = None,
+                      cycle: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """整理单个视频的分析结果（顺序分析和分段并行分析共用）"""
+        performance = {
+            'frames': frame_count,
+            'seconds': round(analysis_seconds, 4),
+            'fps': round(frame_count / analysis_seconds, 2) if analysis_seconds > 0 else None,
+            'peak_memory_mb': memory_budget.summary()['peak_mb']
+        }
+        if frame_models:
+            # 各模型的帧数，以及按游程记录的逐帧模型 [[开始帧, 结束帧, 模型], ...]
+            performance['frame_models'] = count_frame_models(frame_models)
+            performance['frame_model_runs'] = frame_models
+        if subject_runs:
+            # 受检者丢失的帧数和帧段、锁定过的受检者数
+            performance['subject'] = summarize_subject_runs(subject_runs)
+        if cycle:
+            # 动作周期的最高点、完成帧和提前结束少分析的帧数
+            performance['cycle'] = cycle
+        if segments:
+            performance['segments'] = segments
+        
+        return {
             'angle': angle,
             'frame_count': frame_count,
             'fps': fps,
@@ -158,21 +598,271 @@ class VideoAnalyzer:
             'angle_data': angle_data,
             'velocity_data': velocity_data,
             'wrist_height_data': wrist_height_data,
-            'annotated_frames': annotated_frames,
+            'annotated_frames': annotated_frames or [],
+            'video_output': video_output,
+            'track_path': track_path,
+            'used_keypoint_store': used_keypoint_store,
+            'performance': performance,
             'analysis_time': datetime.now().isoformat()
         }
+    
+    def _analyze_video_segments(self, video_path: str, angle: str, conf: float, iou: float,
+                                timeline_data: Optional[Dict[str, Any]], track_path: str,
+                                timer: StageTimer, memory_budget: MemoryBudget,
+                                owns_budget: bool,
+                                video_max_height: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        分段并行分析单个视频：在关键帧处切分，各段由工作进程分析后按帧号拼接，
+        角速度在拼接后的完整序列上计算，结果与顺序分析一致
         
-        print(f"视频分析完成: {video_path}")
-        print(f"分析帧数: {frame_count}, 分析时长: {frame_count/fps:.2f}s")
+        Args:
+            video_path: 视频文件路径
+            angle: 视频角度
+            conf: 置信度阈值
+            iou: IoU阈值
+            timeline_data: 时间轴数据
+            track_path: 关键点轨迹输出路径
+            timer: 分阶段计时器（工作进程各阶段耗时累加计入）
+            memory_budget: 任务内存预算
+            owns_budget: 预算是否由analyze_video创建，是时把内存统计记入计时器
+            
+        Returns:
+            Optional[Dict[str, Any]]: 与analyze_video结构相同的分析结果；没有关键帧索引、视频不足两段、
+                                      工作进程异常或接缝校验失败时返回None（由调用方顺序分析）
+        """
+        video_index = load_video_index(video_path)
+        if not video_index or not video_index.get('keyframes'):
+            return None
         
-        return analysis_result
+        analysis_started = time.perf_counter()
+        metadata = video_index['metadata']
+        fps = metadata['fps']
+        total_frames = metadata['frame_count']
+        duration = total_frames / fps if fps > 0 else 0
+        start_time = (timeline_data or {}).get('start', 0)
+        end_time = (timeline_data or {}).get('end', duration)
+        start_frame = int(start_time * fps)
+        end_frame = int(end_time * fps)
+        
+        segments = plan_segments(start_frame, min(end_frame, total_frames), video_index['keyframes'], fps)
+        if len(segments) < 2:
+            return None
+        # 最后一段与顺序分析一样读到结束帧或视频末尾
+        segments[-1] = (segments[-1][0], end_frame)
+        logger.info(f"分段并行分析: {video_path}, 共{len(segments)}段")
+        
+        with tempfile.TemporaryDirectory(prefix='pose_segments_') as work_dir:
+            with timer.stage('segments'):
+                outputs = run_segments(self.pose_detector.model_path, video_path, angle, conf, iou, fps,
+                                       segments, work_dir, self.pose_detector.imgsz)
+            if outputs is None:
+                logger.warning(f"分段并行分析失败，改为顺序分析: {video_path}")
+                return None
+            
+            # 各段负责的帧数（不含重叠帧）；某段提前读到视频末尾时，顺序分析也会在此结束
+            kept, owned_counts = [], []
+            for (start, end), output in zip(segments, outputs):
+                kept.append(output)
+                owned_counts.append(min(end - start, output['frame_count']))
+                if output['frame_count'] < end - start:
+                    break
+            
+            stitched = {}
+            for key in ('angle_data', 'wrist_height_data'):
+                stitched[key] = stitch_records(kept, key, start_frame, owned_counts)
+                if stitched[key] is None:
+                    logger.warning(f"分段结果在接缝处不一致，改为顺序分析: {video_path}")
+                    return None
+            
+            angle_data = memory_budget.track(FrameRecords(('frame', 'left_angle', 'right_angle')))
+            velocity_data = memory_budget.track(FrameRecords(('frame', 'left_velocity', 'right_velocity')))
+            wrist_height_data = memory_budget.track(FrameRecords(('frame', 'left_wrist_height', 'right_wrist_height')))
+            for record in stitched['angle_data']:
+                angle_data.append(record)
+            for record in stitched['wrist_height_data']:
+                wrist_height_data.append(record)
+            frame_count = sum(owned_counts)
+            
+            # 按顺序合并各段的关键点轨迹；比较相邻两段在同一重叠帧的受检者检测框，判断是否为同一人
+            continued = [False]
+            with timer.stage('track_save'):
+                track_writer = KeypointStoreWriter(video_path, fps, conf, iou, self.pose_detector.model_path,
+                                                   self.pose_detector.imgsz)
+                previous_store, previous_owned = None, 0
+                for output, owned in zip(kept, owned_counts):
+                    store = KeypointStore.load(output['track_path'])
+                    if store is None:
+                        logger.warning(f"分段关键点轨迹缺失，改为顺序分析: {video_path}")
+                        return None
+                    if previous_store is not None:
+                        continued.append(self._same_subject(previous_store, previous_owned, store))
+                    for i in range(owned):
+                        track_writer.append(*store.frame_detections(i))
+                    previous_store, previous_owned = store, owned
+                self._save_track(track_writer, track_path, video_path, angle, start_frame, frame_count,
+                                 angle_data or wrist_height_data, (metadata['width'], metadata['height']),
+                                 video_max_height=video_max_height)
+        
+        for output in kept:
+            for stage, seconds in output['stages'].items():
+                if stage not in ('analyze_video', 'track_save'):
+                    timer.add(stage, seconds)
+        analysis_seconds = time.perf_counter() - analysis_started
+        timer.add('analyze_video', analysis_seconds)
+        timer.count('frames', frame_count)
+        
+        # 在完整序列上计算角速度，接缝两侧的速度与顺序分析相同
+        if angle in ["front", "side"] and angle_data:
+            velocity_data = self.data_processor.calculate_velocity(angle_data, fps, output=velocity_data)
+        
+        memory_budget.sample(enforce=False)
+        if owns_budget:
+            timer.info['memory'] = memory_budget.summary()
+        
+        logger.info(f"视频分析完成: {video_path}")
+        logger.info(f"分析帧数: {frame_count}, 分段数: {len(kept)}")
+        
+        return self._build_result(
+            angle, fps, frame_count, duration, start_time, end_time, angle_data, velocity_data,
+            wrist_height_data, analysis_seconds, memory_budget,
+            track_path=track_path,
+            segments=len(kept),
+            frame_models=stitch_runs(kept, 'frame_model_runs', start_frame, owned_counts),
+            subject_runs=stitch_runs(kept, 'subject_runs', start_frame, owned_counts, renumber=True,
+                                     continued=continued)
+        )
+    
+    def _same_subject(self, previous_store: KeypointStore, previous_owned: int, store: KeypointStore) -> bool:
+        """
+        相邻两段在接缝处跟踪的是否为同一受检者（轨迹只保存受检者的检测结果）
+        
+        Args:
+            previous_store: 上一段的关键点轨迹（包含重叠帧）
+            previous_owned: 上一段负责的帧数，其后第一帧即本段第一帧
+            store: 本段的关键点轨迹
+            
+        Returns:
+            bool: 两段在该帧都有受检者且检测框IoU不低于SUBJECT_CONFIG['min_iou']
+        """
+        previous_boxes = previous_store.frame_detections(previous_owned)[1]
+        boxes = store.frame_detections(0)[1]
+        if len(previous_boxes) == 0 or len(boxes) == 0:
+            return False
+        return float(box_iou(previous_boxes[0], boxes[:1])[0]) >= SUBJECT_CONFIG['min_iou']
     
+    def _save_track(self, track_writer: KeypointStoreWriter, track_path: str, video_path: str,
+                    angle: str, start_frame: int, frame_count: int,
+                    frame_data: List[Dict[str, Any]], frame_size: Tuple[int, int],
+                    frame_stride: int = 1, video_max_height: Optional[int] = None) -> None:
+        """
+        保存关键点轨迹及逐帧指标（左右两侧的角度或腕高度比例）
+        
+        Args:
+            track_writer: 轨迹写入器
+            track_path: 轨迹文件路径
+            video_path: 分析的视频路径（渲染时读取）
+            angle: 视频角度
+            start_frame: 分析开始帧
+            frame_count: 分析帧数
+            frame_data: 逐帧指标数据（angle_data或wrist_height_data）
+            frame_size: 视频帧尺寸 (width, height)，客户端叠加时用于坐标缩放
+            frame_stride: 推理间隔，未推理的帧沿用上一推理帧的指标
+            video_max_height: 渲染标注视频的最大高度，None表示使用VIDEO_OUTPUT_CONFIG的配置
+        """
+        metrics = np.full((frame_count, 2), np.nan, dtype=np.float32)
+        for item in frame_data:
+            values = [item.get('left_angle', item.get('left_wrist_height')),
+                      item.get('right_angle', item.get('right_wrist_height'))]
+            metrics[item['frame'] - 1:item['frame'] - 1 + frame_stride] = values
+        
+        track = track_writer.finalize(extras={'metrics': metrics})
+        track.meta.update({
+            'video_path': video_path,
+            'angle': angle,
+            'start_frame': start_frame,
+            'width': frame_size[0],
+            'height': frame_size[1],
+            'video_max_height': video_max_height
+        })
+        track.save(track_path)
+    
+    def extract_keypoints(self, video_path: str, conf: float = 0.25, iou: float = 0.45,
+                          stop_check_func=None, pause_check_func=None,
+                          poll_interval: float = 0.5) -> Optional[KeypointStore]:
+        """
+        对整个视频逐帧推理并保存关键点（用于上传后的预推理）
+        
+        Args:
+            video_path: 视频文件路径
+            conf: 置信度阈值（应不高于分析时使用的阈值）
+            iou: IoU阈值；开启原始候选缓存时替换为RAW_PREDICTION_CONFIG['iou']（0.9）做宽松NMS，
+                 保存的候选可供IoU阈值不高于0.9的分析复用
+            stop_check_func: 停止检查函数，返回True表示取消
+            pause_check_func: 暂停检查函数，返回True时让出资源等待
+            poll_interval: 暂停时的检查间隔（秒）
+            
+        Returns:
+            Optional[KeypointStore]: 关键点存储，被取消时返回None
+        """
+        cap = open_capture(video_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+        
+        video_index = load_video_index(video_path)
+        fps = video_index['metadata']['fps'] if video_index else cap.get(cv2.CAP_PROP_FPS)
+        # 开启原始候选缓存时忽略传入的iou，以宽松IoU（RAW_PREDICTION_CONFIG['iou']）做NMS并保存候选，
+        # 分析时IoU阈值不高于该值才能复用
+        raw = RAW_PREDICTION_CONFIG['enabled']
+        if raw:
+            iou = RAW_PREDICTION_CONFIG['iou']
+        writer = KeypointStoreWriter(video_path, fps, conf, iou, self.pose_detector.model_path,
+                                     self.pose_detector.imgsz, raw=raw)
+        self.pose_detector.reset_sequence()
+        # 与分析时的检测数上限一致
+        if raw:
+            self.pose_detector.max_det = RAW_PREDICTION_CONFIG['max_candidates']
+        else:
+            self.pose_detector.max_det = SUBJECT_CONFIG['max_det'] if SUBJECT_CONFIG['enabled'] else None
+        
+        try:
+            while True:
+                if stop_check_func and stop_check_func():
+                    logger.info(f"预推理已取消: {video_path}")
+                    return None
+                
+                # 有正式分析任务时暂停，让出计算资源
+                while pause_check_func and pause_check_func():
+                    if stop_check_func and stop_check_func():
+                        logger.info(f"预推理已取消: {video_path}")
+                        return None
+                    time.sleep(poll_interval)
+                
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                
+                results = self.pose_detector.predict(frame, conf=conf, iou=iou)
+                detections = self.pose_detector.extract_detections(results[0])
+                writer.append(*(self._top_candidates(*detections) if raw else detections))
+        finally:
+            cap.release()
+        
+        store = writer.finalize()
+        store.save(get_keypoint_store_path(video_path))
+        logger.info(f"预推理完成: {video_path}, 共{store.frame_count}帧")
+        return store
+    
+    @budgeted
     def analyze_patient_videos(self, patient_id: int, patient_name: str, 
                              video_paths: Dict[str, str], conf: float = 0.25, 
                              iou: float = 0.45, stop_check_func=None,
                              patient_info: Optional[Dict[str, Any]] = None,
                              timeline_data: Optional[Dict[str, Any]] = None,
-                             shoulder_selection: str = 'left') -> Dict[str, Any]:
+                             shoulder_selection: str = 'left',
+                             keypoint_stores: Optional[Dict[str, KeypointStore]] = None,
+                             timer: Optional[StageTimer] = None,
+                             profile_mode: Optional[str] = None,
+                             performance_profile: Optional[str] = None) -> Dict[str, Any]:
         """
         分析患者的所有视频文件
         
@@ -186,105 +876,189 @@ class VideoAnalyzer:
             patient_info: 患者详细信息（年龄、性别、身高、体重等）
             timeline_data: 时间轴数据字典，格式为 {'front': {'start': 0, 'end': 10}, ...}
             shoulder_selection: 肩部选择，'left'表示左肩，'right'表示右肩
+            keypoint_stores: 各角度预推理的关键点存储 {'front': store, ...}
+            timer: 分阶段计时器（可包含调用方已记录的阶段，如模型加载），None表示新建
+            profile_mode: 函数级性能采样模式 'cprofile' 或 'pyinstrument'，None表示不采样
+            performance_profile: 性能档位（PERFORMANCE_PROFILES），决定抽帧间隔、标注视频、图表和关键帧分辨率；
+                                 模型和推理尺寸在创建分析器时按档位指定。None表示默认档位
             
         Returns:
             Dict[str, Any]: 综合分析结果
         """
-        print(f"开始分析患者 {patient_name} 的视频文件")
-        print(f"肩部选择: {shoulder_selection}")
+        if timer is None:
+            timer = StageTimer()
         
-        # 创建患者数据目录
-        patient_folder = f"{patient_id}-{patient_name}"
-        patient_folder = "".join(c for c in patient_folder if c.isalnum() or c in ('-', '_'))
+        if profile_mode:
+            # 采样结果保存到分析结果目录
+            with ProfileCapture(profile_mode, os.path.join(get_patient_folder_path(patient_id, patient_name),
+                                                           "analysis_results")) as profile:
+                comprehensive_result = self.analyze_patient_videos(
+                    patient_id, patient_name, video_paths, conf, iou, stop_check_func,
+                    patient_info, timeline_data, shoulder_selection, keypoint_stores, timer,
+                    performance_profile=performance_profile
+                )
+            if comprehensive_result:
+                comprehensive_result['performance']['profile_path'] = profile.output_path
+            return comprehensive_result
+        
+        timer.info.update(self.pose_detector.get_backend_info())
+        timer.info['threads'] = thread_budget.current().to_dict()
+        profile = get_performance_profile(performance_profile)
+        timer.info['performance_profile'] = profile['name']
+        video_mode = profile['video_output'] or VIDEO_OUTPUT_CONFIG['mode']
+        
+        logger.info(f"开始分析患者 {patient_name} 的视频文件")
+        logger.debug(f"肩部选择: {shoulder_selection}")
         
-        analysis_dir = os.path.join("patients_data", patient_folder, "analysis_results")
-        reports_dir = os.path.join("patients_data", patient_folder, "reports")
+        # 创建患者数据目录（与上传、下载接口使用同一数据目录）
+        patient_folder = get_patient_folder_path(patient_id, patient_name)
+        analysis_dir = os.path.join(patient_folder, "analysis_results")
+        reports_dir = os.path.join(patient_folder, "reports")
         
         os.makedirs(analysis_dir, exist_ok=True)
         os.makedirs(reports_dir, exist_ok=True)
         
-        # 分析各个角度的视频
-        analysis_results = {}
-        for angle, video_path in video_paths.items():
-            if video_path and os.path.exists(video_path):
-                # 检查是否需要停止
-                if stop_check_func and stop_check_func():
-                    print(f"分析被停止，正在处理{angle}角度视频")
-                    break
+        # 按全部角度估算内存，超出单任务预算时直接拒绝
+        memory_budget = MemoryBudget()
+        try:
+            memory_budget.check_estimate(estimate_job_mb(video_paths, timeline_data))
+        
+            # 分析各个角度的视频
+            analysis_results = {}
+            for angle, video_path in video_paths.items():
+                if video_path and os.path.exists(video_path):
+                    # 检查是否需要停止
+                    if stop_check_func and stop_check_func():
+                        logger.info(f"分析被停止，正在处理{angle}角度视频")
+                        break
                     
-                try:
-                    # 获取该角度的时间轴数据
-                    angle_timeline = None
-                    if timeline_data and angle in timeline_data:
-                        angle_timeline = timeline_data[angle]
-                        print(f"为{angle}角度设置时间轴数据: {angle_timeline}")
+                    try:
+                        # 获取该角度的时间轴数据
+                        angle_timeline = None
+                        if timeline_data and angle in timeline_data:
+                            angle_timeline = timeline_data[angle]
+                            logger.debug(f"为{angle}角度设置时间轴数据: {angle_timeline}")
                     
-                    result = self.analyze_video(video_path, angle, conf, iou, angle_timeline)
-                    analysis_results[angle] = result
-                except Exception as e:
-                    print(f"分析{angle}角度视频失败: {str(e)}")
-                    analysis_results[angle] = None
-        
-        # 检查是否需要停止
-        if stop_check_func and stop_check_func():
-            print("分析被停止，跳过后续处理")
-            return None
+                        keypoint_store = (keypoint_stores or {}).get(angle)
+                        # 使用患者姓名-角度的格式命名标注视频，先清理上次分析的旧文件
+                        output_path = os.path.join(analysis_dir, f"{patient_name}-{angle}.mp4")
+                        remove_annotated_videos(output_path)
+                        with job_context(angle=angle):
+                            if video_mode == 'eager':
+                                result = self.analyze_video(video_path, angle, conf, iou, angle_timeline,
+                                                            keypoint_store=keypoint_store,
+                                                            output_path=output_path, timer=timer,
+                                                            memory_budget=memory_budget,
+                                                            frame_stride=profile['frame_stride'],
+                                                            video_max_height=profile['video_max_height'],
+                                                            early_stop=profile['early_stop'],
+                                                            cycle_side=shoulder_selection)
+                            else:
+                                # 只保存关键点轨迹，标注视频在首次请求或后台渲染时生成
+                                result = self.analyze_video(video_path, angle, conf, iou, angle_timeline,
+                                                            keypoint_store=keypoint_store,
+                                                            track_path=get_track_path(output_path), timer=timer,
+                                                            memory_budget=memory_budget,
+                                                            frame_stride=profile['frame_stride'],
+                                                            video_max_height=profile['video_max_height'],
+                                                            early_stop=profile['early_stop'],
+                                                            cycle_side=shoulder_selection)
+                        analysis_results[angle] = result
+                    except MemoryBudgetExceeded:
+                        # 内存超出预算时终止整个任务，不再分析其余角度
+                        raise
+                    except Exception as e:
+                        logger.error(f"分析{angle}角度视频失败: {str(e)}")
+                        analysis_results[angle] = None
         
-        # 生成分析图表，传递肩部选择参数
-        charts_data = self.data_processor.generate_charts(analysis_results, patient_name, shoulder_selection)
+            # 各角度视频的帧数和处理帧率
+            timer.info['views'] = {angle: result['performance'] for angle, result in analysis_results.items() if result}
         
-        # 保存图表到文件
-        chart_paths = {}
-        for chart_name, chart_data in charts_data.items():
+            # 检查是否需要停止
             if stop_check_func and stop_check_func():
-                print("分析被停止，跳过图表生成")
-                break
+                logger.info("分析被停止，跳过后续处理")
+                return None
+        
+            # 生成分析图表，传递肩部选择参数
+            with timer.stage('charts'):
+                charts_data = self.data_processor.generate_charts(analysis_results, patient_name, shoulder_selection)
+        
+            # 保存图表到文件
+            chart_paths = {}
+            for chart_name, chart_data in charts_data.items():
+                if stop_check_func and stop_check_func():
+                    logger.info("分析被停止，跳过图表生成")
+                    break
                 
-            if chart_data:
-                chart_path = os.path.join(analysis_dir, f"{chart_name}.png")
-                chart_data.savefig(chart_path, dpi=300, bbox_inches='tight')
-                plt.close(chart_data)  # 修复：使用plt.close()而不是chart_data.close()
-                chart_paths[chart_name] = chart_path
-        
-        # 检查是否需要停止
-        if stop_check_func and stop_check_func():
-            print("分析被停止，跳过报告生成")
-            return None
+                if chart_data:
+                    chart_path = os.path.join(analysis_dir, f"{chart_name}.png")
+                    with timer.stage('charts'):
+                        chart_data.savefig(chart_path, dpi=profile['chart_dpi'], bbox_inches='tight')
+                    plt.close(chart_data)  # 修复：使用plt.close()而不是chart_data.close()
+                    chart_paths[chart_name] = chart_path
         
-        # 生成关键帧图片
-        keyframe_paths = {}
-        if stop_check_func and stop_check_func():
-            print("分析被停止，跳过关键帧图片生成")
-        else:
-            keyframe_paths = self.generate_keyframe_images(
-                analysis_results, video_paths, analysis_dir, shoulder_selection
-            )
+            # 检查是否需要停止
+            if stop_check_func and stop_check_func():
+                logger.info("分析被停止，跳过报告生成")
+                return None
         
-        # 生成分析报告
-        report_data = self.data_processor.process_analysis_data(
-            analysis_results, patient_name, patient_id, patient_info
-        )
+            # 生成关键帧图片
+            keyframe_paths = {}
+            if stop_check_func and stop_check_func():
+                logger.info("分析被停止，跳过关键帧图片生成")
+            else:
+                with timer.stage('keyframes'):
+                    keyframe_paths = self.generate_keyframe_images(
+                        analysis_results, video_paths, analysis_dir, shoulder_selection,
+                        keyframe_width=profile['keyframe_width']
+                    )
         
-        # 保存分析数据
+            # 生成分析报告
+            with timer.stage('report_data'):
+                report_data = self.data_processor.process_analysis_data(
+                    analysis_results, patient_name, patient_id, patient_info
+                )
+        
+            # 生成Word报告
+            with timer.stage('docx'):
+                report_path = self.report_generator.generate_report(
+                    report_data, reports_dir, patient_name, shoulder_selection
+                )
+        
+            # 图表和报告生成后再采样一次内存
+            memory_budget.sample(enforce=False)
+            timer.info['memory'] = memory_budget.summary()
+        finally:
+            # 停止、失败时也退出分摊
+            memory_budget.close()
+        
+        # 保存分析数据（包含各阶段耗时）
         data_path = os.path.join(analysis_dir, "analysis_data.json")
-        # 转换numpy类型为Python原生类型，确保JSON序列化成功
-        serializable_data = convert_numpy_types(report_data)
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump(serializable_data, f, ensure_ascii=False, indent=2)
-        
-        # 生成Word报告
-        report_path = self.report_generator.generate_report(
-            report_data, reports_dir, patient_name, shoulder_selection
-        )
+        with timer.stage('json_dump'):
+            # 转换numpy类型为Python原生类型，确保JSON序列化成功
+            serializable_data = convert_numpy_types(report_data)
+            serializable_data['performance'] = convert_numpy_types(timer.summary())
+            with open(data_path, 'w', encoding='utf-8') as f:
+                json.dump(serializable_data, f, ensure_ascii=False, indent=2)
         
-        # 保存标注后的视频
+        # 标注视频已在分析过程中编码保存，或将按关键点轨迹延迟渲染
         video_output_paths = {}
+        video_preview_paths = {}
+        track_paths = {}
         for angle, result in analysis_results.items():
-            if result and result.get('annotated_frames'):
-                # 使用患者姓名-角度的格式命名标注视频
-                output_path = os.path.join(analysis_dir, f"{patient_name}-{angle}.avi")
-                self.save_annotated_video(result['annotated_frames'], output_path, result['fps'])
+            video_output = (result or {}).get('video_output') or {}
+            if video_output.get('video'):
+                video_output_paths[angle] = video_output['video']
+            if video_output.get('preview'):
+                video_preview_paths[angle] = video_output['preview']
+            if (result or {}).get('track_path'):
+                track_paths[angle] = result['track_path']
+                if video_mode == 'none':
+                    continue
+                output_path = get_rendered_video_path(os.path.join(analysis_dir, f"{patient_name}-{angle}.mp4"))
                 video_output_paths[angle] = output_path
+                if VIDEO_OUTPUT_CONFIG['build_preview'] and output_path.endswith('.mp4'):
+                    video_preview_paths[angle] = get_preview_path(output_path)
         
         # 综合结果
         comprehensive_result = {
@@ -293,40 +1067,37 @@ class VideoAnalyzer:
             'analysis_results': analysis_results,
             'chart_paths': chart_paths,
             'video_output_paths': video_output_paths,
+            'video_preview_paths': video_preview_paths,
+            'track_paths': track_paths,
             'keyframe_paths': keyframe_paths,  # 添加关键帧图片路径
             'report_data': report_data,
             'report_path': report_path,
+            'performance': timer.summary(),
             'analysis_time': datetime.now().isoformat()
         }
         
-        print(f"患者 {patient_name} 的视频分析完成")
+        logger.info(f"患者 {patient_name} 的视频分析完成")
         return comprehensive_result
     
-    def save_annotated_video(self, frames: List[np.ndarray], output_path: str, fps: float) -> None:
+    def save_annotated_video(self, frames: List[np.ndarray], output_path: str, fps: float) -> Dict[str, Optional[str]]:
         """
         保存标注后的视频
         
         Args:
             frames: 标注后的帧列表
-            output_path: 输出视频路径
+            output_path: 输出视频路径（扩展名由VIDEO_OUTPUT_CONFIG的输出格式决定）
             fps: 帧率
+            
+        Returns:
+            Dict[str, Optional[str]]: {'video': 视频路径, 'preview': 预览视频路径}
         """
         if not frames:
-            return
-        
-        height, width = frames[0].shape[:2]
-        
-        # 使用XVID编码器保存AVI格式视频
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            return {'video': None, 'preview': None}
         
-        # 写入所有帧
+        writer = AnnotatedVideoWriter(output_path, fps)
         for frame in frames:
-            out.write(frame)
-        
-        out.release()
-        print(f"标注视频已保存: {output_path}")
-        print(f"视频信息: {len(frames)}帧, 帧率: {fps:.2f} FPS, 时长: {len(frames)/fps:.2f}秒")
+            writer.write(frame)
+        return writer.close()
 
     def _draw_chinese_text(self, image: np.ndarray, text: str, position: Tuple[int, int], 
                           font_size: int = 30, color: Tuple[int, int, int] = (255, 255, 255)) -> np.ndarray:
@@ -351,32 +1122,7 @@ class VideoAnalyzer:
             # 创建绘图对象
             draw = ImageDraw.Draw(pil_image)
             
-            # 尝试加载中文字体，按优先级尝试
-            font = None
-            font_paths = [
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Medium.ttc",  # Noto Sans CJK
-                "/usr/share/fonts/opentype/noto/NotoSerifCJK-Bold.ttc",   # Noto Serif CJK
-                "/usr/share/fonts/truetype/arphic/ukai.ttc",              # AR PL UKai
-                "/usr/share/fonts/truetype/arphic/uming.ttc",             # AR PL UMing
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",        # DejaVu Sans
-                "/System/Library/Fonts/Arial.ttf",                        # macOS Arial
-                "C:/Windows/Fonts/arial.ttf",                             # Windows Arial
-            ]
-            
-            for font_path in font_paths:
-                try:
-                    if os.path.exists(font_path):
-                        font = ImageFont.truetype(font_path, font_size)
-                        print(f"成功加载字体: {font_path}")
-                        break
-                except Exception as e:
-                    print(f"加载字体失败 {font_path}: {e}")
-                    continue
-            
-            # 如果所有字体都加载失败，使用默认字体
-            if font is None:
-                print("使用默认字体")
-                font = ImageFont.load_default()
+            font = _load_label_font(font_size)
             
             # 绘制文字
             draw.text(position, text, font=font, fill=color)
@@ -386,7 +1132,7 @@ class VideoAnalyzer:
             return image_bgr
             
         except Exception as e:
-            print(f"绘制中文文字失败: {str(e)}")
+            logger.error(f"绘制中文文字失败: {str(e)}")
             # 如果失败，使用OpenCV的英文文字
             cv2.putText(image, text, position, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
             return image
@@ -416,7 +1162,8 @@ class VideoAnalyzer:
         return resized_image
 
     def generate_keyframe_images(self, analysis_results: Dict[str, Any], video_paths: Dict[str, str], 
-                               analysis_dir: str, shoulder_selection: str = 'left') -> Dict[str, str]:
+                               analysis_dir: str, shoulder_selection: str = 'left',
+                               keyframe_width: int = 800) -> Dict[str, str]:
         """
         生成关键帧图片
         
@@ -425,6 +1172,7 @@ class VideoAnalyzer:
             video_paths: 视频文件路径字典
             analysis_dir: 分析结果保存目录
             shoulder_selection: 肩部选择，'left'表示左肩，'right'表示右肩
+            keyframe_width: 左右拼接关键帧图片的宽度（像素），单帧图片按比例缩小
             
         Returns:
             Dict[str, str]: 生成的图片路径字典
@@ -439,7 +1187,7 @@ class VideoAnalyzer:
                 
                 if front_result.get('angle_data') and os.path.exists(front_video_path):
                     keyframe_path = self._generate_max_abduction_image(
-                        front_result, front_video_path, analysis_dir
+                        front_result, front_video_path, analysis_dir, keyframe_width
                     )
                     if keyframe_path:
                         keyframe_paths['max_abduction_image'] = keyframe_path
@@ -451,7 +1199,8 @@ class VideoAnalyzer:
                 
                 if side_result.get('angle_data') and os.path.exists(side_video_path):
                     keyframe_path = self._generate_max_flexion_image(
-                        side_result, side_video_path, analysis_dir, shoulder_selection
+                        side_result, side_video_path, analysis_dir, shoulder_selection,
+                        keyframe_width * 3 // 8
                     )
                     if keyframe_path:
                         keyframe_paths['max_flexion_image'] = keyframe_path
@@ -463,18 +1212,19 @@ class VideoAnalyzer:
                 
                 if back_result.get('wrist_height_data') and os.path.exists(back_video_path):
                     keyframe_path = self._generate_max_wrist_height_image(
-                        back_result, back_video_path, analysis_dir
+                        back_result, back_video_path, analysis_dir, keyframe_width
                     )
                     if keyframe_path:
                         keyframe_paths['max_wrist_height_image'] = keyframe_path
                         
         except Exception as e:
-            print(f"生成关键帧图片时出错: {str(e)}")
+            logger.error(f"生成关键帧图片时出错: {str(e)}")
         
         return keyframe_paths
     
     def _generate_max_abduction_image(self, front_result: Dict[str, Any], 
-                                    video_path: str, analysis_dir: str) -> Optional[str]:
+                                    video_path: str, analysis_dir: str,
+                                    target_width: int = 800) -> Optional[str]:
         """
         生成最大外展角角度视图
         
@@ -482,6 +1232,7 @@ class VideoAnalyzer:
             front_result: 正面分析结果
             video_path: 正面视频路径
             analysis_dir: 分析结果目录
+            target_width: 图片宽度（像素）
             
         Returns:
             Optional[str]: 生成的图片路径
@@ -528,22 +1279,22 @@ class VideoAnalyzer:
                 combined_frame = self._draw_chinese_text(combined_frame, f"右肩最大外展角: {right_max_frame['right_angle']:.1f}°", (width + 10, 30))
                 
                 # 调整图片尺寸适合Word文档
-                combined_frame = self._resize_image_for_word(combined_frame, target_width=800)
+                combined_frame = self._resize_image_for_word(combined_frame, target_width=target_width)
                 
                 # 保存图片
                 output_path = os.path.join(analysis_dir, "max_abduction_angles.png")
                 cv2.imwrite(output_path, combined_frame)
-                print(f"最大外展角角度视图已保存: {output_path}")
+                logger.info(f"最大外展角角度视图已保存: {output_path}")
                 return output_path
                 
         except Exception as e:
-            print(f"生成最大外展角角度视图失败: {str(e)}")
+            logger.error(f"生成最大外展角角度视图失败: {str(e)}")
         
         return None
     
     def _generate_max_flexion_image(self, side_result: Dict[str, Any], 
                                   video_path: str, analysis_dir: str, 
-                                  shoulder_selection: str) -> Optional[str]:
+                                  shoulder_selection: str, target_width: int = 300) -> Optional[str]:
         """
         生成最大前屈角角度视图
         
@@ -552,6 +1303,7 @@ class VideoAnalyzer:
             video_path: 侧面视频路径
             analysis_dir: 分析结果目录
             shoulder_selection: 肩部选择
+            target_width: 图片宽度（像素）
             
         Returns:
             Optional[str]: 生成的图片路径
@@ -590,21 +1342,22 @@ class VideoAnalyzer:
                 frame = self._draw_chinese_text(frame, f"{shoulder_text}最大前屈角: {max_angle:.1f}°", (10, 30))
                 
                 # 调整图片尺寸适合Word文档
-                frame = self._resize_image_for_word(frame, target_width=300)
+                frame = self._resize_image_for_word(frame, target_width=target_width)
                 
                 # 保存图片
                 output_path = os.path.join(analysis_dir, "max_flexion_angle.png")
                 cv2.imwrite(output_path, frame)
-                print(f"最大前屈角角度视图已保存: {output_path}")
+                logger.info(f"最大前屈角角度视图已保存: {output_path}")
                 return output_path
                 
         except Exception as e:
-            print(f"生成最大前屈角角度视图失败: {str(e)}")
+            logger.error(f"生成最大前屈角角度视图失败: {str(e)}")
         
         return None
     
     def _generate_max_wrist_height_image(self, back_result: Dict[str, Any], 
-                                       video_path: str, analysis_dir: str) -> Optional[str]:
+                                       video_path: str, analysis_dir: str,
+                                       target_width: int = 800) -> Optional[str]:
         """
         生成左右腕部最大高度比图
         
@@ -612,6 +1365,7 @@ class VideoAnalyzer:
             back_result: 背面分析结果
             video_path: 背面视频路径
             analysis_dir: 分析结果目录
+            target_width: 图片宽度（像素）
             
         Returns:
             Optional[str]: 生成的图片路径
@@ -658,15 +1412,15 @@ class VideoAnalyzer:
                 combined_frame = self._draw_chinese_text(combined_frame, f"右腕最大高度: {right_max_frame['right_wrist_height']:.2f}", (width + 10, 30))
                 
                 # 调整图片尺寸适合Word文档
-                combined_frame = self._resize_image_for_word(combined_frame, target_width=800)
+                combined_frame = self._resize_image_for_word(combined_frame, target_width=target_width)
                 
                 # 保存图片
                 output_path = os.path.join(analysis_dir, "max_wrist_heights.png")
                 cv2.imwrite(output_path, combined_frame)
-                print(f"左右腕部最大高度比图已保存: {output_path}")
+                logger.info(f"左右腕部最大高度比图已保存: {output_path}")
                 return output_path
                 
         except Exception as e:
-            print(f"生成左右腕部最大高度比图失败: {str(e)}")
+            logger.error(f"生成左右腕部最大高度比图失败: {str(e)}")
         
         return None
\ No newline at end of file
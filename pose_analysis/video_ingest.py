@@ -0,0 +1,503 @@
+"""
+视频预处理模块
+负责上传后的视频探测、关键帧索引构建以及分析代理视频转码
+"""
+
+import os
+import json
+import bisect
+import shutil
+import subprocess
+from datetime import datetime
+from fractions import Fraction
+from typing import Dict, List, Optional, Any
+
+import cv2
+import numpy as np
+
+from .config import INGEST_CONFIG
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_VERSION = 1
+
+
+def get_index_path(video_path: str) -> str:
+    """
+    获取视频索引文件路径
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        str: 索引文件路径，例如 videos/front_index.json
+    """
+    base, _ = os.path.splitext(video_path)
+    return base + INGEST_CONFIG['index_suffix']
+
+
+def get_proxy_path(video_path: str) -> str:
+    """
+    获取分析代理视频路径
+
+    Args:
+        video_path: 原始视频文件路径
+
+    Returns:
+        str: 代理视频路径，例如 videos/front_proxy.mp4
+    """
+    base, _ = os.path.splitext(video_path)
+    return base + INGEST_CONFIG['proxy_suffix']
+
+
+def get_sprite_path(video_path: str) -> str:
+    """
+    获取缩略图拼图路径
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        str: 拼图路径，例如 videos/front_sprite.jpg
+    """
+    base, _ = os.path.splitext(video_path)
+    return base + INGEST_CONFIG['sprite_suffix']
+
+
+def get_file_signature(video_path: str) -> Dict[str, Any]:
+    """
+    获取文件签名（大小与修改时间），用于判断索引是否过期
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        Dict[str, Any]: 文件签名
+    """
+    stat = os.stat(video_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """解析ffprobe的帧率字符串，例如 '30000/1001'"""
+    try:
+        if not rate or rate == '0/0':
+            return 0.0
+        return float(Fraction(rate))
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _run_ffprobe(args: List[str]) -> Optional[Dict[str, Any]]:
+    """执行ffprobe并解析JSON输出，不可用时返回None"""
+    ffprobe = INGEST_CONFIG['ffprobe_path']
+    if not shutil.which(ffprobe):
+        return None
+
+    try:
+        completed = subprocess.run(
+            [ffprobe, '-v', 'error', '-of', 'json'] + args,
+            capture_output=True, check=True, timeout=300
+        )
+        return json.loads(completed.stdout.decode('utf-8') or '{}')
+    except (subprocess.SubprocessError, ValueError) as e:
+        logger.error(f"ffprobe执行失败: {str(e)}")
+        return None
+
+
+def probe_video(video_path: str) -> Optional[Dict[str, Any]]:
+    """
+    探测视频元数据，优先使用ffprobe，不可用时退回OpenCV
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        Optional[Dict[str, Any]]: 视频元数据，无法打开时返回None
+    """
+    if not os.path.exists(video_path):
+        return None
+
+    probe = _run_ffprobe([
+        '-select_streams', 'v:0',
+        '-show_entries',
+        'stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration'
+        ':stream_tags=rotate:format=format_name,duration',
+        video_path
+    ])
+
+    if probe and probe.get('streams'):
+        stream = probe['streams'][0]
+        avg_fps = _parse_rate(stream.get('avg_frame_rate'))
+        nominal_fps = _parse_rate(stream.get('r_frame_rate'))
+        fps = avg_fps or nominal_fps
+        duration = float(stream.get('duration') or probe.get('format', {}).get('duration') or 0)
+        frame_count = int(stream.get('nb_frames') or 0) or int(round(duration * fps))
+
+        return {
+            'width': int(stream.get('width') or 0),
+            'height': int(stream.get('height') or 0),
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration': duration,
+            'file_size': os.path.getsize(video_path),
+            'codec': stream.get('codec_name', ''),
+            'container': probe.get('format', {}).get('format_name', ''),
+            'rotation': int(stream.get('tags', {}).get('rotate', 0) or 0),
+            # 平均帧率与标称帧率不一致说明是可变帧率视频（手机录制常见）
+            'is_vfr': bool(avg_fps and nominal_fps and abs(avg_fps - nominal_fps) > 0.01),
+            'source': 'ffprobe'
+        }
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    info = {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'duration': 0,
+        'file_size': os.path.getsize(video_path),
+        'codec': ''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00'),
+        'container': os.path.splitext(video_path)[1].lstrip('.').lower(),
+        'rotation': 0,
+        'is_vfr': False,
+        'source': 'opencv'
+    }
+    cap.release()
+
+    if info['fps'] > 0:
+        info['duration'] = info['frame_count'] / info['fps']
+
+    return info
+
+
+def build_seek_index(video_path: str, fps: float) -> List[Dict[str, Any]]:
+    """
+    构建关键帧索引，用于快速定位到任意帧
+
+    Args:
+        video_path: 视频文件路径
+        fps: 视频帧率
+
+    Returns:
+        List[Dict[str, Any]]: 关键帧列表 [{'frame': 帧号, 'time': 秒}]，按帧号升序
+    """
+    probe = _run_ffprobe([
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-show_entries', 'frame=best_effort_timestamp_time',
+        video_path
+    ])
+
+    keyframes = []
+    if probe and fps > 0:
+        for frame in probe.get('frames', []):
+            try:
+                timestamp = float(frame.get('best_effort_timestamp_time'))
+            except (TypeError, ValueError):
+                continue
+            keyframes.append({'frame': int(round(timestamp * fps)), 'time': timestamp})
+
+    # 至少保证从第0帧开始可以顺序定位
+    if not keyframes or keyframes[0]['frame'] != 0:
+        keyframes.insert(0, {'frame': 0, 'time': 0.0})
+
+    keyframes.sort(key=lambda k: k['frame'])
+    return keyframes
+
+
+def transcode_proxy(video_path: str, output_path: str) -> bool:
+    """
+    转码生成分析代理视频：限制分辨率、恒定帧率、短GOP
+
+    Args:
+        video_path: 原始视频路径
+        output_path: 代理视频输出路径
+
+    Returns:
+        bool: 转码是否成功
+    """
+    ffmpeg = INGEST_CONFIG['ffmpeg_path']
+    if not shutil.which(ffmpeg):
+        logger.warning("未找到ffmpeg，跳过代理视频转码")
+        return False
+
+    max_height = INGEST_CONFIG['proxy_max_height']
+    gop = INGEST_CONFIG['proxy_gop']
+    temp_path = output_path + '.tmp.mp4'
+
+    command = [
+        ffmpeg, '-y', '-v', 'error',
+        '-i', video_path,
+        '-an',
+        '-vf', f"scale=-2:'min({max_height},ih)',fps={INGEST_CONFIG['proxy_fps']}",
+        '-c:v', 'libx264',
+        '-preset', INGEST_CONFIG['proxy_preset'],
+        '-crf', str(INGEST_CONFIG['proxy_crf']),
+        '-pix_fmt', 'yuv420p',
+        '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-movflags', '+faststart',
+        temp_path
+    ]
+
+    try:
+        subprocess.run(command, capture_output=True, check=True, timeout=1800)
+        os.replace(temp_path, output_path)
+        return True
+    except subprocess.SubprocessError as e:
+        logger.error(f"代理视频转码失败: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+def build_sprite_sheet(video_path: str, output_path: str, fps: float,
+                       duration: float) -> Optional[Dict[str, Any]]:
+    """
+    生成缩略图拼图，供时间轴拖动时预览
+
+    Args:
+        video_path: 视频文件路径
+        output_path: 拼图输出路径
+        fps: 视频帧率
+        duration: 视频时长（秒）
+
+    Returns:
+        Optional[Dict[str, Any]]: 拼图元数据，生成失败时返回None
+    """
+    if fps <= 0 or duration <= 0:
+        return None
+
+    interval = INGEST_CONFIG['sprite_interval']
+    max_thumbs = INGEST_CONFIG['sprite_max_thumbs']
+    if duration / interval > max_thumbs:
+        interval = duration / max_thumbs
+
+    thumb_width = INGEST_CONFIG['sprite_thumb_width']
+    columns = INGEST_CONFIG['sprite_columns']
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+
+    thumbs = []
+    frame_number = 0
+    next_time = 0.0
+    thumb_height = None
+    try:
+        # 顺序grab，只在需要的帧上解码像素
+        while cap.grab():
+            if frame_number >= int(round(next_time * fps)):
+                ret, frame = cap.retrieve()
+                if ret:
+                    if thumb_height is None:
+                        height, width = frame.shape[:2]
+                        thumb_height = max(1, int(round(height * thumb_width / width)))
+                    thumbs.append(cv2.resize(frame, (thumb_width, thumb_height),
+                                             interpolation=cv2.INTER_AREA))
+                next_time += interval
+            frame_number += 1
+    finally:
+        cap.release()
+
+    if not thumbs:
+        return None
+
+    rows = (len(thumbs) + columns - 1) // columns
+    sheet = np.zeros((rows * thumb_height, columns * thumb_width, 3), dtype=np.uint8)
+    for i, thumb in enumerate(thumbs):
+        row, col = divmod(i, columns)
+        sheet[row * thumb_height:(row + 1) * thumb_height,
+              col * thumb_width:(col + 1) * thumb_width] = thumb
+
+    cv2.imwrite(output_path, sheet, [cv2.IMWRITE_JPEG_QUALITY, 70])
+
+    return {
+        'file': os.path.basename(output_path),
+        'interval': interval,
+        'count': len(thumbs),
+        'columns': columns,
+        'thumb_width': thumb_width,
+        'thumb_height': thumb_height
+    }
+
+
+def load_video_index(video_path: str) -> Optional[Dict[str, Any]]:
+    """
+    加载视频索引，索引不存在或与视频文件不匹配时返回None
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        Optional[Dict[str, Any]]: 索引数据（包含metadata与keyframes）
+    """
+    index_path = get_index_path(video_path)
+    if not os.path.exists(index_path) or not os.path.exists(video_path):
+        return None
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('version') != INDEX_VERSION:
+        return None
+
+    signature = get_file_signature(video_path)
+    stored = index.get('signature', {})
+    if stored.get('size') != signature['size'] or abs(stored.get('mtime', 0) - signature['mtime']) > 1e-3:
+        return None
+
+    return index
+
+
+def write_video_index(video_path: str, metadata: Dict[str, Any],
+                      keyframes: List[Dict[str, Any]],
+                      sprite: Optional[Dict[str, Any]] = None) -> str:
+    """
+    写入视频索引文件
+
+    Args:
+        video_path: 视频文件路径
+        metadata: 视频元数据
+        keyframes: 关键帧列表
+        sprite: 缩略图拼图元数据
+
+    Returns:
+        str: 索引文件路径
+    """
+    index_path = get_index_path(video_path)
+    index = {
+        'version': INDEX_VERSION,
+        'signature': get_file_signature(video_path),
+        'metadata': metadata,
+        'keyframes': keyframes,
+        'sprite': sprite,
+        'created_at': datetime.now().isoformat()
+    }
+
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+def remove_ingest_artifacts(video_path: str) -> None:
+    """
+    删除视频对应的索引与代理视频
+
+    Args:
+        video_path: 原始视频路径
+    """
+    proxy_path = get_proxy_path(video_path)
+    for path in (get_index_path(video_path), get_sprite_path(video_path),
+                 proxy_path, get_index_path(proxy_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def nearest_keyframe(keyframes: List[Dict[str, Any]], frame_number: int) -> int:
+    """
+    查找不晚于目标帧的最近关键帧
+
+    Args:
+        keyframes: 关键帧列表（按帧号升序）
+        frame_number: 目标帧号
+
+    Returns:
+        int: 关键帧帧号
+    """
+    if not keyframes:
+        return 0
+
+    frames = [k['frame'] for k in keyframes]
+    position = bisect.bisect_right(frames, frame_number) - 1
+    return frames[position] if position >= 0 else 0
+
+
+def seek_to_frame(cap: cv2.VideoCapture, frame_number: int,
+                  keyframes: Optional[List[Dict[str, Any]]] = None) -> None:
+    """
+    将视频定位到指定帧：先跳到最近的关键帧，再用grab()跳过剩余帧（不做像素转换）
+
+    Args:
+        cap: 已打开的视频对象（位于第0帧）
+        frame_number: 目标帧号
+        keyframes: 关键帧列表，为None时从当前位置顺序跳过
+    """
+    if frame_number <= 0:
+        return
+
+    start = 0
+    if keyframes:
+        start = nearest_keyframe(keyframes, frame_number)
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    for _ in range(frame_number - start):
+        if not cap.grab():
+            break
+
+
+class VideoIngestor:
+    """视频预处理器类"""
+
+    def ingest(self, video_path: str, build_proxy: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        预处理单个视频：探测元数据、构建关键帧索引、可选转码代理视频
+
+        Args:
+            video_path: 视频文件路径
+            build_proxy: 是否生成代理视频，None表示使用INGEST_CONFIG配置
+
+        Returns:
+            Dict[str, Any]: 预处理结果 {'metadata', 'index_path', 'proxy_path', 'proxy_metadata'}
+        """
+        if build_proxy is None:
+            build_proxy = INGEST_CONFIG['build_proxy']
+
+        metadata = probe_video(video_path)
+        if metadata is None:
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+
+        keyframes = build_seek_index(video_path, metadata['fps'])
+        metadata['keyframe_count'] = len(keyframes)
+
+        sprite = None
+        if INGEST_CONFIG['build_sprite']:
+            sprite = build_sprite_sheet(video_path, get_sprite_path(video_path),
+                                        metadata['fps'], metadata['duration'])
+        index_path = write_video_index(video_path, metadata, keyframes, sprite)
+
+        result = {
+            'metadata': metadata,
+            'index_path': index_path,
+            'proxy_path': None,
+            'proxy_metadata': None
+        }
+
+        proxy_path = get_proxy_path(video_path)
+        if build_proxy and transcode_proxy(video_path, proxy_path):
+            proxy_metadata = probe_video(proxy_path)
+            if proxy_metadata:
+                proxy_keyframes = build_seek_index(proxy_path, proxy_metadata['fps'])
+                proxy_metadata['keyframe_count'] = len(proxy_keyframes)
+                write_video_index(proxy_path, proxy_metadata, proxy_keyframes)
+                result['proxy_path'] = proxy_path
+                result['proxy_metadata'] = proxy_metadata
+        elif os.path.exists(proxy_path):
+            # 旧的代理视频已与新上传的视频不匹配
+            os.remove(proxy_path)
+
+        logger.info(f"视频预处理完成: {video_path}, "
+                    f"{metadata['width']}x{metadata['height']} @ {metadata['fps']:.2f}fps, "
+                    f"{metadata['frame_count']}帧, 关键帧{len(keyframes)}个")
+        return result
@@ -0,0 +1,239 @@
+"""
+标注视频写入模块
+逐帧编码标注视频：优先通过ffmpeg管道输出H.264分片MP4，不可用时回退为XVID AVI
+"""
+
+import os
+import shutil
+import subprocess
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from .config import VIDEO_OUTPUT_CONFIG
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_preview_path(output_path: str) -> str:
+    """
+    获取预览视频路径
+
+    Args:
+        output_path: 标注视频路径
+
+    Returns:
+        str: 预览视频路径，例如 张三-front_preview.mp4
+    """
+    base, ext = os.path.splitext(output_path)
+    return base + VIDEO_OUTPUT_CONFIG['preview_suffix'] + ext
+
+
+def get_track_path(output_path: str) -> str:
+    """
+    获取标注视频对应的关键点轨迹文件路径
+
+    Args:
+        output_path: 标注视频路径（任意扩展名）
+
+    Returns:
+        str: 轨迹文件路径，例如 张三-front_track.npz
+    """
+    base, _ = os.path.splitext(output_path)
+    return base + VIDEO_OUTPUT_CONFIG['track_suffix']
+
+
+def resolve_output_format(output_format: Optional[str] = None) -> str:
+    """
+    确定实际使用的输出格式（配置为mp4但未安装ffmpeg时回退为avi）
+
+    Args:
+        output_format: 'mp4' 或 'avi'，None表示使用VIDEO_OUTPUT_CONFIG配置
+
+    Returns:
+        str: 'mp4' 或 'avi'
+    """
+    if output_format is None:
+        output_format = VIDEO_OUTPUT_CONFIG['format']
+    if output_format == 'mp4' and not shutil.which(VIDEO_OUTPUT_CONFIG['ffmpeg_path']):
+        return 'avi'
+    return output_format
+
+
+def _scale_filter(max_height: Optional[int]) -> Optional[str]:
+    """生成限制最大高度的缩放滤镜（保持宽高比，宽高取偶数）"""
+    if not max_height:
+        return None
+    return f"scale=-2:trunc(min(ih\\,{int(max_height)})/2)*2"
+
+
+class AnnotatedVideoWriter:
+    """标注视频写入器（逐帧写入，无需缓存全部帧）"""
+
+    def __init__(self, output_path: str, fps: float, output_format: Optional[str] = None,
+                 build_preview: Optional[bool] = None, max_height: Optional[int] = None):
+        """
+        初始化写入器，首帧写入时才启动编码器
+
+        Args:
+            output_path: 输出路径（扩展名由输出格式决定）
+            fps: 帧率
+            output_format: 'mp4' 或 'avi'，None表示使用VIDEO_OUTPUT_CONFIG配置
+            build_preview: 是否生成预览版本（仅mp4），None表示使用配置
+            max_height: 输出最大高度，0表示保持原分辨率，None表示使用配置
+        """
+        if build_preview is None:
+            build_preview = VIDEO_OUTPUT_CONFIG['build_preview']
+
+        resolved_format = resolve_output_format(output_format)
+        if resolved_format != (output_format or VIDEO_OUTPUT_CONFIG['format']):
+            logger.warning("未找到ffmpeg，标注视频回退为AVI格式")
+        output_format = resolved_format
+
+        base, _ = os.path.splitext(output_path)
+        self.output_format = output_format
+        self.output_path = f"{base}.{output_format}"
+        self.preview_path = get_preview_path(self.output_path) if output_format == 'mp4' and build_preview else None
+        self.fps = fps if fps > 0 else 30.0
+        self.max_height = VIDEO_OUTPUT_CONFIG['max_height'] if max_height is None else max_height
+        self.frame_count = 0
+        self.failed = False
+
+        self._process: Optional[subprocess.Popen] = None
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._frame_size = None
+
+    def _temp_path(self, path: str) -> str:
+        """编码过程中写入临时文件，完成后再替换，避免读到不完整的视频"""
+        return path + '.tmp'
+
+    def _open(self, width: int, height: int) -> None:
+        """按首帧尺寸启动编码器"""
+        self._frame_size = (width, height)
+
+        if self.output_format == 'avi':
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            self._writer = cv2.VideoWriter(self._temp_path(self.output_path), fourcc, self.fps, (width, height))
+            return
+
+        gop = max(1, int(round(self.fps * VIDEO_OUTPUT_CONFIG['gop_seconds'])))
+        # 分片MP4：moov在文件头、每个关键帧开始一个分片，浏览器下载到哪里就能播放到哪里
+        encode_args = [
+            '-c:v', 'libx264',
+            '-preset', VIDEO_OUTPUT_CONFIG['preset'],
+            '-pix_fmt', 'yuv420p',
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-movflags', '+frag_keyframe+empty_moov+default_base_moof+faststart',
+            '-f', 'mp4'
+        ]
+
+        command = [
+            VIDEO_OUTPUT_CONFIG['ffmpeg_path'], '-y', '-v', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f"{width}x{height}", '-r', f"{self.fps:.6f}",
+            '-i', '-',
+            '-map', '0:v'
+        ]
+        scale = _scale_filter(self.max_height)
+        if scale:
+            command += ['-vf', scale]
+        command += ['-crf', str(VIDEO_OUTPUT_CONFIG['crf'])] + encode_args + [self._temp_path(self.output_path)]
+
+        if self.preview_path:
+            command += ['-map', '0:v', '-vf', _scale_filter(VIDEO_OUTPUT_CONFIG['preview_height']),
+                        '-crf', str(VIDEO_OUTPUT_CONFIG['preview_crf'])]
+            command += encode_args + [self._temp_path(self.preview_path)]
+
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        写入一帧
+
+        Args:
+            frame: BGR图像
+        """
+        if self.failed:
+            return
+
+        height, width = frame.shape[:2]
+        if self._frame_size is None:
+            self._open(width, height)
+        elif (width, height) != self._frame_size:
+            frame = cv2.resize(frame, self._frame_size)
+
+        if self._writer is not None:
+            self._writer.write(frame)
+        else:
+            try:
+                self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+            except (BrokenPipeError, OSError) as e:
+                logger.error(f"标注视频编码进程异常退出: {str(e)}")
+                self.failed = True
+                return
+        self.frame_count += 1
+
+    def close(self) -> Dict[str, Optional[str]]:
+        """
+        结束编码
+
+        Returns:
+            Dict[str, Optional[str]]: {'video': 视频路径, 'preview': 预览视频路径}，失败或无帧时路径为None
+        """
+        outputs = [self.output_path] + ([self.preview_path] if self.preview_path else [])
+
+        if self._writer is not None:
+            self._writer.release()
+        elif self._process is not None:
+            try:
+                self._process.stdin.close()
+            except (BrokenPipeError, OSError):
+                self.failed = True
+            error = self._process.stderr.read().decode('utf-8', errors='ignore').strip()
+            if self._process.wait() != 0:
+                logger.error(f"标注视频编码失败: {error}")
+                self.failed = True
+
+        if self.failed or self.frame_count == 0:
+            for path in outputs:
+                if os.path.exists(self._temp_path(path)):
+                    os.remove(self._temp_path(path))
+            return {'video': None, 'preview': None}
+
+        for path in outputs:
+            os.replace(self._temp_path(path), path)
+
+        logger.info(f"标注视频已保存: {self.output_path}")
+        logger.debug(f"视频信息: {self.frame_count}帧, 帧率: {self.fps:.2f} FPS, 时长: {self.frame_count/self.fps:.2f}秒")
+        return {'video': self.output_path, 'preview': self.preview_path}
+
+    def __enter__(self) -> 'AnnotatedVideoWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.failed = True
+        self.close()
+
+
+def remove_annotated_videos(output_path: str) -> None:
+    """
+    删除标注视频的各种格式、预览版本及关键点轨迹（重新分析前清理旧文件）
+
+    Args:
+        output_path: 标注视频路径（任意扩展名）
+    """
+    track_path = get_track_path(output_path)
+    if os.path.exists(track_path):
+        os.remove(track_path)
+
+    base, _ = os.path.splitext(output_path)
+    for ext in ('mp4', 'avi'):
+        path = f"{base}.{ext}"
+        for candidate in (path, get_preview_path(path)):
+            if os.path.exists(candidate):
+                os.remove(candidate)
@@ -19,6 +19,13 @@ document.addEventListener('DOMContentLoaded', function() {
         side: { start: 0, end: 0, duration: 0, isDragging: false, dragHandle: null },
         back: { start: 0, end: 0, duration: 0, isDragging: false, dragHandle: null }
     };
+    
+    // 时间轴缩略图拼图信息（拖动时预览）
+    let timelineSprites = {
+        front: null,
+        side: null,
+        back: null
+    };
 
     // 初始化页面
     initializePage();
@@ -617,6 +624,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const analysisType = document.getElementById('analysisType').value;
         const confidenceThreshold = document.getElementById('confidenceThreshold').value;
         const shoulderSelection = document.getElementById('shoulderSelection').value; // 新增：获取肩部选择
+        const performanceProfile = document.getElementById('performanceProfile').value;
         
         // 获取时间轴数据
         const timelineData = getTimelineDataForAnalysis();
@@ -630,6 +638,9 @@ document.addEventListener('DOMContentLoaded', function() {
             shoulderSelection: shoulderSelection, // 新增：传递肩部选择参数
             timelineData: timelineData
         };
+        if (performanceProfile) {
+            analysisData.performanceProfile = performanceProfile;
+        }
         
         console.log('开始分析，参数:', analysisData);
         
@@ -1039,7 +1050,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                 </div>
                             </div>
                             <div class="chart-container">
-                                <img src="${path}?t=${Date.now()}" alt="${displayName}" class="analysis-chart-img" 
+                                <img src="${path}" alt="${displayName}" class="analysis-chart-img" 
                                      onload="this.parentElement.classList.add('loaded')" 
                                      onerror="this.parentElement.classList.add('error'); this.style.display='none'; this.nextElementSibling.style.display='block';">
                                 <div class="chart-loading" style="display: none;">
@@ -1063,14 +1074,21 @@ document.addEventListener('DOMContentLoaded', function() {
         // 显示标注视频
         if (analysisResult.videoOutputPaths && Object.keys(analysisResult.videoOutputPaths).length > 0) {
             filesHtml += '<div class="file-group mb-3"><h5><i class="fas fa-video me-2"></i>标注视频</h5><div class="row">';
+            const previewPaths = analysisResult.videoPreviewPaths || {};
             Object.entries(analysisResult.videoOutputPaths).forEach(([name, path]) => {
-                // 从路径中提取文件名，格式为 患者姓名-角度.avi
-                const filename = path.split('/').pop() || name;
-                const displayName = filename.replace('.avi', '');
+                // 从路径中提取文件名，格式为 患者姓名-角度.mp4（旧版本为.avi）
+                const filename = path.split('?')[0].split('/').pop() || name;
+                const extension = filename.split('.').pop();
+                const displayName = filename.replace(/\.(mp4|avi)$/, '');
+                // MP4可在浏览器中边下载边播放，有预览版本时优先播放预览版本
+                // preload="none"：标注视频可能在首次请求时才渲染，点击播放前不发起请求
+                const playerHtml = extension === 'mp4' ? `
+                        <video class="analysis-result-video mb-2" src="${previewPaths[name] || path}"
+                               controls preload="none" playsinline></video>` : '';
                 filesHtml += `
-                    <div class="col-md-6 col-lg-4 mb-2">
+                    <div class="col-md-6 col-lg-4 mb-2">${playerHtml}
                         <button onclick="downloadVideo('${path}', '${filename}')" class="btn btn-outline-success btn-sm w-100">
-                            <i class="fas fa-video me-2"></i>${displayName} (.avi)
+                            <i class="fas fa-video me-2"></i>${displayName} (.${extension})
                         </button>
                     </div>
                 `;
@@ -1078,10 +1096,32 @@ document.addEventListener('DOMContentLoaded', function() {
             filesHtml += '</div></div>';
         }
         
+        // 显示标注叠加播放（原视频 + canvas绘制关键点轨迹，无需服务端编码标注视频）
+        if (analysisResult.trackPaths && Object.keys(analysisResult.trackPaths).length > 0) {
+            filesHtml += '<div class="file-group mb-3"><h5><i class="fas fa-draw-polygon me-2"></i>标注叠加播放</h5><div class="row">';
+            Object.entries(analysisResult.trackPaths).forEach(([angle, trackUrl]) => {
+                const video = uploadedVideos[angle];
+                if (!video || !video.url) return;
+                filesHtml += `
+                    <div class="col-md-6 col-lg-4 mb-2">
+                        <div class="overlay-player" data-track="${trackUrl}">
+                            <video class="analysis-result-video" src="${video.url}" controls preload="metadata" playsinline></video>
+                            <canvas class="overlay-canvas"></canvas>
+                        </div>
+                        <div class="form-check form-switch mt-1">
+                            <input class="form-check-input overlay-toggle" type="checkbox" id="overlayToggle-${angle}" checked>
+                            <label class="form-check-label" for="overlayToggle-${angle}">${getAngleName(angle)} 显示标注</label>
+                        </div>
+                    </div>
+                `;
+            });
+            filesHtml += '</div></div>';
+        }
+        
         // 显示报告文件
         if (analysisResult.reportPath) {
             // 从路径中提取文件名
-            const reportFilename = analysisResult.reportPath.split('/').pop() || '分析报告.docx';
+            const reportFilename = analysisResult.reportPath.split('?')[0].split('/').pop() || '分析报告.docx';
             filesHtml += `
                 <div class="file-group mb-3">
                     <h5><i class="fas fa-file-word me-2"></i>分析报告</h5>
@@ -1096,12 +1136,158 @@ document.addEventListener('DOMContentLoaded', function() {
         filesSection.innerHTML = filesHtml;
         filesSection.style.display = 'block';
         
+        initOverlayPlayers(filesSection);
+        
         // 延迟检查图片加载状态
         setTimeout(() => {
             checkChartImagesLoaded();
         }, 2000);
     }
     
+    function decodeOverlayTrack(track) {
+        // 还原差分编码的关键点轨迹：每帧为Float32Array(17*3)或null
+        const frames = [];
+        let previous = null;
+        track.keypoints.forEach(delta => {
+            if (delta === null) {
+                frames.push(null);
+                return;
+            }
+            const values = new Int32Array(delta.length);
+            for (let i = 0; i < delta.length; i++) {
+                values[i] = previous ? previous[i] + delta[i] : delta[i];
+            }
+            previous = values;
+            
+            const frame = new Float32Array(values.length);
+            for (let i = 0; i < values.length; i += 3) {
+                frame[i] = values[i] / track.scale;
+                frame[i + 1] = values[i + 1] / track.scale;
+                frame[i + 2] = values[i + 2] / 100;
+            }
+            frames.push(frame);
+        });
+        return frames;
+    }
+    
+    function drawOverlayLabel(ctx, value, x, y) {
+        // 与服务端标注一致：深色背景白色文字
+        const text = ` ${value.toFixed(2)}`;
+        ctx.font = '14px sans-serif';
+        const width = ctx.measureText(text).width;
+        ctx.fillStyle = 'rgb(17, 31, 104)';
+        ctx.fillRect(x, y - 18, width + 10, 24);
+        ctx.fillStyle = '#ffffff';
+        ctx.fillText(text, x, y);
+    }
+    
+    function drawOverlayFrame(player) {
+        const { video, canvas, track, frames } = player;
+        const ctx = canvas.getContext('2d');
+        const ratio = window.devicePixelRatio || 1;
+        const displayWidth = video.clientWidth;
+        const displayHeight = video.clientHeight;
+        
+        if (canvas.width !== Math.round(displayWidth * ratio) || canvas.height !== Math.round(displayHeight * ratio)) {
+            canvas.width = Math.round(displayWidth * ratio);
+            canvas.height = Math.round(displayHeight * ratio);
+        }
+        ctx.setTransform(1, 0, 0, 1, 0, 0);
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        
+        if (!player.enabled || !video.videoWidth || !track.width) return;
+        
+        const index = Math.floor(video.currentTime * track.fps + 1e-3) - track.start_frame;
+        const k = index >= 0 && index < frames.length ? frames[index] : null;
+        if (!k) return;
+        
+        // 视频按contain方式显示，计算画面区域并映射到轨迹坐标
+        const contentScale = Math.min(displayWidth / video.videoWidth, displayHeight / video.videoHeight);
+        const offsetX = (displayWidth - video.videoWidth * contentScale) / 2;
+        const offsetY = (displayHeight - video.videoHeight * contentScale) / 2;
+        const scale = contentScale * video.videoWidth / track.width;
+        ctx.setTransform(ratio * scale, 0, 0, ratio * scale, ratio * offsetX, ratio * offsetY);
+        
+        const point = i => [k[i * 3], k[i * 3 + 1], k[i * 3 + 2]];
+        ctx.lineWidth = 2 / scale;
+        ctx.strokeStyle = 'rgb(51, 153, 255)';
+        track.skeleton.forEach(([a, b]) => {
+            const pa = point(a), pb = point(b);
+            if (pa[2] < track.kpt_conf || pb[2] < track.kpt_conf) return;
+            ctx.beginPath();
+            ctx.moveTo(pa[0], pa[1]);
+            ctx.lineTo(pb[0], pb[1]);
+            ctx.stroke();
+        });
+        ctx.fillStyle = 'rgb(0, 255, 0)';
+        new Set(track.skeleton.flat()).forEach(i => {
+            const p = point(i);
+            if (p[2] < track.kpt_conf) return;
+            ctx.beginPath();
+            ctx.arc(p[0], p[1], 4 / scale, 0, Math.PI * 2);
+            ctx.fill();
+        });
+        
+        const values = track.metrics[index];
+        if (!values) return;
+        
+        // 标注文字按屏幕像素绘制
+        const toScreen = p => [p[0] * scale + offsetX, p[1] * scale + offsetY];
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        if (track.angle === 'back') {
+            const shoulder = toScreen([(k[15] + k[18]) / 2, (k[16] + k[19]) / 2]);
+            const hip = toScreen([(k[33] + k[36]) / 2, (k[34] + k[37]) / 2]);
+            ctx.strokeStyle = 'rgb(255, 0, 0)';
+            ctx.lineWidth = 2;
+            ctx.beginPath();
+            ctx.moveTo(shoulder[0], shoulder[1]);
+            ctx.lineTo(hip[0], hip[1]);
+            ctx.stroke();
+            drawOverlayLabel(ctx, values[0], ...toScreen(point(9)));
+            drawOverlayLabel(ctx, values[1], ...toScreen(point(10)));
+        } else {
+            drawOverlayLabel(ctx, values[0], ...toScreen(point(5)));
+            drawOverlayLabel(ctx, values[1], ...toScreen(point(6)));
+        }
+    }
+    
+    function initOverlayPlayers(container) {
+        // 加载关键点轨迹，在原视频上用canvas叠加绘制骨架和角度标注
+        container.querySelectorAll('.overlay-player').forEach(element => {
+            const video = element.querySelector('video');
+            const canvas = element.querySelector('canvas');
+            const toggle = element.parentElement.querySelector('.overlay-toggle');
+            
+            fetch(element.dataset.track)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) throw new Error(data.message);
+                    
+                    const player = { video, canvas, track: data.track, frames: decodeOverlayTrack(data.track), enabled: true };
+                    const redraw = () => drawOverlayFrame(player);
+                    const loop = () => {
+                        redraw();
+                        if (!video.paused && !video.ended) requestAnimationFrame(loop);
+                    };
+                    
+                    video.addEventListener('play', () => requestAnimationFrame(loop));
+                    ['loadedmetadata', 'seeked', 'timeupdate'].forEach(name => video.addEventListener(name, redraw));
+                    window.addEventListener('resize', redraw);
+                    if (toggle) {
+                        toggle.addEventListener('change', () => {
+                            player.enabled = toggle.checked;
+                            redraw();
+                        });
+                    }
+                    redraw();
+                })
+                .catch(error => {
+                    console.error('加载关键点轨迹失败:', error);
+                    if (toggle) toggle.disabled = true;
+                });
+        });
+    }
+    
     function checkChartImagesLoaded() {
         const chartImages = document.querySelectorAll('.analysis-chart-img');
         chartImages.forEach(img => {
@@ -1134,7 +1320,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     const img = new Image();
                     img.onload = () => resolveCheck(true);
                     img.onerror = () => resolveCheck(false);
-                    img.src = path + '?t=' + new Date().getTime(); // 添加时间戳避免缓存
+                    img.src = path; // 路径带内容哈希(?v=)，内容变化时URL随之变化
                 });
             });
             
@@ -1151,9 +1337,9 @@ document.addEventListener('DOMContentLoaded', function() {
         const img = chartContainer.querySelector('.analysis-chart-img');
         
         if (img) {
-            // 添加时间戳避免缓存
+            // 手动刷新时添加时间戳绕过缓存（路径可能已带?v=参数）
             const timestamp = new Date().getTime();
-            const newPath = chartPath + '?t=' + timestamp;
+            const newPath = chartPath + (chartPath.includes('?') ? '&' : '?') + 't=' + timestamp;
             
             // 重置加载状态
             chartContainer.classList.remove('loaded', 'error');
@@ -1222,12 +1408,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const downloadBtn = document.getElementById('downloadChartBtn');
         
         if (modal && image) {
-            // 添加时间戳避免缓存
-            const timestamp = new Date().getTime();
-            const newPath = chartPath + '?t=' + timestamp;
-            
-            // 设置图片源
-            image.src = newPath;
+            // 路径带内容哈希(?v=)，可直接使用浏览器缓存
+            image.src = chartPath;
             image.alt = chartName;
             
             // 设置下载按钮的点击事件
@@ -2252,6 +2434,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // 绑定拖拽事件
         bindTimelineEvents(angle);
         
+        // 加载缩略图拼图，用于拖动时预览
+        loadTimelineSprite(angle);
+        
         // 显示时间轴控件
         const timelineControl = document.getElementById(`${angle}TimelineControl`);
         if (timelineControl) {
@@ -2388,12 +2573,12 @@ document.addEventListener('DOMContentLoaded', function() {
             
             if (data.dragHandle === 'start') {
                 data.start = Math.max(0, Math.min(time, data.end - 1));
-                // 同步视频播放位置到开始时间点
-                syncVideoToStartTime(angle, data.start);
             } else if (data.dragHandle === 'end') {
                 data.end = Math.max(data.start + 1, Math.min(time, data.duration));
             }
             
+            // 拖动过程中只显示缩略图，不拖动视频播放位置
+            showTimelineThumb(angle, data.dragHandle === 'start' ? data.start : data.end);
             updateTimelineUI(angle);
         }
     }
@@ -2403,14 +2588,106 @@ document.addEventListener('DOMContentLoaded', function() {
         const angles = ['front', 'side', 'back'];
         
         for (const angle of angles) {
-            timelineData[angle].isDragging = false;
-            timelineData[angle].dragHandle = null;
+            const data = timelineData[angle];
+            if (data.isDragging) {
+                const time = data.dragHandle === 'start' ? data.start : data.end;
+                if (data.dragHandle === 'start') {
+                    // 同步视频播放位置到开始时间点
+                    syncVideoToStartTime(angle, data.start);
+                }
+                // 松开后加载该时间点的精确帧
+                showTimelineExactFrame(angle, time);
+            }
+            data.isDragging = false;
+            data.dragHandle = null;
         }
         
         document.removeEventListener('mousemove', handleTimelineDrag);
         document.removeEventListener('mouseup', handleTimelineDragEnd);
     }
     
+    // 加载缩略图拼图信息
+    function loadTimelineSprite(angle) {
+        if (!selectedPatient) return;
+        
+        fetch(`/api/patients/${selectedPatient.id}/videos/${angle}/sprite`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                timelineSprites[angle] = data.sprite;
+            }
+        })
+        .catch(error => {
+            console.log(`${angle}角度缩略图加载失败:`, error);
+        });
+    }
+    
+    // 获取（或创建）时间轴预览缩略图元素
+    function getTimelineThumb(angle) {
+        let thumb = document.getElementById(`${angle}TimelineThumb`);
+        if (!thumb) {
+            const slider = document.getElementById(`${angle}TimelineSlider`);
+            if (!slider) return null;
+            thumb = document.createElement('div');
+            thumb.id = `${angle}TimelineThumb`;
+            thumb.className = 'timeline-thumb';
+            thumb.innerHTML = '<img alt=""><span class="timeline-thumb-time"></span>';
+            slider.parentElement.appendChild(thumb);
+        }
+        return thumb;
+    }
+    
+    // 定位预览缩略图到时间点对应的滑块位置
+    function positionTimelineThumb(angle, thumb, time) {
+        const data = timelineData[angle];
+        const percent = data.duration > 0 ? (time / data.duration) * 100 : 0;
+        thumb.style.left = `${percent}%`;
+        thumb.querySelector('.timeline-thumb-time').textContent = formatTime(time);
+        thumb.style.display = 'block';
+    }
+    
+    // 拖动时用缩略图拼图显示对应时间点的画面
+    function showTimelineThumb(angle, time) {
+        const sprite = timelineSprites[angle];
+        const thumb = getTimelineThumb(angle);
+        if (!thumb) return;
+        
+        const img = thumb.querySelector('img');
+        if (sprite) {
+            const index = Math.min(sprite.count - 1, Math.max(0, Math.floor(time / sprite.interval)));
+            const col = index % sprite.columns;
+            const row = Math.floor(index / sprite.columns);
+            img.style.display = 'none';
+            thumb.style.width = `${sprite.thumb_width}px`;
+            thumb.style.height = `${sprite.thumb_height}px`;
+            thumb.style.backgroundImage = `url(${sprite.url})`;
+            thumb.style.backgroundPosition = `-${col * sprite.thumb_width}px -${row * sprite.thumb_height}px`;
+        }
+        positionTimelineThumb(angle, thumb, time);
+    }
+    
+    // 松开滑块后显示该时间点的精确帧，随后自动隐藏
+    function showTimelineExactFrame(angle, time) {
+        if (!selectedPatient) return;
+        const thumb = getTimelineThumb(angle);
+        if (!thumb) return;
+        
+        const img = thumb.querySelector('img');
+        img.onload = () => {
+            thumb.style.backgroundImage = 'none';
+            thumb.style.width = 'auto';
+            thumb.style.height = 'auto';
+            img.style.display = 'block';
+        };
+        img.src = `/api/patients/${selectedPatient.id}/videos/${angle}/frame?t=${time.toFixed(3)}&width=240`;
+        positionTimelineThumb(angle, thumb, time);
+        
+        clearTimeout(thumb.hideTimer);
+        thumb.hideTimer = setTimeout(() => {
+            thumb.style.display = 'none';
+        }, 2000);
+    }
+    
     // 同步视频播放位置到开始时间点
     function syncVideoToStartTime(angle, startTime) {
         const video = document.getElementById(`${angle}VideoPreview`);